@@ -0,0 +1,104 @@
+"""Hosts several A2A agents in one process.
+
+Each agent listed in A2A_HOST_AGENTS (any of memory, social, photos) is
+mounted under its own path prefix, e.g. /memory/, and its agent card URL is
+set to PUBLIC_URL plus that prefix. The agents share the process, its event
+loop, the Cloud Storage client, one task store and one session service,
+instead of each running its own interpreter and server.
+"""
+
+import importlib
+import logging
+import os
+import pkgutil
+import sys
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import agent_common
+from agent_common import serving
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+port = int(os.environ.get("A2A_PORT", 8080))
+PUBLIC_URL = os.environ.get("PUBLIC_URL") or f"http://localhost:{port}"
+HOST_AGENTS = [
+    name.strip() for name in os.environ.get("A2A_HOST_AGENTS", "memory,social,photos").split(",") if name.strip()
+]
+
+# Path prefix -> module that defines the agent's `create_app`
+AGENT_MODULES = {
+    "memory": "memory_agent.a2a_server",
+    "social": "agents.social_profiling_agent.a2a_server",
+    "photos": "photos_mcp_client.a2a_server",
+}
+
+
+def _alias_agent_common() -> None:
+    """Registers agent_common under `agents.agent_common` as well.
+
+    The social profiling agent imports it through the `agents` package and
+    the others import it directly; without the alias the process would hold
+    two copies, each with its own shared state.
+    """
+    for module_info in pkgutil.iter_modules(agent_common.__path__):
+        importlib.import_module(f"agent_common.{module_info.name}")
+    for name, module in list(sys.modules.items()):
+        if name == "agent_common" or name.startswith("agent_common."):
+            sys.modules.setdefault(f"agents.{name}", module)
+
+
+def _import_agents() -> dict:
+    modules = {}
+    for name in HOST_AGENTS:
+        if name not in AGENT_MODULES:
+            logger.error(f"Unknown agent '{name}'. Expected one of: {', '.join(AGENT_MODULES)}")
+            continue
+        try:
+            modules[name] = importlib.import_module(AGENT_MODULES[name])
+        except (Exception, SystemExit) as e:
+            # The social profiling agent exits if its toolbox server is unreachable.
+            logger.error(f"Could not load agent '{name}': {type(e).__name__}: {e}", exc_info=True)
+    return modules
+
+
+# Imported here, before uvicorn starts its event loop: the photos agent
+# initializes itself with asyncio.run() on import.
+_alias_agent_common()
+agent_modules = _import_agents()
+
+
+def create_app():
+    """Builds one app with every hosted agent mounted under its prefix."""
+    serving.share_state("a2a_host")
+    mounted = {}
+    routes = []
+    for name, module in agent_modules.items():
+        url = f"{PUBLIC_URL.rstrip('/')}/{name}/"
+        try:
+            app = module.create_app(public_url=url)
+        except Exception as e:
+            logger.error(f"Could not start agent '{name}': {type(e).__name__}: {e}", exc_info=True)
+            continue
+        routes.append(Mount(f"/{name}", app=app))
+        mounted[name] = url
+        logger.info(f"Mounted agent '{name}' at {url}")
+
+    def index(request):
+        return JSONResponse({"agents": mounted})
+
+    return Starlette(routes=[Route("/", index, methods=["GET"]), *routes])
+
+
+if __name__ == '__main__':
+    try:
+        serving.run("a2a_host.a2a_server:create_app", port)
+    except Exception as e:
+        logger.error(f"An error occurred during server startup: {e}")
+        exit(1)
@@ -0,0 +1,272 @@
+import asyncio
+import contextlib
+import logging
+
+from typing import TYPE_CHECKING
+
+from a2a.server.agent_execution import AgentExecutor
+from a2a.server.agent_execution.context import RequestContext
+from a2a.server.events.event_queue import EventQueue
+from a2a.server.tasks import TaskUpdater
+from a2a.types import (
+    AgentCard,
+    FilePart,
+    FileWithBytes,
+    Part,
+    TaskNotCancelableError,
+    TaskState,
+    TextPart,
+)
+from a2a.utils.errors import ServerError
+from google.adk.runners import Runner
+from google.genai import types
+
+from . import tracing
+from .admission import AdmissionController, Overloaded
+
+
+if TYPE_CHECKING:
+    from google.adk.sessions.session import Session
+
+
+logger = logging.getLogger(__name__)
+tracer = tracing.get_tracer(__name__)
+
+
+# Constants
+DEFAULT_USER_ID = 'self'
+
+_TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected,
+}
+
+
+class AdkAgentExecutor(AgentExecutor):
+    """Connects an A2A server to an ADK Runner.
+
+    Each request runs `_process_request` as its own asyncio task, keyed by
+    A2A task id, so `cancel` can stop it: the model call or tool that is
+    awaiting at the time receives `CancelledError` and the task ends up
+    `canceled`.
+
+    Runs are admitted through an `AdmissionController`; a request that finds
+    the server at capacity ends up `rejected` with a retry-after hint in the
+    status message metadata. Subclasses set `env_prefix` to read their own
+    limits.
+    """
+
+    env_prefix: str | None = None
+
+    def __init__(self, runner: Runner, card: AgentCard):
+        self.runner = runner
+        self._card = card
+        self.admission = AdmissionController.from_env(self.env_prefix)
+        self._running: dict[str, asyncio.Task] = {}
+        self._cancelled: set[str] = set()
+
+    async def _process_request(
+        self,
+        new_message: types.Content,
+        session_id: str,
+        task_updater: TaskUpdater,
+        metadata: dict | None = None,
+    ) -> None:
+        with tracing.remote_span(
+            tracer, f'{type(self).__name__}._process_request', metadata, {'a2a.context_id': session_id}
+        ), self._session_in_use(session_id):
+            session_obj = await self._upsert_session(session_id)
+            # Update session_id with the ID from the resolved session object.
+            # (it may be the same as the one passed in if it already exists)
+            session_id = session_obj.id
+
+            async for event in self.runner.run_async(
+                session_id=session_id,
+                user_id=DEFAULT_USER_ID,
+                new_message=new_message,
+            ):
+                if event.is_final_response():
+                    parts = [
+                        convert_genai_part_to_a2a(part)
+                        for part in event.content.parts
+                        if (part.text or part.file_data or part.inline_data)
+                    ]
+                    logger.debug('Yielding final response: %s', parts)
+                    await task_updater.add_artifact(parts)
+                    await task_updater.update_status(
+                        TaskState.completed, final=True
+                    )
+                    break
+                if not event.get_function_calls():
+                    logger.debug('Yielding update response')
+                    await task_updater.update_status(
+                        TaskState.working,
+                        message=task_updater.new_agent_message(
+                            [
+                                convert_genai_part_to_a2a(part)
+                                for part in event.content.parts
+                                if (part.text)
+                            ],
+                        ),
+                    )
+                else:
+                    logger.debug('Skipping tool call event.')
+
+    async def execute(
+        self,
+        context: RequestContext,
+        event_queue: EventQueue,
+    ):
+        # Run the agent until either complete or the task is suspended.
+        updater = TaskUpdater(event_queue, context.task_id, context.context_id)
+        # Immediately notify that the task is submitted.
+        if not context.current_task:
+            await updater.update_status(TaskState.submitted)
+        run = asyncio.create_task(
+            self._admit_and_process(
+                types.UserContent(
+                    parts=[
+                        convert_a2a_part_to_genai(part)
+                        for part in context.message.parts
+                    ],
+                ),
+                context.context_id,
+                updater,
+                context.message.metadata,
+            ),
+            name=f'{type(self).__name__}-{context.task_id}',
+        )
+        self._running[context.task_id] = run
+        try:
+            await run
+        except Overloaded as e:
+            logger.warning(f'[{type(self).__name__}] rejected task {context.task_id}: {e}')
+            await updater.update_status(
+                TaskState.rejected,
+                message=updater.new_agent_message(
+                    [Part(root=TextPart(text=f'The agent is busy ({e}). Retry after {e.retry_after} seconds.'))],
+                    metadata={'retry_after': e.retry_after},
+                ),
+                final=True,
+            )
+        except asyncio.CancelledError:
+            if context.task_id not in self._cancelled:
+                raise
+            # Cancelled through `cancel`, which reports the canceled status.
+            logger.info(f'[{type(self).__name__}] task {context.task_id} was cancelled')
+        finally:
+            self._running.pop(context.task_id, None)
+            self._cancelled.discard(context.task_id)
+        logger.debug(f'[{type(self).__name__}] execute exiting')
+
+    async def _admit_and_process(
+        self,
+        new_message: types.Content,
+        session_id: str,
+        task_updater: TaskUpdater,
+        metadata: dict | None = None,
+    ) -> None:
+        """Waits for a run slot, then processes the request while holding it."""
+        async with self.admission.slot():
+            await task_updater.update_status(TaskState.working)
+            await self._process_request(new_message, session_id, task_updater, metadata)
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue):
+        """Cancels the run of the given task and marks the task as canceled.
+
+        The model call or tool the run is awaiting is cancelled; a
+        synchronous tool that is already running finishes its current call
+        first. Only the worker process running the task can stop it, so
+        elsewhere the task is reported as not cancelable rather than marked
+        canceled while it keeps running.
+        """
+        task = context.current_task
+        if task is not None and task.status.state in _TERMINAL_STATES:
+            raise ServerError(error=TaskNotCancelableError())
+
+        run = self._running.get(context.task_id)
+        if run is None or run.done():
+            logger.info(f'Task {context.task_id} is not running in this worker; not cancelling it')
+            raise ServerError(error=TaskNotCancelableError())
+
+        logger.info(f'Cancelling the run of task {context.task_id}')
+        self._cancelled.add(context.task_id)
+        run.cancel()
+        await asyncio.wait({run})
+        if not run.cancelled():
+            # It finished before the cancellation reached it.
+            raise ServerError(error=TaskNotCancelableError())
+
+        updater = TaskUpdater(event_queue, context.task_id, context.context_id)
+        await updater.update_status(TaskState.canceled, final=True)
+
+    def _session_in_use(self, session_id: str):
+        """Keeps the session from being evicted during the run, if the session service evicts sessions."""
+        in_use = getattr(self.runner.session_service, 'in_use', None)
+        if in_use is None:
+            return contextlib.nullcontext()
+        return in_use(app_name=self.runner.app_name, user_id=DEFAULT_USER_ID, session_id=session_id)
+
+    async def _upsert_session(self, session_id: str) -> 'Session':
+        """Retrieves a session if it exists, otherwise creates a new one.
+
+        Ensures that async session service methods are properly awaited.
+        """
+        session = await self.runner.session_service.get_session(
+            app_name=self.runner.app_name,
+            user_id=DEFAULT_USER_ID,
+            session_id=session_id,
+        )
+        if session is None:
+            session = await self.runner.session_service.create_session(
+                app_name=self.runner.app_name,
+                user_id=DEFAULT_USER_ID,
+                session_id=session_id,
+            )
+        return session
+
+
+def convert_a2a_part_to_genai(part: Part) -> types.Part:
+    """Convert a single A2A Part type into a Google Gen AI Part type.
+
+    Args:
+        part: The A2A Part to convert
+
+    Returns:
+        The equivalent Google Gen AI Part
+
+    Raises:
+        ValueError: If the part type is not supported
+    """
+    part = part.root
+    if isinstance(part, TextPart):
+        return types.Part(text=part.text)
+    raise ValueError(f'Unsupported part type: {type(part)}')
+
+
+def convert_genai_part_to_a2a(part: types.Part) -> Part:
+    """Convert a single Google Gen AI Part type into an A2A Part type.
+
+    Args:
+        part: The Google Gen AI Part to convert
+
+    Returns:
+        The equivalent A2A Part
+
+    Raises:
+        ValueError: If the part type is not supported
+    """
+    if part.text:
+        return Part(root=TextPart(text=part.text))
+    if part.inline_data:
+        return Part(
+            root=FilePart(
+                file=FileWithBytes(
+                    bytes=part.inline_data.data,
+                    mime_type=part.inline_data.mime_type,
+                )
+            )
+        )
+    raise ValueError(f'Unsupported part type: {part}')
@@ -0,0 +1,121 @@
+"""Admission control for the A2A agent executors.
+
+Each executor admits at most MAX_CONCURRENT agent runs at a time. Up to
+MAX_QUEUED further requests wait for a slot, for at most QUEUE_TIMEOUT
+seconds. Requests beyond that are rejected straight away with a retry-after
+hint instead of piling more model and tool calls onto a busy server.
+
+The limits are read from `<PREFIX>_MAX_CONCURRENT`, `<PREFIX>_MAX_QUEUED` and
+`<PREFIX>_QUEUE_TIMEOUT` (e.g. MEMORY_AGENT_MAX_CONCURRENT), falling back to
+A2A_MAX_CONCURRENT, A2A_MAX_QUEUED and A2A_QUEUE_TIMEOUT. A2A_RETRY_AFTER is
+the smallest retry-after, in seconds, that is suggested.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+def _env(prefix: str | None, name: str, default: str) -> str:
+    if prefix and f"{prefix}_{name}" in os.environ:
+        return os.environ[f"{prefix}_{name}"]
+    return os.environ.get(f"A2A_{name}", default)
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted. `retry_after` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """A concurrency limit with a bounded, time-limited wait queue."""
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 16, queue_timeout: float = 30, retry_after: int = 5):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._running = 0
+        self._waiting = 0
+        # Recent queue waits and run durations, in seconds.
+        self._waits: deque[float] = deque(maxlen=500)
+        self._durations: deque[float] = deque(maxlen=100)
+        self._stats = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    @classmethod
+    def from_env(cls, prefix: str | None = None) -> "AdmissionController":
+        return cls(
+            max_concurrent=int(_env(prefix, "MAX_CONCURRENT", "4")),
+            max_queued=int(_env(prefix, "MAX_QUEUED", "16")),
+            queue_timeout=float(_env(prefix, "QUEUE_TIMEOUT", "30")),
+            retry_after=int(os.environ.get("A2A_RETRY_AFTER", 5)),
+        )
+
+    def _suggest_retry_after(self) -> int:
+        """Roughly how long until the current queue has drained."""
+        if not self._durations:
+            return self.retry_after
+        average = sum(self._durations) / len(self._durations)
+        backlog = (self._waiting + 1) / self.max_concurrent
+        return max(self.retry_after, math.ceil(average * backlog))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds one run slot for the duration of the block.
+
+        Raises Overloaded if the wait queue is full or no slot frees up within
+        the queue timeout.
+        """
+        queued_at = time.monotonic()
+        if not self._semaphore.locked():
+            # A slot is free: take it without suspending.
+            await self._semaphore.acquire()
+        elif self._waiting >= self.max_queued:
+            self._stats["rejected"] += 1
+            raise Overloaded(
+                f"{self._running} runs in progress and {self._waiting} waiting",
+                self._suggest_retry_after(),
+            )
+        else:
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._stats["timed_out"] += 1
+                raise Overloaded(
+                    f"no run slot became free within {self.queue_timeout:g}s",
+                    self._suggest_retry_after(),
+                ) from None
+            finally:
+                self._waiting -= 1
+        started = time.monotonic()
+        self._waits.append(started - queued_at)
+        self._running += 1
+        self._stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._durations.append(time.monotonic() - started)
+            self._semaphore.release()
+
+    def metrics(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "running": self._running,
+            "queue_depth": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "queue_timeout": self.queue_timeout,
+            "wait_ms_avg": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+            "wait_ms_p95": round(1000 * waits[math.ceil(0.95 * len(waits)) - 1], 1) if waits else 0.0,
+            "wait_ms_max": round(1000 * waits[-1], 1) if waits else 0.0,
+            **self._stats,
+        }
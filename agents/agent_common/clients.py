@@ -0,0 +1,23 @@
+"""Process-wide API clients shared by the agents and their tools.
+
+Creating a client resolves credentials and opens a new HTTP connection pool,
+so tools use these instead of building a client per call. When several
+agents are hosted in one process, they share them too.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_storage_client = None
+
+
+def storage_client():
+    """Returns the shared Cloud Storage client, creating it on first use."""
+    global _storage_client
+    if _storage_client is None:
+        from google.cloud import storage
+
+        with _lock:
+            if _storage_client is None:
+                _storage_client = storage.Client()
+    return _storage_client
@@ -0,0 +1,204 @@
+"""Record and replay of LLM turns for offline benchmarking.
+
+With LLM_REPLAY_MODE=record, every model request an agent makes and the
+response it gets are appended to <LLM_REPLAY_DIR>/<agent_name>.jsonl. With
+LLM_REPLAY_MODE=replay, the recorded response is returned from a
+`before_model_callback`, so the model is never called and a run needs no
+network access to Gemini. Everything else (A2A hops, tool calls, Spanner,
+GCS) still runs for real, which is what an end-to-end benchmark wants to
+measure.
+
+Requests are matched by a digest of the model, system instruction and
+contents, with ids that differ between runs (UUIDs, function call ids)
+masked out. If no digest matches, a turn recorded at the same position in
+its invocation (the n-th model call of the agent for one user message) is
+used, so small prompt changes do not break a recording. Recorded turns are
+never used up: every invocation replays from its first turn, so a recording
+can be replayed any number of times by one process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+logger = logging.getLogger(__name__)
+
+LLM_REPLAY_MODE = os.environ.get("LLM_REPLAY_MODE", "").strip().lower()
+LLM_REPLAY_DIR = os.environ.get("LLM_REPLAY_DIR", "llm_recordings")
+
+# Position cursors are kept for this many recent (invocation, agent) pairs.
+_MAX_TRACKED_INVOCATIONS = 1024
+
+_VOLATILE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    r"|\b[0-9a-f]{32}\b"
+    r"|adk-[0-9a-zA-Z-]+",
+    re.IGNORECASE,
+)
+
+
+class ReplayMissError(RuntimeError):
+    """Raised in replay mode when no recorded response matches a request."""
+
+
+def request_digest(agent_name: str, llm_request: LlmRequest) -> str:
+    """Returns a run-independent digest of a model request."""
+    config = llm_request.config
+    payload = {
+        "agent": agent_name,
+        "model": llm_request.model,
+        "system_instruction": str(config.system_instruction) if config and config.system_instruction else None,
+        "contents": [c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents],
+    }
+    text = _VOLATILE.sub("<id>", json.dumps(payload, sort_keys=True, default=str))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LlmRecorder:
+    """Model callbacks that record or replay LLM turns for one process."""
+
+    def __init__(self, mode: str, directory: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported LLM_REPLAY_MODE: {mode!r}")
+        self.mode = mode
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._by_digest: dict[str, dict[str, list[dict]]] = {}
+        self._by_position: dict[str, dict[int, list[dict]]] = {}
+        # Per (invocation id, agent name): the next turn position and how
+        # often each digest has been replayed in that invocation.
+        self._cursors: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._pending: dict[tuple[str, str], tuple[str, int]] = {}
+        self.stats = defaultdict(int)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, agent_name: str) -> str:
+        return os.path.join(self.directory, f"{agent_name}.jsonl")
+
+    def _load(self, agent_name: str) -> None:
+        if agent_name in self._by_digest:
+            return
+        by_digest: dict[str, list[dict]] = defaultdict(list)
+        by_position: dict[int, list[dict]] = defaultdict(list)
+        count = 0
+        path = self._path(agent_name)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        turn = json.loads(line)
+                        by_digest[turn["digest"]].append(turn)
+                        by_position[turn.get("position", 0)].append(turn)
+                        count += 1
+        self._by_digest[agent_name] = by_digest
+        self._by_position[agent_name] = by_position
+        logger.info(f"Loaded {count} recorded LLM turns for '{agent_name}' from {path}")
+
+    def _cursor(self, invocation_id: str, agent_name: str) -> dict:
+        key = (invocation_id, agent_name)
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            cursor = self._cursors[key] = {"position": 0, "replayed": defaultdict(int)}
+            while len(self._cursors) > _MAX_TRACKED_INVOCATIONS:
+                self._cursors.popitem(last=False)
+        return cursor
+
+    async def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> LlmResponse | None:
+        agent_name = callback_context.agent_name
+        digest = request_digest(agent_name, llm_request)
+        with self._lock:
+            cursor = self._cursor(callback_context.invocation_id, agent_name)
+            position = cursor["position"]
+            cursor["position"] += 1
+            if self.mode == "record":
+                self._pending[(callback_context.invocation_id, agent_name)] = (digest, position)
+                return None
+
+            started = time.perf_counter()
+            self._load(agent_name)
+            matches = self._by_digest[agent_name].get(digest)
+            at_position = self._by_position[agent_name].get(position)
+            if matches:
+                # A request repeated within one invocation gets the next recorded response.
+                turn = matches[min(cursor["replayed"][digest], len(matches) - 1)]
+                cursor["replayed"][digest] += 1
+                self.stats["digest_hits"] += 1
+            elif at_position:
+                turn = at_position[0]
+                self.stats["sequence_fallbacks"] += 1
+                logger.warning(f"No recorded turn matches this request for '{agent_name}'; replaying a recorded turn #{position}.")
+            else:
+                self.stats["misses"] += 1
+                raise ReplayMissError(
+                    f"No recorded LLM turn for '{agent_name}' (turn #{position}). Re-record with LLM_REPLAY_MODE=record."
+                )
+            self.stats["replay_ms_total"] += (time.perf_counter() - started) * 1000
+        return LlmResponse.model_validate(turn["response"])
+
+    async def after_model_callback(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> LlmResponse | None:
+        if self.mode != "record" or llm_response.partial:
+            return None
+        agent_name = callback_context.agent_name
+        with self._lock:
+            digest, position = self._pending.pop((callback_context.invocation_id, agent_name), (None, 0))
+            turn = {
+                "digest": digest,
+                "position": position,
+                "recorded_at": time.time(),
+                "response": llm_response.model_dump(mode="json", exclude_none=True),
+            }
+            with open(self._path(agent_name), "a", encoding="utf-8") as f:
+                f.write(json.dumps(turn) + "\n")
+            self.stats["recorded"] += 1
+        return None
+
+
+_recorder: LlmRecorder | None = None
+
+
+def get_recorder() -> LlmRecorder | None:
+    """Returns the process-wide recorder, or None if record/replay is off."""
+    global _recorder
+    if not LLM_REPLAY_MODE:
+        return None
+    if _recorder is None:
+        _recorder = LlmRecorder(LLM_REPLAY_MODE, LLM_REPLAY_DIR)
+        logger.info(f"LLM {LLM_REPLAY_MODE} enabled, using {os.path.abspath(LLM_REPLAY_DIR)}")
+    return _recorder
+
+
+def _as_list(callback) -> list:
+    if callback is None:
+        return []
+    return list(callback) if isinstance(callback, list) else [callback]
+
+
+def install(agent) -> None:
+    """Adds the record/replay model callbacks to an LLM agent and its sub-agents.
+
+    Does nothing unless LLM_REPLAY_MODE is set, and is safe to call more than
+    once. Replay runs first so no other callback sees a request that will not
+    reach the model.
+    """
+    recorder = get_recorder()
+    if recorder is None:
+        return
+    before = _as_list(getattr(agent, "before_model_callback", None))
+    if hasattr(agent, "before_model_callback") and recorder.before_model_callback not in before:
+        agent.before_model_callback = [recorder.before_model_callback] + before
+        agent.after_model_callback = _as_list(agent.after_model_callback) + [recorder.after_model_callback]
+    for sub_agent in getattr(agent, "sub_agents", []) or []:
+        install(sub_agent)
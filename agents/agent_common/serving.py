@@ -0,0 +1,112 @@
+"""Process layout for the A2A agent servers.
+
+A2A_WORKERS sets the number of uvicorn worker processes ("auto" uses one per
+core). With more than one worker, tasks and ADK sessions are kept in SQLite
+files under A2A_STATE_DIR (or TASK_STORE_PATH / SESSION_DB_URL), so any
+worker can serve a task another worker created. The session database is
+pruned with the same SESSION_MAX_COUNT and SESSION_IDLE_TTL limits as the
+in-memory sessions, and finished tasks are deleted after TASK_TTL seconds.
+A single worker keeps the in-memory stores.
+"""
+
+import logging
+import os
+import tempfile
+
+import uvicorn
+from a2a.server.tasks import InMemoryTaskStore, TaskStore
+from google.adk.sessions import BaseSessionService
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+
+from .session_store import BoundedSessionService, PrunedDatabaseSessionService
+from .task_store import SqliteTaskStore
+
+logger = logging.getLogger(__name__)
+
+
+def _workers(value: str) -> int:
+    if value.strip().lower() == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+
+A2A_WORKERS = _workers(os.environ.get("A2A_WORKERS", "1"))
+A2A_STATE_DIR = os.environ.get("A2A_STATE_DIR", tempfile.gettempdir())
+
+
+def multi_worker() -> bool:
+    return A2A_WORKERS > 1
+
+
+# Set by `share_state` when several agents run in one process.
+_shared_state_name: str | None = None
+_shared: dict = {}
+
+
+def share_state(name: str) -> None:
+    """Makes every agent in this process use one task store and one session service.
+
+    They are stored under `name` instead of under each agent's name. ADK
+    sessions are keyed by app name and A2A tasks by unique id, so the agents
+    do not see each other's state.
+    """
+    global _shared_state_name
+    _shared_state_name = name
+
+
+def build_task_store(agent_name: str) -> TaskStore:
+    if _shared_state_name:
+        if "task_store" not in _shared:
+            _shared["task_store"] = _build_task_store(_shared_state_name)
+        return _shared["task_store"]
+    return _build_task_store(agent_name)
+
+
+def build_session_service(agent_name: str) -> BaseSessionService:
+    if _shared_state_name:
+        if "session_service" not in _shared:
+            _shared["session_service"] = _build_session_service(_shared_state_name)
+        return _shared["session_service"]
+    return _build_session_service(agent_name)
+
+
+def _build_task_store(agent_name: str) -> TaskStore:
+    path = os.environ.get("TASK_STORE_PATH")
+    if not path and not multi_worker():
+        return InMemoryTaskStore()
+    return SqliteTaskStore.from_env(path or os.path.join(A2A_STATE_DIR, f"{agent_name}_tasks.db"))
+
+
+def _build_session_service(agent_name: str) -> BaseSessionService:
+    db_url = os.environ.get("SESSION_DB_URL")
+    if not db_url and not multi_worker():
+        return BoundedSessionService.from_env()
+    db_url = db_url or f"sqlite:///{os.path.join(A2A_STATE_DIR, f'{agent_name}_sessions.db')}"
+    logger.info(f"Using database session service at {db_url}")
+    return PrunedDatabaseSessionService.from_env(db_url)
+
+
+def add_metrics_route(app: Starlette, runner, executor=None, extra: dict | None = None) -> None:
+    """Serves this worker's session and admission metrics at /metrics.
+
+    `extra` maps further names to functions that return agent-specific metrics.
+    """
+    def metrics(request):
+        session_metrics = getattr(runner.session_service, "metrics", None)
+        admission = getattr(executor, "admission", None)
+        return JSONResponse({
+            "pid": os.getpid(),
+            "workers": A2A_WORKERS,
+            "sessions": session_metrics() if session_metrics else None,
+            "admission": admission.metrics() if admission else None,
+            **{name: get_metrics() for name, get_metrics in (extra or {}).items()},
+        })
+
+    app.add_route("/metrics", metrics, methods=["GET"])
+
+
+def run(app_factory: str, port: int) -> None:
+    """Runs `module:function` (which builds the app) on A2A_WORKERS processes."""
+    logger.info(f"Starting {app_factory} with {A2A_WORKERS} worker(s) on port {port}")
+    uvicorn.run(app_factory, factory=True, host="0.0.0.0", port=port, workers=A2A_WORKERS)
@@ -0,0 +1,384 @@
+"""Bounded ADK session services for the long-running A2A agent servers.
+
+`InMemorySessionService` keeps every session forever, and the executors
+create one per A2A context id. `BoundedSessionService` evicts the least
+recently used sessions once there are more than SESSION_MAX_COUNT (or they
+take more than SESSION_MAX_BYTES), and sessions idle for longer than
+SESSION_IDLE_TTL seconds. Sessions that an invocation is running on (see
+`in_use`) are never evicted, so a run never loses the events it appends;
+the limits may be exceeded until those runs end.
+
+With SESSION_SPILL_PATH set, evicted sessions are written to that SQLite
+file instead of being dropped, and are loaded back into memory the next time
+they are used. Sessions that outlive SESSION_IDLE_TTL on disk are deleted.
+
+Servers with several worker processes keep their sessions in a database
+instead, with `PrunedDatabaseSessionService`. It deletes sessions idle for
+longer than SESSION_IDLE_TTL and all but the SESSION_MAX_COUNT most recently
+updated ones, at most once per SESSION_PRUNE_INTERVAL seconds.
+SESSION_MAX_BYTES only applies to the in-memory service.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import DatabaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.database_session_service import StorageEvent, StorageSession
+from sqlalchemy import delete, func, select, tuple_
+
+logger = logging.getLogger(__name__)
+
+SessionKey = tuple[str, str, str]
+
+
+class _ActiveSessions:
+    """Tracks the sessions that invocations are running on; those are never evicted."""
+
+    _active: dict[SessionKey, int]
+
+    @contextlib.contextmanager
+    def in_use(self, *, app_name: str, user_id: str, session_id: str):
+        """Keeps a session from being evicted while an invocation runs on it."""
+        key = (app_name, user_id, session_id)
+        self._active[key] = self._active.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            if self._active[key] > 1:
+                self._active[key] -= 1
+            else:
+                del self._active[key]
+            self._after_run()
+
+    def _after_run(self) -> None:
+        pass
+
+
+class BoundedSessionService(_ActiveSessions, InMemorySessionService):
+    """An in-memory session service with LRU, idle TTL and optional SQLite spill."""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600,
+        max_bytes: int = 0,
+        spill_path: str | None = None,
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        # Least recently used first: key -> (last used, approximate size in bytes)
+        self._lru: OrderedDict[SessionKey, tuple[float, int]] = OrderedDict()
+        self._bytes = 0
+        # Sessions with a running invocation, and how many.
+        self._active: dict[SessionKey, int] = {}
+        self._stats = {"evicted": 0, "expired": 0, "spilled": 0, "restored": 0}
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._disk_swept_at = 0.0
+        if spill_path:
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " app_name TEXT, user_id TEXT, session_id TEXT, data TEXT, spilled_at REAL,"
+                " PRIMARY KEY (app_name, user_id, session_id))"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "BoundedSessionService":
+        return cls(
+            max_sessions=int(os.environ.get("SESSION_MAX_COUNT", 1000)),
+            idle_ttl=float(os.environ.get("SESSION_IDLE_TTL", 3600)),
+            max_bytes=int(os.environ.get("SESSION_MAX_BYTES", 0)),
+            spill_path=os.environ.get("SESSION_SPILL_PATH") or None,
+        )
+
+    # --- Session service API ---
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        self._sweep()
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        key = (app_name, user_id, session.id)
+        self._touch(key, self._size_of(session))
+        self._evict_over_limit(keep=key)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        self._sweep()
+        key = (app_name, user_id, session_id)
+        if key not in self._lru and not self._restore(key):
+            return None
+        self._touch(key)
+        return await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        response = await super().list_sessions(app_name=app_name, user_id=user_id)
+        for session in self._spilled_sessions(app_name, user_id):
+            session.events = []
+            response.sessions.append(session)
+        return response
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._forget((app_name, user_id, session_id))
+        self._delete_spilled((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = (session.app_name, session.user_id, session.id)
+        if key not in self._lru and not self._restore(key):
+            # Only a run that did not mark its session `in_use` gets here.
+            logger.error(
+                f"Session {session.id} was evicted during a run; its events are not kept. "
+                "Wrap the run in `in_use`, or set SESSION_SPILL_PATH."
+            )
+        event = await super().append_event(session=session, event=event)
+        if key in self._lru:
+            self._touch(key, self._lru[key][1] + len(event.model_dump_json(exclude_none=True)))
+            self._evict_over_limit(keep=key)
+        return event
+
+    def metrics(self) -> dict:
+        spilled = 0
+        if self._db is not None:
+            with self._db_lock:
+                spilled = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {
+            "sessions": len(self._lru),
+            "active_sessions": len(self._active),
+            "approx_bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            "spilled_sessions": spilled,
+            **self._stats,
+        }
+
+    # --- Accounting and eviction ---
+
+    def _after_run(self) -> None:
+        self._evict_over_limit()
+
+    @staticmethod
+    def _size_of(session: Session) -> int:
+        return len(session.model_dump_json(exclude_none=True))
+
+    def _touch(self, key: SessionKey, size: int | None = None) -> None:
+        _, old_size = self._lru.pop(key, (0.0, 0))
+        size = old_size if size is None else size
+        self._lru[key] = (time.monotonic(), size)
+        self._bytes += size - old_size
+
+    def _forget(self, key: SessionKey) -> None:
+        entry = self._lru.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self, key: SessionKey) -> None:
+        app_name, user_id, session_id = key
+        session = self.sessions.get(app_name, {}).get(user_id, {}).pop(session_id, None)
+        self._forget(key)
+        if session is not None and self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, session.model_dump_json(), time.time()),
+                )
+                self._db.commit()
+            self._stats["spilled"] += 1
+
+    def _sweep(self) -> None:
+        """Evicts sessions that have been idle for longer than the TTL."""
+        now = time.monotonic()
+        for key, (last_used, _) in list(self._lru.items()):
+            if now - last_used <= self.idle_ttl:
+                break
+            if key in self._active:
+                continue
+            self._evict(key)
+            self._stats["expired"] += 1
+        if self._db is not None and now - self._disk_swept_at > 60:
+            self._disk_swept_at = now
+            with self._db_lock:
+                self._db.execute("DELETE FROM sessions WHERE spilled_at < ?", (time.time() - self.idle_ttl,))
+                self._db.commit()
+
+    def _over_limit(self) -> bool:
+        return len(self._lru) > self.max_sessions or bool(self.max_bytes and self._bytes > self.max_bytes)
+
+    def _evict_over_limit(self, keep: SessionKey | None = None) -> None:
+        if not self._over_limit():
+            return
+        for key in list(self._lru):
+            if key == keep or key in self._active:
+                continue
+            self._evict(key)
+            self._stats["evicted"] += 1
+            if not self._over_limit():
+                break
+
+    # --- SQLite spill ---
+
+    def _restore(self, key: SessionKey) -> bool:
+        """Moves a spilled session back into memory. Returns False if there is none."""
+        if self._db is None:
+            return False
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            ).fetchone()
+            if row is None:
+                return False
+            self._db.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+            self._db.commit()
+        session = Session.model_validate_json(row[0])
+        app_name, user_id, session_id = key
+        self.sessions.setdefault(app_name, {}).setdefault(user_id, {})[session_id] = session
+        self._touch(key, len(row[0]))
+        self._stats["restored"] += 1
+        self._evict_over_limit(keep=key)
+        return True
+
+    def _spilled_sessions(self, app_name: str, user_id: str) -> list[Session]:
+        if self._db is None:
+            return []
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT data FROM sessions WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            ).fetchall()
+        return [Session.model_validate_json(row[0]) for row in rows]
+
+    def _delete_spilled(self, key: SessionKey) -> None:
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+            self._db.commit()
+
+
+class PrunedDatabaseSessionService(_ActiveSessions, DatabaseSessionService):
+    """A database session service that deletes idle sessions and keeps at most `max_sessions`.
+
+    Every worker process prunes the shared database when it creates a
+    session, at most once per `prune_interval`. A session that an invocation
+    in this worker is running on is never deleted; runs in other workers keep
+    their sessions recently updated, and so out of reach of both limits.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600,
+        prune_interval: float = 60,
+        **kwargs: Any,
+    ):
+        super().__init__(db_url=db_url, **kwargs)
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.prune_interval = prune_interval
+        self._active: dict[SessionKey, int] = {}
+        self._pruned_at = 0.0
+        self._prune_lock = threading.Lock()
+        self._stats = {"evicted": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls, db_url: str) -> "PrunedDatabaseSessionService":
+        return cls(
+            db_url,
+            max_sessions=int(os.environ.get("SESSION_MAX_COUNT", 1000)),
+            idle_ttl=float(os.environ.get("SESSION_IDLE_TTL", 3600)),
+            prune_interval=float(os.environ.get("SESSION_PRUNE_INTERVAL", 60)),
+        )
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        now = time.monotonic()
+        if now - self._pruned_at >= self.prune_interval:
+            self._pruned_at = now
+            # The prune queries block, so they run on a thread. The active
+            # sessions are read here, on the event loop that updates them.
+            protected = set(self._active) | {(app_name, user_id, session.id)}
+            await asyncio.to_thread(self._prune, protected)
+        return session
+
+    def prune(self, keep: SessionKey | None = None) -> None:
+        """Deletes the sessions past the idle TTL or beyond the `max_sessions` most recent."""
+        self._prune(set(self._active) | ({keep} if keep else set()))
+
+    def _prune(self, protected: set[SessionKey]) -> None:
+        key_columns = (StorageSession.app_name, StorageSession.user_id, StorageSession.id)
+        # The database fills in update_time with its own clock, in UTC for SQLite.
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.idle_ttl)
+        with self._prune_lock, self.database_session_factory() as db:
+            expired = db.execute(select(*key_columns).where(StorageSession.update_time < cutoff)).all()
+            surplus = db.execute(
+                select(*key_columns)
+                .where(StorageSession.update_time >= cutoff)
+                .order_by(StorageSession.update_time.desc())
+                .offset(self.max_sessions)
+            ).all()
+            expired = [tuple(row) for row in expired if tuple(row) not in protected]
+            surplus = [tuple(row) for row in surplus if tuple(row) not in protected]
+            doomed = expired + surplus
+            if not doomed:
+                return
+            # SQLite does not cascade the delete to the events unless foreign keys are on.
+            db.execute(delete(StorageEvent).where(
+                tuple_(StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id).in_(doomed)
+            ))
+            db.execute(delete(StorageSession).where(tuple_(*key_columns).in_(doomed)))
+            db.commit()
+            self._stats["expired"] += len(expired)
+            self._stats["evicted"] += len(surplus)
+        logger.info(f"Pruned {len(expired)} idle and {len(surplus)} surplus sessions from the session database.")
+
+    def metrics(self) -> dict:
+        with self.database_session_factory() as db:
+            count = db.scalar(select(func.count()).select_from(StorageSession))
+        return {
+            "sessions": count,
+            "active_sessions": len(self._active),
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+            **self._stats,
+        }
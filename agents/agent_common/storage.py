@@ -0,0 +1,542 @@
+"""Object storage for the web app, the agents and the setup script.
+
+Everything that reads or writes `gs://` objects goes through this module, so
+they share one pooled Cloud Storage client (see `clients`), one retry policy
+and one set of metrics. Other paths are treated as local files, so callers
+need not tell the two apart.
+
+STORAGE_BACKEND picks where `gs://` objects live:
+
+- `gcs` (default): Cloud Storage. Transient errors (429, 5xx, dropped
+  connections) are retried with exponential backoff for up to
+  STORAGE_RETRY_TIMEOUT seconds.
+- `memory`: a dict in this process, for tests and benchmarks.
+- `local`: files under STORAGE_LOCAL_DIR, one folder per bucket, so the
+  app, the agents and the setup script can share objects offline.
+
+Objects larger than STORAGE_CHUNK_SIZE are uploaded in chunks with a
+resumable upload, and `open_read`/`open_write` stream an object in chunks
+of that size instead of holding it in memory.
+"""
+
+import io
+import logging
+import mimetypes
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import IO, NamedTuple
+
+from google.api_core import exceptions
+
+from . import clients
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gcs")
+STORAGE_LOCAL_DIR = os.environ.get("STORAGE_LOCAL_DIR", os.path.join(tempfile.gettempdir(), "storage"))
+# Cloud Storage requires chunk sizes in multiples of 256 KiB.
+STORAGE_CHUNK_SIZE = max(1, int(os.environ.get("STORAGE_CHUNK_SIZE", 8 * 1024 * 1024)) // (256 * 1024)) * 256 * 1024
+STORAGE_RETRY_TIMEOUT = float(os.environ.get("STORAGE_RETRY_TIMEOUT", 60))
+
+
+class ObjectInfo(NamedTuple):
+    """What `stat` returns. For local files, `generation` is the mtime in nanoseconds."""
+    generation: int
+    size: int
+    content_type: str | None = None
+
+
+def is_gcs_uri(uri: str) -> bool:
+    return uri.startswith("gs://")
+
+
+def split_uri(uri: str) -> tuple[str, str]:
+    """Splits `gs://bucket/name` into the bucket and object names."""
+    if not is_gcs_uri(uri) or "/" not in uri[len("gs://"):]:
+        raise ValueError(f"Not a gs://bucket/object URI: {uri}")
+    bucket_name, blob_name = uri[len("gs://"):].split("/", 1)
+    return bucket_name, blob_name
+
+
+# --- Metrics ---
+
+_metrics_lock = threading.Lock()
+_metrics: dict[str, dict] = {}
+_retries = 0
+
+
+def _count_retry(error: Exception) -> None:
+    global _retries
+    logger.warning(f"Retrying storage request after: {error}")
+    with _metrics_lock:
+        _retries += 1
+
+
+@contextmanager
+def _measure(operation: str):
+    """Counts an operation, its errors and its time. The caller adds the bytes to `counts["bytes"]`."""
+    counts = {"bytes": 0}
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield counts
+    except (exceptions.NotFound, exceptions.PreconditionFailed):
+        # Expected outcomes (probing for an object, create-if-missing), not errors.
+        raise
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _metrics_lock:
+            stats = _metrics.setdefault(operation, {"count": 0, "errors": 0, "bytes": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["bytes"] += counts["bytes"]
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+
+def metrics() -> dict:
+    """Counts, errors, bytes and latency per operation, and the number of retries."""
+    with _metrics_lock:
+        operations = {
+            operation: {
+                **{name: round(value, 1) if isinstance(value, float) else value for name, value in stats.items()},
+                "avg_ms": round(stats["total_ms"] / stats["count"], 1) if stats["count"] else 0.0,
+            }
+            for operation, stats in _metrics.items()
+        }
+        return {"backend": backend().name, "retries": _retries, "operations": operations}
+
+
+# --- Backends ---
+
+class GcsBackend:
+    """Cloud Storage, through the shared client."""
+
+    name = "gcs"
+
+    def __init__(self):
+        from google.api_core import retry as api_retry
+
+        self.retry = api_retry.Retry(
+            predicate=api_retry.if_exception_type(
+                exceptions.TooManyRequests,
+                exceptions.InternalServerError,
+                exceptions.BadGateway,
+                exceptions.ServiceUnavailable,
+                exceptions.GatewayTimeout,
+                exceptions.RequestTimeout,
+                ConnectionError,
+                _requests_connection_error(),
+            ),
+            initial=0.5,
+            maximum=8.0,
+            timeout=STORAGE_RETRY_TIMEOUT,
+            on_error=_count_retry,
+        )
+
+    def _blob(self, bucket_name: str, blob_name: str, generation: int | None = None):
+        return clients.storage_client().bucket(bucket_name).blob(blob_name, generation=generation)
+
+    def stat(self, bucket_name: str, blob_name: str) -> ObjectInfo:
+        blob = self._blob(bucket_name, blob_name)
+        blob.reload(retry=self.retry)
+        return ObjectInfo(blob.generation, blob.size, blob.content_type)
+
+    def read(self, bucket_name: str, blob_name: str, generation: int | None = None) -> bytes:
+        return self._blob(bucket_name, blob_name, generation).download_as_bytes(retry=self.retry)
+
+    def open_read(self, bucket_name: str, blob_name: str, generation: int | None = None,
+                  chunk_size: int | None = None) -> IO[bytes]:
+        blob = self._blob(bucket_name, blob_name, generation)
+        return blob.open("rb", chunk_size=chunk_size or STORAGE_CHUNK_SIZE, retry=self.retry)
+
+    def write(self, bucket_name: str, blob_name: str, data: bytes, content_type: str | None,
+              cache_control: str | None, if_generation_match: int | None) -> None:
+        blob = self._blob(bucket_name, blob_name)
+        blob.cache_control = cache_control
+        if len(data) > STORAGE_CHUNK_SIZE:
+            blob.chunk_size = STORAGE_CHUNK_SIZE
+        blob.upload_from_string(
+            data, content_type=content_type, if_generation_match=if_generation_match, retry=self.retry
+        )
+
+    def upload(self, bucket_name: str, blob_name: str, file_obj: IO[bytes], size: int | None,
+               content_type: str | None, cache_control: str | None) -> None:
+        blob = self._blob(bucket_name, blob_name)
+        blob.cache_control = cache_control
+        # Small files go up in one request; larger ones (or of unknown size) in chunks.
+        if size is None or size > STORAGE_CHUNK_SIZE:
+            blob.chunk_size = STORAGE_CHUNK_SIZE
+        blob.upload_from_file(file_obj, size=size, content_type=content_type, retry=self.retry)
+
+    def open_write(self, bucket_name: str, blob_name: str, content_type: str | None, cache_control: str | None) -> IO[bytes]:
+        blob = self._blob(bucket_name, blob_name)
+        blob.cache_control = cache_control
+        return blob.open("wb", chunk_size=STORAGE_CHUNK_SIZE, content_type=content_type, retry=self.retry)
+
+    def exists(self, bucket_name: str, blob_name: str) -> bool:
+        return self._blob(bucket_name, blob_name).exists(retry=self.retry)
+
+    def delete(self, bucket_name: str, blob_name: str) -> None:
+        self._blob(bucket_name, blob_name).delete(retry=self.retry)
+
+    def signed_url(self, bucket_name: str, blob_name: str, expiration: timedelta) -> str:
+        return self._blob(bucket_name, blob_name).generate_signed_url(version="v4", expiration=expiration, method="GET")
+
+    def create_bucket(self, bucket_name: str) -> None:
+        clients.storage_client().create_bucket(bucket_name, retry=self.retry)
+
+
+def _requests_connection_error():
+    try:
+        from requests.exceptions import ConnectionError as RequestsConnectionError
+    except ImportError:
+        return ConnectionError
+    return RequestsConnectionError
+
+
+class _MemoryWriter(io.BytesIO):
+    def __init__(self, on_close):
+        super().__init__()
+        self._on_close = on_close
+
+    def close(self):
+        if not self.closed:
+            self._on_close(self.getvalue())
+        super().close()
+
+
+class MemoryBackend:
+    """Objects in a dict of this process. Generations count up from 1 per write."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (bucket, name) -> (data, generation, content type, cache control)
+        self._objects: dict[tuple[str, str], tuple[bytes, int, str | None, str | None]] = {}
+        self._generation = 0
+
+    def _get(self, bucket_name: str, blob_name: str, generation: int | None = None):
+        with self._lock:
+            entry = self._objects.get((bucket_name, blob_name))
+        if entry is None or (generation is not None and entry[1] != generation):
+            raise exceptions.NotFound(f"gs://{bucket_name}/{blob_name} not found")
+        return entry
+
+    def stat(self, bucket_name: str, blob_name: str) -> ObjectInfo:
+        data, generation, content_type, _ = self._get(bucket_name, blob_name)
+        return ObjectInfo(generation, len(data), content_type)
+
+    def read(self, bucket_name: str, blob_name: str, generation: int | None = None) -> bytes:
+        return self._get(bucket_name, blob_name, generation)[0]
+
+    def open_read(self, bucket_name: str, blob_name: str, generation: int | None = None,
+                  chunk_size: int | None = None) -> IO[bytes]:
+        return io.BytesIO(self.read(bucket_name, blob_name, generation))
+
+    def write(self, bucket_name: str, blob_name: str, data: bytes, content_type: str | None,
+              cache_control: str | None, if_generation_match: int | None) -> None:
+        with self._lock:
+            current = self._objects.get((bucket_name, blob_name))
+            if if_generation_match is not None and (current[1] if current else 0) != if_generation_match:
+                raise exceptions.PreconditionFailed(f"gs://{bucket_name}/{blob_name} does not match generation {if_generation_match}")
+            self._generation += 1
+            self._objects[(bucket_name, blob_name)] = (bytes(data), self._generation, content_type, cache_control)
+
+    def upload(self, bucket_name: str, blob_name: str, file_obj: IO[bytes], size: int | None,
+               content_type: str | None, cache_control: str | None) -> None:
+        self.write(bucket_name, blob_name, file_obj.read(), content_type, cache_control, None)
+
+    def open_write(self, bucket_name: str, blob_name: str, content_type: str | None, cache_control: str | None) -> IO[bytes]:
+        return _MemoryWriter(lambda data: self.write(bucket_name, blob_name, data, content_type, cache_control, None))
+
+    def exists(self, bucket_name: str, blob_name: str) -> bool:
+        with self._lock:
+            return (bucket_name, blob_name) in self._objects
+
+    def delete(self, bucket_name: str, blob_name: str) -> None:
+        with self._lock:
+            if self._objects.pop((bucket_name, blob_name), None) is None:
+                raise exceptions.NotFound(f"gs://{bucket_name}/{blob_name} not found")
+
+    def signed_url(self, bucket_name: str, blob_name: str, expiration: timedelta) -> str:
+        self._get(bucket_name, blob_name)
+        return f"memory://{bucket_name}/{blob_name}"
+
+    def create_bucket(self, bucket_name: str) -> None:
+        # Buckets exist implicitly.
+        pass
+
+
+# --- Local files, for local paths and the `local` backend ---
+
+def _file_stat(path: str) -> ObjectInfo:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise exceptions.NotFound(f"{path} not found") from None
+    return ObjectInfo(stat.st_mtime_ns, stat.st_size, mimetypes.guess_type(path)[0])
+
+
+def _file_open_read(path: str, generation: int | None = None) -> IO[bytes]:
+    if generation is not None and _file_stat(path).generation != generation:
+        raise exceptions.NotFound(f"{path} has changed")
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        raise exceptions.NotFound(f"{path} not found") from None
+
+
+def _file_write(path: str, data: bytes, if_generation_match: int | None) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    if if_generation_match == 0:
+        # Create only if missing, atomically.
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            raise exceptions.PreconditionFailed(f"{path} already exists") from None
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return
+    if if_generation_match is not None:
+        try:
+            current = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            current = 0
+        if current != if_generation_match:
+            raise exceptions.PreconditionFailed(f"{path} does not match generation {if_generation_match}")
+    # Write to a temporary file first so readers never see a partial file.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _file_open_write(path: str) -> IO[bytes]:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return open(path, "wb")
+
+
+def _file_delete(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        raise exceptions.NotFound(f"{path} not found") from None
+
+
+class LocalDirBackend:
+    """Objects as files under `root`, at `<root>/<bucket>/<name>`. Content types are guessed from the name."""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket_name: str, blob_name: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, bucket_name, blob_name))
+        if not path.startswith(os.path.normpath(os.path.join(self.root, bucket_name)) + os.sep):
+            raise ValueError(f"Object name escapes its bucket: {blob_name}")
+        return path
+
+    def stat(self, bucket_name: str, blob_name: str) -> ObjectInfo:
+        return _file_stat(self._path(bucket_name, blob_name))
+
+    def read(self, bucket_name: str, blob_name: str, generation: int | None = None) -> bytes:
+        with self.open_read(bucket_name, blob_name, generation) as f:
+            return f.read()
+
+    def open_read(self, bucket_name: str, blob_name: str, generation: int | None = None,
+                  chunk_size: int | None = None) -> IO[bytes]:
+        return _file_open_read(self._path(bucket_name, blob_name), generation)
+
+    def write(self, bucket_name: str, blob_name: str, data: bytes, content_type: str | None,
+              cache_control: str | None, if_generation_match: int | None) -> None:
+        _file_write(self._path(bucket_name, blob_name), data, if_generation_match)
+
+    def upload(self, bucket_name: str, blob_name: str, file_obj: IO[bytes], size: int | None,
+               content_type: str | None, cache_control: str | None) -> None:
+        with self.open_write(bucket_name, blob_name, content_type, cache_control) as f:
+            while chunk := file_obj.read(STORAGE_CHUNK_SIZE):
+                f.write(chunk)
+
+    def open_write(self, bucket_name: str, blob_name: str, content_type: str | None, cache_control: str | None) -> IO[bytes]:
+        return _file_open_write(self._path(bucket_name, blob_name))
+
+    def exists(self, bucket_name: str, blob_name: str) -> bool:
+        return os.path.exists(self._path(bucket_name, blob_name))
+
+    def delete(self, bucket_name: str, blob_name: str) -> None:
+        _file_delete(self._path(bucket_name, blob_name))
+
+    def signed_url(self, bucket_name: str, blob_name: str, expiration: timedelta) -> str:
+        return pathlib.Path(self._path(bucket_name, blob_name)).as_uri()
+
+    def create_bucket(self, bucket_name: str) -> None:
+        os.makedirs(os.path.join(self.root, bucket_name), exist_ok=True)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    """Returns the backend for `gs://` URIs, creating it from STORAGE_BACKEND on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND == "memory":
+                    _backend = MemoryBackend()
+                elif STORAGE_BACKEND == "local":
+                    _backend = LocalDirBackend(STORAGE_LOCAL_DIR)
+                elif STORAGE_BACKEND == "gcs":
+                    _backend = GcsBackend()
+                else:
+                    raise ValueError(f"STORAGE_BACKEND must be gcs, memory or local, not {STORAGE_BACKEND!r}")
+    return _backend
+
+
+def use_backend(new_backend) -> object:
+    """Replaces the backend for `gs://` URIs (e.g. with a MemoryBackend in a test) and returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, new_backend
+    return previous
+
+
+# --- Operations on gs:// URIs and local paths ---
+
+def stat(uri: str) -> ObjectInfo:
+    """The generation, size and content type of an object. Raises NotFound if it does not exist."""
+    with _measure("stat"):
+        if is_gcs_uri(uri):
+            return backend().stat(*split_uri(uri))
+        return _file_stat(uri)
+
+
+def read_bytes(uri: str, generation: int | None = None) -> bytes:
+    """
+    Reads a whole object. With `generation` (from `stat`), reads that version
+    of it and raises NotFound if it has been replaced since.
+    """
+    with _measure("read") as counts:
+        if is_gcs_uri(uri):
+            data = backend().read(*split_uri(uri), generation)
+        else:
+            with _file_open_read(uri, generation) as f:
+                data = f.read()
+        counts["bytes"] = len(data)
+        return data
+
+
+def read_text(uri: str) -> str:
+    return read_bytes(uri).decode("utf-8")
+
+
+@contextmanager
+def open_read(uri: str, generation: int | None = None, chunk_size: int | None = None):
+    """
+    Opens an object for reading, fetching it in chunks of STORAGE_CHUNK_SIZE
+    as it is read. A smaller `chunk_size` suits reading only the start of an
+    object, such as an image header.
+    """
+    with _measure("open_read"):
+        if is_gcs_uri(uri):
+            f = backend().open_read(*split_uri(uri), generation, chunk_size)
+        else:
+            f = _file_open_read(uri, generation)
+    with f:
+        yield f
+
+
+def write_bytes(uri: str, data: bytes, content_type: str | None = None, cache_control: str | None = None,
+                if_generation_match: int | None = None) -> None:
+    """
+    Writes a whole object. `if_generation_match=0` only creates it if it does
+    not exist yet; otherwise PreconditionFailed is raised. Content type and
+    cache control are kept only by the `gcs` and `memory` backends.
+    """
+    with _measure("write") as counts:
+        counts["bytes"] = len(data)
+        if is_gcs_uri(uri):
+            backend().write(*split_uri(uri), data, content_type, cache_control, if_generation_match)
+        else:
+            _file_write(uri, data, if_generation_match)
+
+
+def upload_file(uri: str, path: str, content_type: str | None = None, cache_control: str | None = None) -> None:
+    """Uploads a local file, streaming it in chunks when it is larger than STORAGE_CHUNK_SIZE."""
+    content_type = content_type or mimetypes.guess_type(path)[0]
+    with _measure("write") as counts:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            if is_gcs_uri(uri):
+                backend().upload(*split_uri(uri), f, size, content_type, cache_control)
+            else:
+                with _file_open_write(uri) as out:
+                    while chunk := f.read(STORAGE_CHUNK_SIZE):
+                        out.write(chunk)
+        counts["bytes"] = size
+
+
+@contextmanager
+def open_write(uri: str, content_type: str | None = None, cache_control: str | None = None):
+    """Opens an object for writing, uploading it in chunks as it is written. It is complete once closed."""
+    with _measure("open_write"):
+        if is_gcs_uri(uri):
+            f = backend().open_write(*split_uri(uri), content_type, cache_control)
+        else:
+            f = _file_open_write(uri)
+    with f:
+        yield f
+
+
+def exists(uri: str) -> bool:
+    with _measure("exists"):
+        if is_gcs_uri(uri):
+            return backend().exists(*split_uri(uri))
+        return os.path.exists(uri)
+
+
+def delete(uri: str, missing_ok: bool = True) -> None:
+    try:
+        with _measure("delete"):
+            if is_gcs_uri(uri):
+                backend().delete(*split_uri(uri))
+            else:
+                _file_delete(uri)
+    except exceptions.NotFound:
+        if not missing_ok:
+            raise
+
+
+def create_bucket(bucket_name: str) -> None:
+    """Creates a bucket. With the `gcs` backend, raises Conflict if it already exists."""
+    with _measure("create_bucket"):
+        backend().create_bucket(bucket_name)
+
+
+def signed_url(uri: str, expiration: timedelta = timedelta(minutes=60)) -> str:
+    """A URL that lets a browser fetch the object until `expiration` has passed.
+
+    Only the `gcs` backend signs URLs. The `memory` and `local` backends
+    return `memory://` and `file://` URIs, which browsers cannot open, so the
+    web app serves their objects itself.
+    """
+    with _measure("sign"):
+        return backend().signed_url(*split_uri(uri), expiration)
@@ -0,0 +1,98 @@
+"""A2A task store shared by the worker processes of one agent server."""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from a2a.server.tasks import TaskStore
+from a2a.types import Task, TaskState
+
+logger = logging.getLogger(__name__)
+
+# Tasks in these states never change again, so they can be dropped once old.
+TERMINAL_STATES = (TaskState.completed, TaskState.canceled, TaskState.failed, TaskState.rejected)
+
+
+class SqliteTaskStore(TaskStore):
+    """Stores A2A tasks as JSON in a SQLite file.
+
+    Every uvicorn worker opens the same file, so a task created by one worker
+    can be fetched with `tasks/get` from any other. SQLite calls run on a
+    thread so they do not block the event loop.
+
+    Tasks that ended (completed, canceled, failed or rejected) more than `ttl`
+    seconds ago are deleted. Every worker prunes the shared file when it saves
+    a task, at most once per `prune_interval`.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, prune_interval: float = 60):
+        self.path = path
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            # WAL lets readers in other workers proceed while one worker writes.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(tasks)")}
+            if "updated_at" not in columns:
+                # Files written before tasks expired have no update times; their tasks count as old.
+                self._db.execute("ALTER TABLE tasks ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+            self._db.commit()
+        logger.info(f"Using SQLite task store at {path}")
+
+    @classmethod
+    def from_env(cls, path: str) -> "SqliteTaskStore":
+        return cls(
+            path,
+            ttl=float(os.environ.get("TASK_TTL", 3600)),
+            prune_interval=float(os.environ.get("TASK_PRUNE_INTERVAL", 60)),
+        )
+
+    def _execute(self, sql: str, params: tuple, fetch: bool = False):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            row = cursor.fetchone() if fetch else None
+            self._db.commit()
+            return row
+
+    async def save(self, task: Task) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO tasks (id, data, updated_at) VALUES (?, ?, ?)",
+            (task.id, task.model_dump_json(exclude_none=True), time.time()),
+        )
+        now = time.monotonic()
+        if now - self._pruned_at >= self.prune_interval:
+            self._pruned_at = now
+            await asyncio.to_thread(self.prune)
+
+    async def get(self, task_id: str) -> Task | None:
+        row = await asyncio.to_thread(self._execute, "SELECT data FROM tasks WHERE id = ?", (task_id,), True)
+        return Task.model_validate_json(row[0]) if row else None
+
+    async def delete(self, task_id: str) -> None:
+        await asyncio.to_thread(self._execute, "DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def prune(self) -> int:
+        """Deletes the tasks that ended more than `ttl` seconds ago and returns how many."""
+        # Wall-clock time, since the update times are shared between processes.
+        cutoff = time.time() - self.ttl
+        states = tuple(state.value for state in TERMINAL_STATES)
+        with self._lock:
+            cursor = self._db.execute(
+                f"DELETE FROM tasks WHERE updated_at < ? AND json_extract(data, '$.status.state') IN ({', '.join('?' * len(states))})",
+                (cutoff, *states),
+            )
+            self._db.commit()
+            expired = cursor.rowcount
+        if expired:
+            logger.info(f"Pruned {expired} finished tasks from the task store.")
+        return expired
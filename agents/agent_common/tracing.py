@@ -0,0 +1,158 @@
+"""OpenTelemetry setup and A2A trace context propagation.
+
+TRACE_EXPORTER selects where spans go:
+  none     - tracing stays a no-op (default)
+  console  - one JSON span per line on stdout
+  file     - one JSON span per line appended to TRACE_FILE
+  gcp      - Cloud Trace (needs opentelemetry-exporter-gcp-trace)
+Other exporters can be added with `register_exporter`.
+
+The trace context of a delegation travels in the A2A message metadata under
+TRACE_METADATA_KEY as W3C `traceparent`/`tracestate` headers, so spans of a
+remote agent join the orchestrator's trace.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").strip().lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+# The metadata key of the trace context; the orchestrator writes it with `inject`.
+TRACE_METADATA_KEY = "trace_context"
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _json_exporter(stream):
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    return ConsoleSpanExporter(
+        out=stream,
+        formatter=lambda span: json.dumps(json.loads(span.to_json())) + "\n",
+    )
+
+
+def _gcp_exporter():
+    from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+
+    return CloudTraceSpanExporter(project_id=os.environ.get("GOOGLE_CLOUD_PROJECT"))
+
+
+_EXPORTERS: dict[str, Callable] = {
+    "console": lambda: _json_exporter(sys.stdout),
+    "file": lambda: _json_exporter(open(TRACE_FILE, "a", encoding="utf-8")),
+    "gcp": _gcp_exporter,
+}
+
+
+def register_exporter(name: str, factory: Callable) -> None:
+    """Makes a span exporter available as TRACE_EXPORTER=<name>."""
+    _EXPORTERS[name] = factory
+
+
+def configure(service_name: str) -> bool:
+    """Installs a tracer provider for this process. Returns True if spans are exported.
+
+    Safe to call more than once; a provider that is already installed (for
+    example by Agent Engine) is left alone.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured or TRACE_EXPORTER in ("", "none"):
+            return _configured
+        factory = _EXPORTERS.get(TRACE_EXPORTER)
+        if factory is None:
+            logger.error(f"Unknown TRACE_EXPORTER '{TRACE_EXPORTER}'. Expected one of: none, {', '.join(_EXPORTERS)}")
+            return False
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+            if isinstance(trace.get_tracer_provider(), TracerProvider):
+                logger.info("A tracer provider is already installed, not replacing it.")
+                _configured = True
+                return True
+            provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+            exporter = factory()
+            # Local exporters are cheap and should not lose spans on exit.
+            processor = BatchSpanProcessor(exporter) if TRACE_EXPORTER == "gcp" else SimpleSpanProcessor(exporter)
+            provider.add_span_processor(processor)
+            trace.set_tracer_provider(provider)
+        except Exception as e:
+            logger.error(f"Could not set up the '{TRACE_EXPORTER}' trace exporter: {e}")
+            return False
+        _configured = True
+        logger.info(f"Tracing '{service_name}' with the '{TRACE_EXPORTER}' exporter.")
+        return True
+
+
+def get_tracer(name: str) -> trace.Tracer:
+    return trace.get_tracer(name)
+
+
+def inject(metadata: dict | None = None) -> dict:
+    """Returns the A2A message metadata with the current trace context added."""
+    carrier: dict[str, str] = {}
+    propagate.inject(carrier)
+    metadata = dict(metadata or {})
+    if carrier:
+        metadata[TRACE_METADATA_KEY] = carrier
+    return metadata
+
+
+def extract(metadata: dict | None) -> otel_context.Context | None:
+    """Returns the trace context carried in A2A message metadata, if any."""
+    carrier = (metadata or {}).get(TRACE_METADATA_KEY)
+    if not isinstance(carrier, dict):
+        return None
+    return propagate.extract(carrier)
+
+
+@contextlib.contextmanager
+def remote_span(tracer: trace.Tracer, name: str, metadata: dict | None, attributes: dict | None = None):
+    """Starts a span as a child of the trace context in `metadata`, or of the current span."""
+    with tracer.start_as_current_span(name, context=extract(metadata), attributes=attributes) as span:
+        yield span
+
+
+# --- In-process hand-off ---
+# Agent Engine's AdkApp runs each query on a thread of its own, so the web
+# app's span is not the current span when the orchestrator runs in the same
+# process. The web app parks its context under the session's relay channel
+# and the orchestrator picks it up from there.
+_parked: OrderedDict[str, otel_context.Context] = OrderedDict()
+_parked_lock = threading.Lock()
+_MAX_PARKED = 1024
+
+
+def park(key: str, ctx: otel_context.Context | None = None) -> None:
+    with _parked_lock:
+        _parked[key] = ctx if ctx is not None else otel_context.get_current()
+        _parked.move_to_end(key)
+        while len(_parked) > _MAX_PARKED:
+            _parked.popitem(last=False)
+
+
+def unpark(key: str) -> None:
+    with _parked_lock:
+        _parked.pop(key, None)
+
+
+def parked(key: str | None) -> otel_context.Context | None:
+    if not key:
+        return None
+    with _parked_lock:
+        return _parked.get(key)
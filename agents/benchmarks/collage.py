@@ -0,0 +1,324 @@
+"""Benchmark of collage rendering.
+
+Renders collages of synthetic photos with the memory agent's renderer, from
+and to local files, and reports for each scenario the wall time, the time
+spent in each stage and the peak RSS. The results are compared to the
+baseline stored in `collage_baseline.json`, and the run fails if a scenario
+got slower or bigger than the tolerance allows. Timings and RSS only compare
+on the machine and with the settings the baseline was recorded with, so the
+run refuses to compare against any other baseline; record one first.
+
+Run it from the `agents` directory:
+
+    python -m benchmarks.collage                     # compare to the baseline
+    python -m benchmarks.collage --save-baseline     # record a new baseline
+    python -m benchmarks.collage --scenario 12mp-9-mixed --repeats 5
+
+Each scenario runs in a fresh process, so its peak RSS is what a memory
+agent needs to render that collage. The collage settings (COLLAGE_LAYOUT,
+COLLAGE_FORMAT, TILE_CACHE_DIR, ...) are read from the environment as in
+the agent, except that collage dedupe is always off. With `--storage
+memory`, the photos and collages are gs:// objects in the in-memory storage
+backend, so the agent's Cloud Storage code path is measured offline too.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+# Megapixels of the synthetic photos.
+RESOLUTIONS = {"2mp": 2_000_000, "12mp": 12_000_000, "24mp": 24_000_000}
+
+# Aspect ratios (width, height) that the photos of a scenario cycle through.
+ASPECT_MIXES = {
+    "landscape": [(4, 3)],
+    "portrait": [(3, 4)],
+    "mixed": [(4, 3), (3, 4), (1, 1), (16, 9), (2, 3)],
+    "panorama": [(4, 3), (3, 1), (3, 4), (21, 9)],
+}
+
+# (resolution, number of photos, aspect mix)
+SCENARIOS = [
+    ("2mp", 4, "landscape"),
+    ("2mp", 16, "mixed"),
+    ("12mp", 4, "mixed"),
+    ("12mp", 9, "mixed"),
+    ("12mp", 16, "portrait"),
+    ("24mp", 9, "panorama"),
+    ("24mp", 16, "mixed"),
+]
+
+# Reported per scenario, in this order: the median over the repeats of each
+# timing, in milliseconds, and the peak RSS of the scenario's process.
+# load: download and header parsing, wall time; decode and resize: summed
+# over the loader threads; tiles: wall time of decoding, resizing and
+# pasting all tiles; compose: pasting; encode and save: the final image.
+COLUMNS = ["wall_ms", "load_ms", "decode_ms", "resize_ms", "tiles_ms", "compose_ms", "encode_ms", "save_ms", "peak_rss_mb"]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "collage_baseline.json")
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scenario_name(resolution: str, count: int, mix: str) -> str:
+  return f"{resolution}-{count}-{mix}"
+
+
+def _photo_size(megapixels: int, aspect: tuple[int, int]) -> tuple[int, int]:
+  width = int(math.sqrt(megapixels * aspect[0] / aspect[1]))
+  return width, int(width * aspect[1] / aspect[0])
+
+
+def _make_photo(path: str, size: tuple[int, int], seed: int) -> None:
+  """Writes a JPEG with smooth gradients, texture and shapes, so it encodes roughly like a photo."""
+  from PIL import Image, ImageDraw
+
+  rng = random.Random(seed)
+  width, height = size
+  small = (max(1, width // 8), max(1, height // 8))
+  channels = []
+  for _ in range(3):
+    gradient = Image.linear_gradient("L").rotate(rng.randrange(360)).resize(small)
+    noise = Image.effect_noise(small, rng.randrange(20, 60))
+    channels.append(Image.blend(gradient, noise, 0.3).resize(size, Image.Resampling.BILINEAR))
+  img = Image.merge("RGB", channels)
+
+  draw = ImageDraw.Draw(img)
+  for _ in range(40):
+    x, y = rng.randrange(width), rng.randrange(height)
+    radius = rng.randrange(max(2, min(size) // 20), max(3, min(size) // 4))
+    color = tuple(rng.randrange(256) for _ in range(3))
+    draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+  img.save(path, quality=90)
+
+
+def make_photos(workdir: str, resolution: str, count: int, mix: str) -> list[str]:
+  """Creates the scenario's photos under `workdir`, unless they are there already."""
+  folder = os.path.join(workdir, "photos", f"{resolution}-{mix}")
+  os.makedirs(folder, exist_ok=True)
+  aspects = ASPECT_MIXES[mix]
+  paths = []
+  for i in range(count):
+    aspect = aspects[i % len(aspects)]
+    path = os.path.join(folder, f"{i:02d}_{aspect[0]}x{aspect[1]}.jpg")
+    if not os.path.exists(path):
+      _make_photo(path, _photo_size(RESOLUTIONS[resolution], aspect), seed=zlib.crc32(f"{resolution}-{mix}-{i}".encode()))
+    paths.append(path)
+  return paths
+
+
+def _peak_rss_mb() -> float:
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kilobytes, macOS bytes.
+  return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scenario(paths: list[str], output_path: str, repeats: int) -> dict:
+  """
+  Renders the collage `repeats` times in this process and returns the
+  median timings and the peak RSS.
+
+  One more, untimed render comes first, so thread pool startup and codec
+  loading are not counted.
+  """
+  os.environ["COLLAGE_DEDUPE"] = "0"
+  from agent_common import storage
+  from memory_agent import render
+
+  if storage.STORAGE_BACKEND == "memory":
+    uris = [f"gs://collage-benchmark/photos/{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}" for path in paths]
+    for path, uri in zip(paths, uris):
+      storage.upload_file(uri, path)
+    paths = uris
+    output_path = f"gs://collage-benchmark/collages/{os.path.basename(output_path)}"
+
+  idle_rss_mb = _peak_rss_mb()
+  runs = []
+  for _ in range(repeats + 1):
+    stats = {}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+      message = render.render_collage(paths, output_path, stats)
+    stats["wall_ms"] = (time.perf_counter() - started) * 1000
+    if message.startswith("Error"):
+      raise RuntimeError(message)
+    runs.append(stats)
+  runs = runs[1:]
+
+  result = {
+      "load_ms": statistics.median(run["fetch_wall_ms"] for run in runs),
+      "tiles_ms": statistics.median(run["tile_wall_ms"] for run in runs),
+  }
+  for column in ("wall_ms", "decode_ms", "resize_ms", "compose_ms", "encode_ms", "save_ms"):
+    result[column] = statistics.median(run.get(column, 0.0) for run in runs)
+  result = {column: round(value, 1) for column, value in result.items()}
+  result.update(
+      peak_rss_mb=_peak_rss_mb(),
+      idle_rss_mb=idle_rss_mb,
+      canvas=f"{runs[-1]['width']}x{runs[-1]['height']}",
+      bytes=runs[-1]["bytes"],
+      repeats=repeats,
+  )
+  return result
+
+
+def _run_in_subprocess(name: str, paths: list[str], output_path: str, repeats: int, storage_backend: str) -> dict:
+  command = [
+      sys.executable, "-m", "benchmarks.collage",
+      "--child", "--repeats", str(repeats), "--output-path", output_path, *paths,
+  ]
+  env = dict(os.environ)
+  # As in the memory agent's container image.
+  env.setdefault("MALLOC_MMAP_THRESHOLD_", "131072")
+  if storage_backend == "memory":
+    env["STORAGE_BACKEND"] = "memory"
+  completed = subprocess.run(command, cwd=AGENTS_DIR, env=env, capture_output=True, text=True)
+  if completed.returncode != 0:
+    raise RuntimeError(f"Scenario {name} failed:\n{completed.stderr}")
+  return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _settings() -> dict:
+  names = ("COLLAGE_LAYOUT", "COLLAGE_FORMAT", "COLLAGE_QUALITY", "COLLAGE_TARGET_BYTES", "IMAGE_LOAD_WORKERS", "TILE_CACHE_DIR")
+  return {name: os.environ[name] for name in names if name in os.environ}
+
+
+def _machine() -> dict:
+  from PIL import __version__ as pillow_version
+
+  return {
+      "platform": platform.platform(),
+      "python": platform.python_version(),
+      "pillow": pillow_version,
+      "cpu_count": os.cpu_count(),
+  }
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float, time_slack_ms: float, rss_tolerance: float) -> list[str]:
+  """
+  Returns a description of every scenario that is slower or bigger than its baseline allows.
+
+  A scenario is slower only if its wall time is above the baseline by both
+  `time_tolerance` (a fraction) and `time_slack_ms`, so the noise of short
+  scenarios does not count.
+  """
+  regressions = []
+  for name, result in results.items():
+    base = baseline.get("scenarios", {}).get(name)
+    if base is None:
+      continue
+    limit = max(base["wall_ms"] * (1 + time_tolerance), base["wall_ms"] + time_slack_ms)
+    if result["wall_ms"] > limit:
+      regressions.append(f"{name}: wall time {result['wall_ms']:.0f} ms, baseline {base['wall_ms']:.0f} ms")
+    if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_tolerance):
+      regressions.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f} MB, baseline {base['peak_rss_mb']:.0f} MB")
+  return regressions
+
+
+def _format_change(value: float, base: float | None) -> str:
+  if not base:
+    return ""
+  return f" ({(value - base) / base:+.0%})"
+
+
+def print_table(results: dict, baseline: dict) -> None:
+  header = ["scenario", *COLUMNS, "canvas", "bytes"]
+  rows = []
+  for name, result in results.items():
+    base = baseline.get("scenarios", {}).get(name, {})
+    row = [name]
+    for column in COLUMNS:
+      cell = f"{result[column]:.0f}"
+      if column in ("wall_ms", "peak_rss_mb"):
+        cell += _format_change(result[column], base.get(column))
+      row.append(cell)
+    row += [result["canvas"], str(result["bytes"])]
+    rows.append(row)
+  widths = [max(len(str(row[i])) for row in [header, *rows]) for i in range(len(header))]
+  for row in [header, *rows]:
+    print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Benchmark collage rendering on synthetic photos.")
+  parser.add_argument("--scenario", action="append", help="Only run this scenario (repeatable).")
+  parser.add_argument("--repeats", type=int, default=5, help="Renders per scenario; the median is reported.")
+  parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "collage-benchmark"),
+                      help="Where the synthetic photos and collages are written. Photos are reused across runs.")
+  parser.add_argument("--storage", choices=["local", "memory"], default="local",
+                      help="Read and write local files, or gs:// objects in the in-memory storage backend.")
+  parser.add_argument("--baseline", default=BASELINE_PATH)
+  parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+  parser.add_argument("--time-tolerance", type=float, default=0.3, help="Allowed wall time increase, as a fraction.")
+  parser.add_argument("--time-slack-ms", type=float, default=50, help="Wall time increase that is always allowed.")
+  parser.add_argument("--rss-tolerance", type=float, default=0.15, help="Allowed peak RSS increase, as a fraction.")
+  parser.add_argument("--json", help="Also write the results to this file.")
+  # Internal: render one scenario in this process and print its results.
+  parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+  parser.add_argument("--output-path", help=argparse.SUPPRESS)
+  parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.child:
+    print(json.dumps(run_scenario(args.paths, args.output_path, args.repeats)))
+    return 0
+
+  scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario_name(*scenario) in args.scenario]
+  if not scenarios:
+    parser.error(f"No such scenario. Scenarios: {', '.join(scenario_name(*s) for s in SCENARIOS)}")
+
+  baseline = {}
+  machine, settings = _machine(), {**_settings(), "storage": args.storage}
+  if os.path.exists(args.baseline) and not args.save_baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    for key, current in (("machine", machine), ("settings", settings)):
+      if baseline.get(key) != current:
+        print(f"The baseline in {args.baseline} was recorded with {key} {json.dumps(baseline.get(key))}, "
+              f"not {json.dumps(current)}. Record one here with --save-baseline, or pass another --baseline.",
+              file=sys.stderr)
+        return 2
+
+  results = {}
+  for scenario in scenarios:
+    name = scenario_name(*scenario)
+    print(f"Running {name}...", file=sys.stderr)
+    paths = make_photos(args.workdir, *scenario)
+    os.makedirs(os.path.join(args.workdir, "collages"), exist_ok=True)
+    output_path = os.path.join(args.workdir, "collages", name)
+    results[name] = _run_in_subprocess(name, paths, output_path, args.repeats, args.storage)
+
+  print_table(results, baseline)
+  report = {"machine": machine, "settings": settings, "scenarios": results}
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+
+  if args.save_baseline:
+    with open(args.baseline, "w") as f:
+      json.dump(report, f, indent=2)
+      f.write("\n")
+    print(f"Saved the baseline to {args.baseline}")
+    return 0
+
+  if baseline:
+    regressions = compare(results, baseline, args.time_tolerance, args.time_slack_ms, args.rss_tolerance)
+    for regression in regressions:
+      print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
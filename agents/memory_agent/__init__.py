@@ -1 +1,9 @@
-from . import agent
+import importlib
+
+
+def __getattr__(name):
+  # `agent` pulls in ADK. It is imported on first use, so the collage worker
+  # processes, which only need `render`, do not load it.
+  if name == "agent":
+    return importlib.import_module(f"{__name__}.agent")
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,16 @@
 from a2a.server.apps import A2AStarletteApplication
 from a2a.types import AgentCard, AgentCapabilities, AgentSkill
-from a2a.server.tasks import InMemoryTaskStore
 from a2a.server.request_handlers import DefaultRequestHandler
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.artifacts import InMemoryArtifactService
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 import os
 import logging
 from dotenv import load_dotenv
 from memory_agent.agent_executor import MemoryAgentExecutor
-import uvicorn
-from memory_agent import agent
+from agent_common import llm_replay, serving, storage
+from memory_agent import agent, collage_pool, tile_cache
 
 
 load_dotenv()
@@ -34,7 +32,7 @@ class MemoryAgent:
             app_name=self._agent.name,
             agent=self._agent,
             artifact_service=InMemoryArtifactService(),
-            session_service=InMemorySessionService(),
+            session_service=serving.build_session_service("memory_agent"),
             memory_service=InMemoryMemoryService(),
         )
         capabilities = AgentCapabilities(streaming=True)
@@ -61,26 +59,41 @@ class MemoryAgent:
 
     def _build_agent(self) -> LlmAgent:
         """Builds the LLM agent for the memory agent."""
+        llm_replay.install(agent.root_agent)
         return agent.root_agent
 
 
-if __name__ == '__main__':
-    try:
-        memory_agent = MemoryAgent()
+def create_app(public_url: str | None = None):
+    """Builds the A2A app. With several workers, uvicorn calls this in each of them.
 
-        request_handler = DefaultRequestHandler(
-            agent_executor=MemoryAgentExecutor(memory_agent.runner,memory_agent.agent_card),
-            task_store=InMemoryTaskStore(),
-        )
+    `public_url` overrides the card URL, e.g. when the app is mounted under a
+    path prefix of the combined agent host.
+    """
+    memory_agent = MemoryAgent()
+    if public_url:
+        memory_agent.agent_card.url = public_url
+    collage_pool.start()
 
-        server = A2AStarletteApplication(
-            agent_card=memory_agent.agent_card,
-            http_handler=request_handler,
-        )
-        logger.info(f"Attempting to start server with Agent Card: {memory_agent.agent_card.name}")
-        logger.info(f"Server object created: {server}")
+    executor = MemoryAgentExecutor(memory_agent.runner, memory_agent.agent_card)
+    request_handler = DefaultRequestHandler(
+        agent_executor=executor,
+        task_store=serving.build_task_store("memory_agent"),
+    )
+
+    server = A2AStarletteApplication(
+        agent_card=memory_agent.agent_card,
+        http_handler=request_handler,
+    )
+    logger.info(f"Attempting to start server with Agent Card: {memory_agent.agent_card.name}")
 
-        uvicorn.run(server.build(), host='0.0.0.0', port=port)
+    app = server.build()
+    serving.add_metrics_route(app, memory_agent.runner, executor, {"tile_cache": tile_cache.metrics, "storage": storage.metrics})
+    return app
+
+
+if __name__ == '__main__':
+    try:
+        serving.run("memory_agent.a2a_server:create_app", port)
     except Exception as e:
         logger.error(f"An error occurred during server startup: {e}")
         exit(1)
@@ -0,0 +1,96 @@
+"""Deduplication of collage outputs.
+
+A collage is identified by the versions of its input images, in order (GCS
+object generations, or local mtimes and sizes), and by the parameters that
+affect its pixels. After a collage is saved, a small marker object named
+after that key is written next to it, in a `.collage-index` folder, holding
+the collage's URI. A later request for the same collage finds the marker and
+returns the existing URI without rendering or uploading anything.
+
+Markers are created only if they do not exist yet. When two identical
+requests race, the one that loses deletes its own output and returns the
+winner's, so duplicate objects do not accumulate. Set COLLAGE_DEDUPE=0 to
+turn this off.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+
+from google.api_core import exceptions as gcs_exceptions
+
+from agent_common import storage
+
+COLLAGE_DEDUPE = os.environ.get("COLLAGE_DEDUPE", "1").lower() not in ("0", "false", "no")
+
+MARKER_FOLDER = ".collage-index"
+
+
+def make_key(identities: list[str], params: dict) -> str:
+  """The key of a collage of the given image versions, in order, rendered with `params`."""
+  payload = json.dumps({"images": identities, "params": params}, sort_keys=True)
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _own_uri(output_path: str) -> str:
+  return output_path if storage.is_gcs_uri(output_path) else os.path.abspath(output_path)
+
+
+def _marker_uri(output_path: str, key: str) -> str:
+  if storage.is_gcs_uri(output_path):
+    return posixpath.join(posixpath.dirname(output_path), MARKER_FOLDER, key)
+  return os.path.join(os.path.dirname(os.path.abspath(output_path)), MARKER_FOLDER, key)
+
+
+def _read_marker(output_path: str, key: str) -> str | None:
+  try:
+    return storage.read_text(_marker_uri(output_path, key)).strip()
+  except gcs_exceptions.NotFound:
+    return None
+
+
+def lookup(output_path: str, key: str) -> str | None:
+  """Returns the URI of an existing collage with this key, if it is still there.
+
+  Markers are looked up next to `output_path`, so collages saved to another
+  folder are not reused.
+  """
+  uri = _read_marker(output_path, key)
+  if uri and storage.exists(uri):
+    return uri
+  return None
+
+
+def _create_marker(output_path: str, key: str, overwrite: bool) -> bool:
+  """Writes the marker pointing at `output_path`. Returns False if one already exists."""
+  try:
+    storage.write_bytes(
+        _marker_uri(output_path, key),
+        _own_uri(output_path).encode(),
+        content_type="text/plain",
+        if_generation_match=None if overwrite else 0,
+    )
+  except gcs_exceptions.PreconditionFailed:
+    return False
+  return True
+
+
+def record(output_path: str, key: str) -> str:
+  """
+  Records the collage just saved at `output_path` under `key`.
+
+  Returns the URI that now holds this collage: `output_path`, or the output
+  of an identical request that recorded its collage first, in which case
+  `output_path` is deleted.
+  """
+  if _create_marker(output_path, key, overwrite=False):
+    return output_path
+  existing = lookup(output_path, key)
+  if existing and existing != _own_uri(output_path):
+    print(f"An identical collage was saved to {existing} meanwhile; removing {output_path}")
+    storage.delete(output_path)
+    return existing
+  # The marker points at a collage that no longer exists.
+  _create_marker(output_path, key, overwrite=True)
+  return output_path
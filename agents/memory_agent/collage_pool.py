@@ -0,0 +1,205 @@
+"""Where collages are rendered.
+
+Rendering a collage is CPU-heavy PIL work. By default it runs on a thread, so
+the agent's event loop keeps serving other requests in the meantime. With
+COLLAGE_PROCESSES set above 0, it runs on a pool of that many worker
+processes instead, so one memory agent renders several collages in parallel
+across cores. The workers are started once, with PIL and the renderer
+already imported, and are given only the image and output paths: each job
+downloads, renders and uploads on its own, so no image data is pickled
+between processes.
+
+COLLAGE_TIMEOUT bounds each job, in seconds. A worker that does not stop a
+job by then is replaced: new jobs go to a fresh pool, and the old pool's
+workers are stopped once the other jobs they are running have finished.
+"""
+
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from agent_common import tracing
+from . import render, tile_cache
+
+COLLAGE_PROCESSES = int(os.environ.get("COLLAGE_PROCESSES", 0))
+COLLAGE_TIMEOUT = float(os.environ.get("COLLAGE_TIMEOUT", 120))
+
+tracer = tracing.get_tracer(__name__)
+
+
+class CollageTimeout(Exception):
+  """Raised when rendering a collage takes longer than COLLAGE_TIMEOUT."""
+
+
+# --- Worker processes ---
+
+def _init_worker() -> None:
+  from PIL import Image
+
+  # Load all codecs now rather than during the first job.
+  Image.init()
+  tracing.configure("memory_agent.collage_worker")
+
+
+def _warm_up() -> int:
+  return os.getpid()
+
+
+def _on_alarm(signum, frame):
+  raise CollageTimeout(f"Rendering the collage took longer than {COLLAGE_TIMEOUT:g}s.")
+
+
+def _run_job(image_paths: list[str], output_path: str, trace_metadata: dict) -> tuple[str, dict | None]:
+  """Renders one collage and returns the message and the job's tile cache counts."""
+  before = tile_cache.counters()
+  # Jobs run on the worker's main thread, so an alarm can interrupt one
+  # without taking the worker down.
+  signal.signal(signal.SIGALRM, _on_alarm)
+  signal.setitimer(signal.ITIMER_REAL, COLLAGE_TIMEOUT)
+  try:
+    with tracing.remote_span(tracer, "collage_worker.job", trace_metadata, {"process.pid": os.getpid()}):
+      message = render.render_collage(image_paths, output_path)
+  finally:
+    signal.setitimer(signal.ITIMER_REAL, 0)
+  after = tile_cache.counters()
+  counts = {name: after[name] - before[name] for name in after} if after else None
+  return message, counts
+
+
+# --- Pool ---
+
+_pool = None
+_pool_lock = threading.Lock()
+# The jobs submitted to each pool that have not finished yet.
+_jobs: dict[ProcessPoolExecutor, set[Future]] = {}
+# Spawning reads `__main__` while `_hide_main_module` has changed it.
+_main_module_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _hide_main_module():
+  """Keeps spawned workers from importing the server's `__main__` module.
+
+  multiprocessing re-imports the parent's main module in every spawned
+  child. For `python -m memory_agent.a2a_server` (or the combined agent host)
+  that would load ADK and the agents into each collage worker.
+  """
+  with _main_module_lock:
+    main = sys.modules["__main__"]
+    saved = {name: main.__dict__[name] for name in ("__spec__", "__file__") if name in main.__dict__}
+    main.__spec__ = None
+    main.__dict__.pop("__file__", None)
+    try:
+      yield
+    finally:
+      main.__dict__.update(saved)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      # Spawned, not forked: the agent process runs threads (gRPC, uvicorn)
+      # that must not be copied into the workers.
+      _pool = ProcessPoolExecutor(
+          max_workers=COLLAGE_PROCESSES,
+          mp_context=multiprocessing.get_context("spawn"),
+          initializer=_init_worker,
+      )
+      # Each submit starts one more worker until all of them are running.
+      with _hide_main_module():
+        for _ in range(COLLAGE_PROCESSES):
+          _pool.submit(_warm_up)
+      print(f"Started {COLLAGE_PROCESSES} collage worker processes.")
+    return _pool
+
+
+def _submit(pool: ProcessPoolExecutor, *args) -> Future:
+  future = pool.submit(_run_job, *args)
+  with _pool_lock:
+    jobs = _jobs.setdefault(pool, set())
+    jobs.add(future)
+  future.add_done_callback(jobs.discard)
+  return future
+
+
+def _discard_pool(pool: ProcessPoolExecutor, terminate: bool = False) -> None:
+  global _pool
+  with _pool_lock:
+    if _pool is pool:
+      _pool = None
+    _jobs.pop(pool, None)
+  if terminate:
+    # ProcessPoolExecutor has no public way to stop a worker that is stuck.
+    for process in list(getattr(pool, "_processes", {}).values()):
+      process.terminate()
+  pool.shutdown(wait=False)
+
+
+def _retire_pool(pool: ProcessPoolExecutor, stuck: Future) -> None:
+  """Replaces a pool with a stuck worker without failing its other jobs.
+
+  Stopping one worker breaks the whole ProcessPoolExecutor and fails every
+  job in it. So new jobs go to a fresh pool right away, and the old workers
+  are terminated only once the other jobs have finished, which their own
+  alarms bound by COLLAGE_TIMEOUT.
+  """
+  global _pool
+  with _pool_lock:
+    if _pool is pool:
+      _pool = None
+    others = set(_jobs.get(pool, ())) - {stuck}
+
+  def stop():
+    wait(others, timeout=COLLAGE_TIMEOUT + 10)
+    _discard_pool(pool, terminate=True)
+
+  threading.Thread(target=stop, name="collage-pool-retire", daemon=True).start()
+
+
+def start() -> None:
+  """Starts the worker processes ahead of the first collage, if there are any."""
+  if COLLAGE_PROCESSES > 0:
+    _get_pool()
+
+
+async def run(image_paths: list[str], output_path: str) -> str:
+  """Renders a collage off the event loop and returns the tool's message.
+
+  Raises CollageTimeout if it takes longer than COLLAGE_TIMEOUT. In thread
+  mode the thread cannot be interrupted, so the render is told to stop at
+  its next tile and not to upload; in process mode the worker interrupts it.
+  """
+  if COLLAGE_PROCESSES <= 0:
+    cancel = threading.Event()
+    try:
+      return await asyncio.wait_for(
+          asyncio.to_thread(render.render_collage, image_paths, output_path, None, cancel), COLLAGE_TIMEOUT
+      )
+    except asyncio.TimeoutError:
+      raise CollageTimeout(f"Rendering the collage took longer than {COLLAGE_TIMEOUT:g}s.") from None
+    finally:
+      # Also when the caller was cancelled; a finished render ignores it.
+      cancel.set()
+
+  pool = _get_pool()
+  job = _submit(pool, list(image_paths), output_path, tracing.inject())
+  try:
+    # The worker's own alarm normally fires first; this covers a hung worker.
+    message, cache_counts = await asyncio.wait_for(asyncio.wrap_future(job), COLLAGE_TIMEOUT + 10)
+  except asyncio.TimeoutError:
+    _retire_pool(pool, job)
+    raise CollageTimeout(f"Rendering the collage took longer than {COLLAGE_TIMEOUT:g}s.") from None
+  except BrokenProcessPool:
+    # A worker died (e.g. out of memory); start a fresh pool for the next job.
+    _discard_pool(pool)
+    return "Error: The collage worker crashed while rendering the collage."
+  # The workers have their own tile cache objects; /metrics reports this one.
+  tile_cache.add_counters(cache_counts)
+  return message
@@ -0,0 +1,159 @@
+"""Encoding of finished collages.
+
+Collages are what users open most from /memories, so their size decides how
+fast that page loads. They are saved as progressive JPEGs by default, which
+browsers show at low detail while the rest is still downloading, or as WebP
+with COLLAGE_FORMAT=webp. With COLLAGE_TARGET_BYTES set, the quality is
+lowered (down to COLLAGE_MIN_QUALITY at most) until the collage fits that
+many bytes.
+
+Uploaded collages get the content type of their format and the
+COLLAGE_CACHE_CONTROL header. The default lets browsers keep a collage for
+as long as the signed URL it was opened with is valid.
+"""
+
+import logging
+import os
+from io import BytesIO
+from typing import IO
+
+from PIL import Image
+
+# Pillow format name, file extension and content type of each output format.
+FORMATS = {
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+
+logger = logging.getLogger(__name__)
+
+COLLAGE_FORMAT = os.environ.get("COLLAGE_FORMAT", "jpeg").lower()
+if COLLAGE_FORMAT not in FORMATS:
+  raise ValueError(f"COLLAGE_FORMAT must be one of {', '.join(FORMATS)}, not {COLLAGE_FORMAT!r}")
+COLLAGE_QUALITY = int(os.environ.get("COLLAGE_QUALITY", 90))
+COLLAGE_PROGRESSIVE = os.environ.get("COLLAGE_PROGRESSIVE", "1").lower() not in ("0", "false", "no")
+COLLAGE_TARGET_BYTES = int(os.environ.get("COLLAGE_TARGET_BYTES", 0))
+COLLAGE_MIN_QUALITY = int(os.environ.get("COLLAGE_MIN_QUALITY", 40))
+COLLAGE_CACHE_CONTROL = os.environ.get("COLLAGE_CACHE_CONTROL", "private, max-age=3600")
+
+
+def content_type() -> str:
+  return FORMATS[COLLAGE_FORMAT][2]
+
+
+def output_path_for(path: str) -> str:
+  """`path` with the extension of COLLAGE_FORMAT, replacing any other image extension.
+
+  Replacing an image extension the caller asked for is logged, since the
+  collage then ends up at a different path than requested.
+  """
+  pil_format, extension, _ = FORMATS[COLLAGE_FORMAT]
+  root, ext = os.path.splitext(path)
+  registered = Image.registered_extensions()
+  if registered.get(ext.lower()) == pil_format:
+    return path
+  if not ext:
+    return root + extension
+  if ext.lower() in registered:
+    logger.warning(
+        f"Collages are saved as {COLLAGE_FORMAT} (COLLAGE_FORMAT), so {path} is saved as {root + extension} instead."
+    )
+    return root + extension
+  return path + extension
+
+
+def params() -> dict:
+  """The encoding settings that change a collage's bytes, for the collage dedupe key."""
+  return {
+      "format": COLLAGE_FORMAT,
+      "quality": COLLAGE_QUALITY,
+      "progressive": COLLAGE_PROGRESSIVE,
+      "target_bytes": COLLAGE_TARGET_BYTES,
+      "min_quality": COLLAGE_MIN_QUALITY,
+  }
+
+
+class _CountingWriter:
+  """Passes writes on to a file and counts the bytes written."""
+
+  def __init__(self, f: IO[bytes]):
+    self._f = f
+    self.bytes = 0
+
+  def write(self, data: bytes) -> int:
+    self._f.write(data)
+    self.bytes += len(data)
+    return len(data)
+
+  def flush(self) -> None:
+    self._f.flush()
+
+
+def _write(img: Image.Image, quality: int, f) -> None:
+  if COLLAGE_FORMAT == "webp":
+    img.save(f, format="WEBP", quality=quality, method=4)
+  else:
+    img.save(f, format="JPEG", quality=quality, optimize=True, progressive=COLLAGE_PROGRESSIVE)
+
+
+def _save(img: Image.Image, quality: int) -> bytes:
+  buffer = BytesIO()
+  _write(img, quality, buffer)
+  return buffer.getvalue()
+
+
+def encode_to(img: Image.Image, f: IO[bytes]) -> dict:
+  """
+  Encodes a collage at COLLAGE_QUALITY straight into `f`, such as a storage
+  upload, without holding the encoded bytes. Only for when COLLAGE_TARGET_BYTES
+  is unset, since the quality search needs every candidate's size first.
+
+  Returns:
+      The format, quality, size and number of encoding attempts, as `encode`.
+  """
+  if COLLAGE_TARGET_BYTES:
+    raise ValueError("encode_to cannot search for a quality under COLLAGE_TARGET_BYTES; use encode")
+  writer = _CountingWriter(f)
+  _write(img, COLLAGE_QUALITY, writer)
+  return {"format": COLLAGE_FORMAT, "quality": COLLAGE_QUALITY, "bytes": writer.bytes, "attempts": 1}
+
+
+def encode(img: Image.Image) -> tuple[bytes, dict]:
+  """
+  Encodes a collage with the configured format and quality.
+
+  With COLLAGE_TARGET_BYTES, a collage that is too large at COLLAGE_QUALITY
+  is encoded at the highest quality that fits, found by binary search, or
+  at COLLAGE_MIN_QUALITY if none does.
+
+  Returns:
+      The encoded bytes, and the format, quality, size and number of
+      encoding attempts.
+  """
+  quality = COLLAGE_QUALITY
+  data = _save(img, quality)
+  attempts = 1
+
+  if COLLAGE_TARGET_BYTES and len(data) > COLLAGE_TARGET_BYTES:
+    low, high = COLLAGE_MIN_QUALITY, quality - 1
+    # Only the best candidate that fits and the latest one are kept, not every encoding tried.
+    best = latest = None
+    del data
+    while low <= high:
+      middle = (low + high) // 2
+      latest = (middle, _save(img, middle))
+      attempts += 1
+      if len(latest[1]) <= COLLAGE_TARGET_BYTES:
+        best = latest
+        low = middle + 1
+      else:
+        high = middle - 1
+    if best is None:
+      if latest is None or latest[0] != COLLAGE_MIN_QUALITY:
+        latest = (COLLAGE_MIN_QUALITY, _save(img, COLLAGE_MIN_QUALITY))
+        attempts += 1
+      best = latest
+      print(f"Collage is {len(best[1])} bytes even at quality {COLLAGE_MIN_QUALITY}, over the {COLLAGE_TARGET_BYTES} byte target.")
+    quality, data = best
+
+  return data, {"format": COLLAGE_FORMAT, "quality": quality, "bytes": len(data), "attempts": attempts}
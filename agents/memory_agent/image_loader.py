@@ -0,0 +1,280 @@
+"""Concurrent loading of collage images.
+
+Every image is downloaded, decoded and resized on a shared thread pool, so
+the GCS round trips of a collage overlap with each other and with the CPU
+work on images that have already arrived. All of them read through the
+shared `agent_common.storage` module.
+
+For the collage renderer, loading is split in two: `load_sources` fetches
+only the start of each image and reads its header, so the layout can be
+computed before anything is downloaded in full, and `iter_tiles` then
+downloads each image, decodes it at a reduced scale close to its tile size
+and yields its tile as soon as it is ready. At most IMAGE_LOAD_WORKERS
+images are downloaded or decoded at a time, so only that many compressed
+images are held in memory. Images found in the tile cache skip both the
+download and the decode.
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from io import BytesIO
+from typing import Iterator, NamedTuple
+
+from PIL import Image
+
+from agent_common import storage
+
+from . import tile_cache
+
+# Number of images that are loaded, or decoded, at the same time.
+IMAGE_LOAD_WORKERS = int(os.environ.get("IMAGE_LOAD_WORKERS", 8))
+
+# How much of an image is fetched at a time while its header is read. JPEG
+# headers, including EXIF, rarely need more than one chunk.
+HEADER_CHUNK_SIZE = 64 * 1024
+
+
+class Source(NamedTuple):
+  """An image whose header has been read, and its size from that header.
+
+  `info` is the image's `storage.stat`, if it was looked up; its pixels are
+  then read from that generation. For a tile cache hit, `cached` holds the
+  cached, scaled-down image.
+  """
+  path: str
+  info: storage.ObjectInfo | None
+  size: tuple[int, int]
+  cache_key: str | None = None
+  cached: Image.Image | None = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      _pool = ThreadPoolExecutor(max_workers=IMAGE_LOAD_WORKERS, thread_name_prefix="image-load")
+    return _pool
+
+
+def read_bytes(path: str, info: storage.ObjectInfo | None = None) -> bytes:
+  """Reads an image from a gs:// URI or a local path.
+
+  `info` is the image's `storage.stat`, if the caller has it; that
+  generation of the image is then the one read.
+  """
+  return storage.read_bytes(path, info.generation if info else None)
+
+
+def identify(path: str) -> tuple[str, storage.ObjectInfo]:
+  """
+  Returns a string that changes whenever the image at `path` changes, and
+  the image's `storage.stat`.
+
+  That is the object generation for GCS (looked up with a metadata request)
+  and the mtime and size for a local file.
+  """
+  info = storage.stat(path)
+  if storage.is_gcs_uri(path):
+    return f"{path}#{info.generation}", info
+  return f"{os.path.abspath(path)}#{info.generation}:{info.size}", info
+
+
+def _identify_or_missing(path: str) -> tuple[str, storage.ObjectInfo | None]:
+  try:
+    return identify(path)
+  except Exception as e:
+    print(f"Could not look up image {path}: {e}")
+    return f"{path}#missing", None
+
+
+def identify_all(paths: list[str]) -> list[tuple[str, storage.ObjectInfo | None]]:
+  """Runs `identify` on all paths concurrently. Missing images get a placeholder identity."""
+  return list(_get_pool().map(_identify_or_missing, paths))
+
+
+def scaled_height(size: tuple[int, int], target_width: int) -> int:
+  """The height of an image of `size` scaled to `target_width`, preserving aspect ratio."""
+  w_percent = (target_width / float(size[0]))
+  return int((float(size[1]) * float(w_percent)))
+
+
+def cover_size(size: tuple[int, int], box: tuple[int, int]) -> tuple[int, int]:
+  """The smallest scaled-down `size`, preserving aspect ratio, that covers `box` in both dimensions."""
+  scale = min(1.0, max(box[0] / float(size[0]), box[1] / float(size[1])))
+  return max(1, int(math.ceil(size[0] * scale))), max(1, int(math.ceil(size[1] * scale)))
+
+
+def make_tile(img: Image.Image, target_width: int, border: int, height: int | None = None) -> Image.Image:
+  """Scales an image to `target_width`, preserving aspect ratio, and adds a white border.
+
+  `height` overrides the scaled height, e.g. when it was computed from the
+  image's original size before a reduced-scale decode.
+  """
+  hsize = height if height is not None else scaled_height(img.size, target_width)
+  img = img.resize((target_width, hsize), Image.Resampling.LANCZOS)
+
+  bordered_img = Image.new('RGB', (img.width + 2 * border, img.height + 2 * border), color=(255, 255, 255))
+  bordered_img.paste(img, (border, border))
+  return bordered_img
+
+
+def _merge_timings(stats: dict, timings: dict) -> None:
+  for stage, seconds in timings.items():
+    stats[f"{stage}_ms"] = stats.get(f"{stage}_ms", 0.0) + seconds * 1000
+
+
+def _fetch_source(path: str, cache_box: tuple[int, int] | None, known: tuple | None) -> tuple[Source | None, dict]:
+  timings = {}
+  cache = tile_cache.get_cache() if cache_box else None
+  cache_key = None
+  info = known[1] if known else None
+  try:
+    if cache is not None:
+      started = time.perf_counter()
+      identity, info = known or identify(path)
+      cache_key = tile_cache.make_key(identity, cache_box)
+      timings["stat"] = time.perf_counter() - started
+
+      started = time.perf_counter()
+      cached = cache.get(cache_key)
+      timings["cache"] = time.perf_counter() - started
+      if cached is not None:
+        image, size = cached
+        return Source(path, info, size, cache_key, image), timings
+
+    started = time.perf_counter()
+    # Opening only parses the header, so only the first chunks of the image
+    # are fetched; the rest is downloaded when its tile is decoded.
+    with storage.open_read(path, info.generation if info else None, HEADER_CHUNK_SIZE) as f:
+      with Image.open(f) as img:
+        size = img.size
+    timings["header"] = time.perf_counter() - started
+  except Exception as e:
+    print(f"Failed to load image {path}: {e}")
+    return None, timings
+  return Source(path, info, size, cache_key), timings
+
+
+def load_sources(
+    paths: list[str],
+    cache_box: tuple[int, int] | None = None,
+    identities: list[tuple[str, storage.ObjectInfo | None]] | None = None,
+) -> tuple[list[Source], dict]:
+  """
+  Reads the headers of images concurrently, for their sizes, without
+  downloading or decoding the images.
+
+  With `cache_box` and the tile cache enabled, images that are cached
+  (scaled down to cover `cache_box`, see `cover_size`) are not downloaded at
+  all. `identities` are the results of `identify_all` for `paths`, if the
+  caller already has them.
+
+  Returns:
+      The sources in input order, skipping those that failed, and the
+      stage timings in milliseconds.
+  """
+  started = time.perf_counter()
+  known = identities or [None] * len(paths)
+  results = list(_get_pool().map(
+      lambda path, identity: _fetch_source(path, cache_box, identity), paths, known
+  ))
+  sources = [source for source, _ in results if source is not None]
+
+  stats = {}
+  for _, timings in results:
+    _merge_timings(stats, timings)
+  stats["fetch_wall_ms"] = (time.perf_counter() - started) * 1000
+  stats["loaded"] = len(sources)
+  stats["failed"] = len(paths) - len(sources)
+  stats["cache_hits"] = sum(1 for source in sources if source.cached is not None)
+  return sources, stats
+
+
+def _decode_tile(
+    source: Source, tile_size: tuple[int, int], border: int, cache_box: tuple[int, int] | None
+) -> tuple[Image.Image | None, dict]:
+  timings = {}
+  width, height = tile_size
+  try:
+    img = source.cached
+    if img is None:
+      cache = tile_cache.get_cache() if source.cache_key is not None else None
+      cached_size = cover_size(source.size, cache_box) if cache is not None else (0, 0)
+
+      started = time.perf_counter()
+      data = read_bytes(source.path, source.info)
+      timings["download"] = time.perf_counter() - started
+
+      started = time.perf_counter()
+      img = Image.open(BytesIO(data))
+      # For JPEGs, decode at the smallest 1/2, 1/4 or 1/8 scale that is still
+      # at least as large as the tile (and the cached copy), instead of at
+      # full resolution.
+      img.draft("RGB", (max(width, cached_size[0]), max(height, cached_size[1])))
+      img.load()
+      del data
+      timings["decode"] = time.perf_counter() - started
+
+      if cache is not None:
+        started = time.perf_counter()
+        img = img.convert("RGB").resize(cached_size, Image.Resampling.LANCZOS)
+        cache.put(source.cache_key, img, source.size)
+        timings["resize"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tile = make_tile(img, width, border, height)
+    timings["resize"] = timings.get("resize", 0.0) + time.perf_counter() - started
+  except Exception as e:
+    print(f"Failed to decode image {source.path}: {e}")
+    return None, timings
+  return tile, timings
+
+
+def iter_tiles(
+    sources: list[Source | None],
+    tile_sizes: list[tuple[int, int]],
+    border: int,
+    stats: dict,
+    cache_box: tuple[int, int] | None = None,
+) -> Iterator[tuple[int, Image.Image]]:
+  """
+  Yields (index, tile) for each source as soon as its tile is ready.
+
+  Each source is downloaded, scaled to its entry in `tile_sizes` and
+  bordered. Tiles are made on the shared pool, at most IMAGE_LOAD_WORKERS at
+  a time, and arrive in completion order; each image's bytes are freed as
+  soon as it is decoded. Every entry of `sources` is set to None once its
+  tile is made, so cached tiles are freed too. Pass the same `cache_box` as
+  to `load_sources` to fill the tile cache. Download, decode and resize
+  timings are added to `stats`; sources that fail are skipped.
+  """
+  started = time.perf_counter()
+  pool = _get_pool()
+  waiting = iter(range(len(sources)))
+  in_flight = {}
+
+  def submit_next() -> None:
+    index = next(waiting, None)
+    if index is not None:
+      in_flight[pool.submit(_decode_tile, sources[index], tile_sizes[index], border, cache_box)] = index
+
+  for _ in range(IMAGE_LOAD_WORKERS):
+    submit_next()
+  while in_flight:
+    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+    for future in done:
+      index = in_flight.pop(future)
+      sources[index] = None
+      submit_next()
+      tile, timings = future.result()
+      _merge_timings(stats, timings)
+      if tile is not None:
+        yield index, tile
+  stats["tile_wall_ms"] = (time.perf_counter() - started) * 1000
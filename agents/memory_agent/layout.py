@@ -0,0 +1,142 @@
+"""Collage layouts.
+
+A layout gets the original sizes of the collage's images and decides where
+each tile goes: the canvas size, and for each image the top-left corner of
+its tile and the size the image is scaled to. Tiles keep their image's
+aspect ratio, have a white border of `border` pixels and are separated from
+each other and from the canvas edge by `spacing`.
+
+`grid` is a near-square grid whose cells are all as large as the tallest
+tile, so mixed portrait and landscape photos leave empty space around the
+smaller tiles. `justified` (the default, see COLLAGE_LAYOUT) keeps the
+images in order and packs them into rows, each scaled to exactly fill the
+canvas width. Its row breaks are chosen to keep row heights close to a
+target, so apart from the spacing only the end of a row that would have to
+grow too tall is left empty.
+"""
+
+import math
+import os
+from typing import NamedTuple
+
+from .image_loader import scaled_height
+
+COLLAGE_LAYOUT = os.environ.get("COLLAGE_LAYOUT", "justified")
+
+# Part of the collage dedupe key: bump it when a layout changes its output.
+LAYOUT_VERSION = 1
+
+
+class Cell(NamedTuple):
+  """Where one tile goes: its top-left corner and the scaled image size, without border."""
+  x: int
+  y: int
+  width: int
+  height: int
+
+
+class Layout(NamedTuple):
+  width: int
+  height: int
+  cells: list[Cell]
+
+
+def grid(sizes: list[tuple[int, int]], tile_width: int, border: int, spacing: int) -> Layout:
+  """Scales every image to `tile_width` and centers its tile in a cell of a near-square grid."""
+  heights = [scaled_height(size, tile_width) for size in sizes]
+  cols = max(1, int(math.ceil(math.sqrt(len(sizes)))))
+  rows = int(math.ceil(len(sizes) / float(cols)))
+  cell_width = tile_width + 2 * border
+  cell_height = max(heights) + 2 * border
+
+  cells = []
+  for i, height in enumerate(heights):
+    row, col = divmod(i, cols)
+    x = spacing + col * (cell_width + spacing)
+    y = spacing + row * (cell_height + spacing) + (cell_height - (height + 2 * border)) // 2
+    cells.append(Cell(x, y, tile_width, height))
+
+  width = cols * cell_width + (cols + 1) * spacing
+  height = rows * cell_height + (rows + 1) * spacing
+  return Layout(width, height, cells)
+
+
+def justified(
+    sizes: list[tuple[int, int]],
+    canvas_width: int,
+    row_height: int,
+    border: int,
+    spacing: int,
+    max_row_scale: float = 1.5,
+) -> Layout:
+  """
+  Packs the images, in order, into rows that fill `canvas_width`.
+
+  Every image in a row is scaled to the row's height, and that height is
+  whatever makes the row exactly as wide as the canvas. The rows are chosen
+  (by dynamic programming over all row breaks) to keep those heights close
+  to `row_height`. A row is never taller than `max_row_scale * row_height`,
+  and the last row no taller than `row_height`; such a row is left shorter
+  than the canvas width, and that gap counts against the choice.
+  """
+  aspects = [w / float(h) for w, h in sizes]
+  prefix = [0.0]
+  for aspect in aspects:
+    prefix.append(prefix[-1] + aspect)
+  n = len(sizes)
+
+  def fit(i: int, j: int) -> tuple[float, float] | None:
+    """The natural and the allowed height of a row of images i..j-1, or None if they cannot fit."""
+    count = j - i
+    free = canvas_width - (count + 1) * spacing - count * 2 * border
+    if free <= 0:
+      return None
+    natural = free / (prefix[j] - prefix[i])
+    limit = row_height if j == n else row_height * max_row_scale
+    return natural, min(natural, limit)
+
+  def cost(natural: float, height: float) -> float:
+    # Deviation from the target height, plus the unused fraction of the row.
+    return ((height - row_height) / row_height) ** 2 + (1 - height / natural)
+
+  # best[j]: lowest total cost of laying out the first j images; start[j]: where its last row starts.
+  best = [0.0] + [math.inf] * n
+  start = [0] * (n + 1)
+  for j in range(1, n + 1):
+    for i in range(j - 1, -1, -1):
+      heights = fit(i, j)
+      if heights is None:
+        break
+      total = best[i] + cost(*heights)
+      if total < best[j]:
+        best[j], start[j] = total, i
+
+  rows = []
+  j = n
+  while j > 0:
+    rows.append((start[j], j))
+    j = start[j]
+  rows.reverse()
+
+  cells = []
+  y = spacing
+  for i, j in rows:
+    natural, height = fit(i, j)
+    image_height = max(1, int(round(height)))
+    widths = [max(1, int(round(height * aspect))) for aspect in aspects[i:j]]
+    used = sum(widths) + (j - i) * 2 * border + (j - i - 1) * spacing
+    if height == natural:
+      # Give the rounding error to the last tile, so the row ends exactly at the edge.
+      widths[-1] = max(1, widths[-1] + canvas_width - 2 * spacing - used)
+      x = spacing
+    elif j == n:
+      x = spacing
+    else:
+      # A row that could not grow to the full width is centered.
+      x = (canvas_width - used) // 2
+    for width in widths:
+      cells.append(Cell(x, y, width, image_height))
+      x += width + 2 * border + spacing
+    y += image_height + 2 * border + spacing
+
+  return Layout(canvas_width, y, cells)
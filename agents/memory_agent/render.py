@@ -0,0 +1,181 @@
+"""Renders a collage and saves it.
+
+This module only needs PIL and Cloud Storage, not ADK, so the collage worker
+processes stay small.
+"""
+
+import math
+import os
+import threading
+import time
+
+from PIL import Image
+from opentelemetry import trace
+
+from agent_common import storage, tracing
+from . import collage_index, encoding, image_loader, layout
+
+tracer = tracing.get_tracer(__name__)
+
+
+class RenderCancelled(Exception):
+  """Raised when the caller gave up on a collage before it was uploaded."""
+
+
+@tracer.start_as_current_span("create_collage.render")
+def render_collage(
+    image_paths: list[str],
+    output_path: str,
+    stats: dict | None = None,
+    cancel: threading.Event | None = None,
+) -> str:
+  """
+  Renders a collage of the images and saves it to `output_path` (GCS or local).
+
+  If a `stats` dict is given, the time spent in each stage, in milliseconds,
+  and the collage's size are added to it. Once `cancel` is set, the render
+  stops at the next tile or before the upload, with RenderCancelled.
+
+  Returns the message reported back by the `create_collage` tool.
+  """
+  print("Output path:", output_path)
+  output_path = encoding.output_path_for(output_path or "collage")
+
+  if not image_paths:
+    return "Error: No image paths provided."
+
+  # --- 1. Collage Configuration ---
+  # These parameters determine the look of your collage
+  TARGET_IMAGE_WIDTH = 400  # Target width for individual images in the collage
+  TARGET_ROW_HEIGHT = 300   # Target image height of a row in the justified layout
+  MAX_ROW_SCALE = 1.5       # How much taller than the target a justified row may get
+  BORDER_SIZE = 5           # Border around each image
+  SPACING = 10              # Space between images (including border)
+  BACKGROUND_COLOR = (240, 240, 240) # Light gray background
+
+  # --- 2. Reuse an identical collage, if one was already saved ---
+  identities = None
+  collage_key = None
+  if collage_index.COLLAGE_DEDUPE:
+    identities = image_loader.identify_all(image_paths)
+    collage_key = collage_index.make_key(
+        [identity for identity, _ in identities],
+        {
+            "layout": layout.COLLAGE_LAYOUT,
+            "layout_version": layout.LAYOUT_VERSION,
+            "target_width": TARGET_IMAGE_WIDTH,
+            "row_height": TARGET_ROW_HEIGHT,
+            "max_row_scale": MAX_ROW_SCALE,
+            "border": BORDER_SIZE,
+            "spacing": SPACING,
+            "background": BACKGROUND_COLOR,
+            "encoding": encoding.params(),
+            "extension": os.path.splitext(output_path)[1].lower(),
+        },
+    )
+    existing = collage_index.lookup(output_path, collage_key)
+    trace.get_current_span().set_attribute("collage.deduplicated", existing is not None)
+    if existing:
+      print(f"Reusing identical collage {existing}")
+      return f"Collage successfully saved to {existing}"
+
+  # --- 3. Load images (read their sizes from their headers, without downloading them) ---
+  # Header reads overlap across images; the order is kept. Images in the
+  # tile cache are not read at all. Cached copies are large enough for any
+  # tile either layout can ask for.
+  cache_box = (TARGET_IMAGE_WIDTH, int(math.ceil(TARGET_ROW_HEIGHT * MAX_ROW_SCALE)))
+  sources, load_stats = image_loader.load_sources(image_paths, cache_box, identities)
+
+  if not sources:
+    return "Error: No valid images could be loaded."
+
+  # --- 4. Determine the Layout and Canvas Size ---
+  num_images = len(sources)
+  sizes = [source.size for source in sources]
+
+  if layout.COLLAGE_LAYOUT == "grid":
+    placement = layout.grid(sizes, TARGET_IMAGE_WIDTH, BORDER_SIZE, SPACING)
+  else:
+    # As wide as the near-square grid of the same images would be.
+    cols = int(math.ceil(math.sqrt(num_images)))
+    canvas_width = cols * (TARGET_IMAGE_WIDTH + 2 * BORDER_SIZE) + (cols + 1) * SPACING
+    placement = layout.justified(sizes, canvas_width, TARGET_ROW_HEIGHT, BORDER_SIZE, SPACING, MAX_ROW_SCALE)
+
+  span = trace.get_current_span()
+  span.set_attribute("collage.image_count", num_images)
+  span.set_attribute("collage.layout", layout.COLLAGE_LAYOUT)
+  tile_area = sum((cell.width + 2 * BORDER_SIZE) * (cell.height + 2 * BORDER_SIZE) for cell in placement.cells)
+  fill = tile_area / float(placement.width * placement.height)
+  span.set_attribute("collage.fill_ratio", round(fill, 3))
+  print(
+      f"Creating collage canvas of {placement.width}x{placement.height} for {num_images} images "
+      f"with the {layout.COLLAGE_LAYOUT} layout ({fill:.0%} covered by photos)."
+  )
+  collage = Image.new('RGB', (placement.width, placement.height), color=BACKGROUND_COLOR)
+
+  # --- 5. Download and pre-process images (resize and add border) and paste each one as it is ready ---
+  # Only IMAGE_LOAD_WORKERS images are downloaded at a time, and JPEGs are
+  # decoded at a reduced scale close to their tile size, so peak memory
+  # stays near the canvas plus the images being decoded.
+  tile_sizes = [(cell.width, cell.height) for cell in placement.cells]
+  compose_seconds = 0.0
+  for i, img_proc in image_loader.iter_tiles(sources, tile_sizes, BORDER_SIZE, load_stats, cache_box):
+    _check_cancelled(cancel)
+    cell = placement.cells[i]
+    started = time.perf_counter()
+    collage.paste(img_proc, (cell.x, cell.y))
+    compose_seconds += time.perf_counter() - started
+  load_stats["compose_ms"] = compose_seconds * 1000
+
+  load_stats = {name: round(value, 1) for name, value in load_stats.items()}
+  print(f"Loaded {load_stats['loaded']} of {len(image_paths)} images: {load_stats}")
+  for name, value in load_stats.items():
+    span.set_attribute(f"collage.load.{name}", value)
+
+  # --- 6. Encode and save the final collage (to GCS or local) ---
+  with tracer.start_as_current_span("create_collage.save", attributes={"collage.output_path": output_path}) as save_span:
+    _check_cancelled(cancel)
+    print(f"Saving collage to {'GCS' if storage.is_gcs_uri(output_path) else 'a local file'}: {output_path}")
+    upload_args = {"content_type": encoding.content_type(), "cache_control": encoding.COLLAGE_CACHE_CONTROL}
+    if encoding.COLLAGE_TARGET_BYTES:
+      # The quality search has to see each candidate's size, so the collage is encoded in memory first.
+      started = time.perf_counter()
+      data, encode_stats = encoding.encode(collage)
+      encode_seconds = time.perf_counter() - started
+      started = time.perf_counter()
+      storage.write_bytes(output_path, data, **upload_args)
+      save_seconds = time.perf_counter() - started
+    else:
+      # Otherwise it is encoded straight into the upload. The upload buffers
+      # up to STORAGE_CHUNK_SIZE, so most of it happens when the file is closed.
+      with storage.open_write(output_path, **upload_args) as f:
+        started = time.perf_counter()
+        encode_stats = encoding.encode_to(collage, f)
+        encode_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+      save_seconds = time.perf_counter() - started
+    print(f"Encoded collage: {encode_stats}")
+    for name, value in encode_stats.items():
+      save_span.set_attribute(f"collage.encode.{name}", value)
+    final_path_msg = output_path
+
+  if stats is not None:
+    stats.update(load_stats)
+    stats.update(
+        encode_ms=round(encode_seconds * 1000, 1),
+        save_ms=round(save_seconds * 1000, 1),
+        width=placement.width,
+        height=placement.height,
+        quality=encode_stats["quality"],
+        bytes=encode_stats["bytes"],
+    )
+
+  if collage_key is not None:
+    final_path_msg = collage_index.record(output_path, collage_key)
+
+  return f"Collage successfully saved to {final_path_msg}"
+
+
+def _check_cancelled(cancel: threading.Event | None) -> None:
+  if cancel is not None and cancel.is_set():
+    raise RenderCancelled("The collage was cancelled before it was saved.")
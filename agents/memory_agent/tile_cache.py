@@ -0,0 +1,227 @@
+"""Disk cache of collage tiles.
+
+The same photos end up in collage after collage. With TILE_CACHE_DIR set,
+every image is stored there scaled down just enough to cover the largest tile
+a collage layout can give it, keyed by the image's version (the GCS object
+generation, or a local file's mtime and size) and that size. A repeat
+collage then makes its tiles from these copies, whatever its layout, instead
+of downloading and decoding the originals.
+
+Images are stored as raw RGB pixels, so reading one back involves no decoding.
+The least recently used tiles are removed once the cache holds more than
+TILE_CACHE_MAX_BYTES. Several processes can share one directory: the
+directory itself is the index, and the budget applies to all of it.
+Temporary files left behind by a process that crashed mid-write are removed
+when the cache evicts.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR") or None
+TILE_CACHE_MAX_BYTES = int(os.environ.get("TILE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+_SUFFIX = ".rgb"
+_TMP_SUFFIX = ".tmp"
+# A temporary file older than this was left by a process that died while
+# writing a tile; a write itself takes milliseconds.
+_STALE_TMP_SECONDS = 600
+# Tile width and height, then the original image's width and height.
+_HEADER = struct.Struct("<4I")
+# The directory is rescanned after this fraction of the budget has been
+# written, so tiles written by other processes are counted too.
+_RESCAN_FRACTION = 0.05
+_COUNTERS = ("hits", "misses", "writes", "evictions")
+
+
+def make_key(identity: str, box: tuple[int, int]) -> str:
+  """The cache key of one image version scaled to cover `box`."""
+  return hashlib.sha256(f"{identity}|{box[0]}x{box[1]}".encode()).hexdigest()
+
+
+class TileCache:
+  """An LRU tile cache with a byte budget, stored in `directory`.
+
+  Each tile is one file, `<key>.rgb`: a header with the tile and original
+  image sizes, then the pixels. A lookup opens that file directly, so tiles
+  written by any process sharing the directory are found. Reading a tile
+  touches its mtime, and eviction scans the directory and removes the files
+  with the oldest mtimes, whichever process wrote them.
+  """
+
+  def __init__(self, directory: str, max_bytes: int):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self._lock = threading.Lock()
+    self._stats = dict.fromkeys(_COUNTERS, 0)
+    # Size of the directory at the last scan, plus what this process wrote since.
+    self._bytes = 0
+    self._written_since_scan = 0
+    os.makedirs(directory, exist_ok=True)
+    self._evict_over_budget()
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.directory, key + _SUFFIX)
+
+  def _count(self, counter: str, n: int = 1) -> None:
+    with self._lock:
+      self._stats[counter] += n
+
+  def get(self, key: str) -> tuple[Image.Image, tuple[int, int]] | None:
+    """Returns the cached tile and the original image size, or None."""
+    path = self._path(key)
+    try:
+      with open(path, "rb") as f:
+        data = f.read()
+      os.utime(path)
+    except OSError:
+      # Not cached, or just evicted by another process.
+      self._count("misses")
+      return None
+    if len(data) < _HEADER.size:
+      self._count("misses")
+      return None
+    tile_w, tile_h, orig_w, orig_h = _HEADER.unpack_from(data)
+    if len(data) != _HEADER.size + tile_w * tile_h * 3:
+      self._count("misses")
+      return None
+    self._count("hits")
+    return Image.frombytes("RGB", (tile_w, tile_h), memoryview(data)[_HEADER.size:]), (orig_w, orig_h)
+
+  def put(self, key: str, tile: Image.Image, original_size: tuple[int, int]) -> None:
+    if tile.mode != "RGB":
+      tile = tile.convert("RGB")
+    header = _HEADER.pack(tile.width, tile.height, *original_size)
+    data = tile.tobytes()
+    path = self._path(key)
+    # Write to a temporary file first so readers never see a partial tile.
+    fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=_TMP_SUFFIX)
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(header)
+        f.write(data)
+      os.replace(tmp_path, path)
+    except OSError as e:
+      print(f"Could not write tile to cache: {e}")
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      return
+    size = len(header) + len(data)
+    with self._lock:
+      self._stats["writes"] += 1
+      self._bytes += size
+      self._written_since_scan += size
+      rescan = (
+          self._bytes > self.max_bytes
+          or self._written_since_scan > self.max_bytes * _RESCAN_FRACTION
+      )
+    if rescan:
+      self._evict_over_budget(keep=path)
+
+  def _scan(self) -> list[tuple[float, str, int]]:
+    """(mtime, path, size) of every tile in the directory."""
+    files = []
+    for entry in os.scandir(self.directory):
+      if entry.name.endswith(_SUFFIX):
+        try:
+          stat = entry.stat()
+        except OSError:
+          continue
+        files.append((stat.st_mtime, entry.path, stat.st_size))
+    return files
+
+  def _remove_stale_temp_files(self) -> None:
+    cutoff = time.time() - _STALE_TMP_SECONDS
+    for entry in os.scandir(self.directory):
+      if not entry.name.endswith(_TMP_SUFFIX):
+        continue
+      try:
+        if entry.stat().st_mtime < cutoff:
+          os.remove(entry.path)
+          print(f"Removed stale temporary tile file {entry.path}")
+      except OSError:
+        continue  # Renamed into place or removed by another process.
+
+  def _evict_over_budget(self, keep: str | None = None) -> None:
+    self._remove_stale_temp_files()
+    files = self._scan()
+    total = sum(size for _, _, size in files)
+    evicted = 0
+    if total > self.max_bytes:
+      for _, path, size in sorted(files):
+        if total <= self.max_bytes:
+          break
+        if path == keep:
+          continue
+        try:
+          os.remove(path)
+        except OSError:
+          continue  # Already removed by another process.
+        total -= size
+        evicted += 1
+    with self._lock:
+      self._bytes = total
+      self._written_since_scan = 0
+      self._stats["evictions"] += evicted
+
+  def counters(self) -> dict:
+    """This process's hit, miss, write and eviction counts."""
+    with self._lock:
+      return dict(self._stats)
+
+  def add_counters(self, counts: dict) -> None:
+    """Adds the counts a collage worker process reported for one job."""
+    with self._lock:
+      for counter in _COUNTERS:
+        self._stats[counter] += counts.get(counter, 0)
+
+  def metrics(self) -> dict:
+    """Size of the whole directory, and the counters of this process and its collage workers."""
+    files = self._scan()
+    stats = self.counters()
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        "pid": os.getpid(),
+        "entries": len(files),
+        "bytes": sum(size for _, _, size in files),
+        "max_bytes": self.max_bytes,
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        **stats,
+    }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TileCache | None:
+  """Returns the process-wide tile cache, or None when TILE_CACHE_DIR is not set."""
+  global _cache
+  if TILE_CACHE_DIR is None:
+    return None
+  with _cache_lock:
+    if _cache is None:
+      _cache = TileCache(TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES)
+    return _cache
+
+
+def metrics() -> dict | None:
+  cache = get_cache()
+  return cache.metrics() if cache else None
+
+
+def counters() -> dict | None:
+  cache = get_cache()
+  return cache.counters() if cache else None
+
+
+def add_counters(counts: dict | None) -> None:
+  cache = get_cache()
+  if cache and counts:
+    cache.add_counters(counts)
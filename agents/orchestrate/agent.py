@@ -1,6 +1,7 @@
 import asyncio
 import json
 import os
+import time
 import uuid
 from typing import Any
 
@@ -9,30 +10,56 @@ import httpx
 from a2a.client import A2ACardResolver
 from a2a.types import (
   AgentCard,
+  Message,
   MessageSendParams,
   Part,
   SendMessageRequest,
   SendMessageResponse,
   SendMessageSuccessResponse,
+  SendStreamingMessageRequest,
+  SendStreamingMessageSuccessResponse,
   Task,
+  TaskArtifactUpdateEvent,
   TaskState,
+  TaskStatus,
+  TaskStatusUpdateEvent,
 )
 try:
   from remote_agent_connection import (
     RemoteAgentConnections,
     TaskUpdateCallback,
   )
+  from agent_card_cache import AgentCardCache
+  from http_pool import a2a_client_pool
+  from progress_relay import ProgressRelay, progress_from_event
+  from result_cache import ResultCache
 except ImportError:
   from orchestrate.remote_agent_connection import (
     RemoteAgentConnections,
     TaskUpdateCallback,
   )
+  from orchestrate.agent_card_cache import AgentCardCache
+  from orchestrate.http_pool import a2a_client_pool
+  from orchestrate.progress_relay import ProgressRelay, progress_from_event
+  from orchestrate.result_cache import ResultCache
+try:
+  from agent_common import llm_replay, tracing
+except ImportError:
+  try:
+    from agents.agent_common import llm_replay, tracing
+  except ImportError:
+    # `adk deploy agent_engine` only ships this directory; record/replay is
+    # a local benchmarking aid and Agent Engine sets up its own tracing.
+    llm_replay = tracing = None
 from dotenv import load_dotenv
 from google.adk import Agent
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.tools.tool_context import ToolContext
+# google-adk depends on the OpenTelemetry API, so it is there even when agent_common is not.
+from opentelemetry import trace
+from pydantic import BaseModel
 import logging
 
 # Set up logging
@@ -46,10 +73,23 @@ load_dotenv()
 REMOTE_AGENT_ADDRESSES_STR = os.getenv("REMOTE_AGENT_ADDRESSES", "")
 PROJECT_NUMBER = os.environ.get("PROJECT_NUMBER")
 REMOTE_AGENT_ADDRESSES = [addr.strip() for addr in REMOTE_AGENT_ADDRESSES_STR.split(',') if addr.strip()]
+# Per-agent deadline for resolving an agent card, in seconds.
+CARD_RESOLVE_TIMEOUT = float(os.environ.get("CARD_RESOLVE_TIMEOUT", 10))
+# Agent cards older than this are re-resolved in the background, in seconds.
+CARD_REFRESH_INTERVAL = float(os.environ.get("CARD_REFRESH_INTERVAL", 300))
+# "remote" resolves REMOTE_AGENT_ADDRESSES over A2A; "local" runs the agents in this process.
+AGENT_MODE = os.environ.get("AGENT_MODE", "remote").strip().lower()
+# Use message/stream for agents whose card advertises streaming.
+STREAMING_DELEGATION = os.environ.get("STREAMING_DELEGATION", "true").lower() in ("1", "true", "yes")
 
 log.info(f"Remote Agent Addresses: {REMOTE_AGENT_ADDRESSES}")
 
 GCS_COLLAGE_FOLDER = f"gs://photos-{PROJECT_NUMBER}/memories/"
+
+if tracing is not None:
+  tracing.configure("orchestrate_agent")
+tracer = trace.get_tracer(__name__)
+
 # --- Helper Functions ---
 def create_send_message_payload(
     text: str, task_id: str | None = None, context_id: str | None = None
@@ -68,6 +108,28 @@ def create_send_message_payload(
   return payload
 
 
+class Delegation(BaseModel):
+  """A single (agent, task) pair for `HostAgent.send_messages`."""
+  agent_name: str
+  task: str
+  bypass_cache: bool = False
+
+
+def _merge_artifact(task: Task, event: TaskArtifactUpdateEvent) -> None:
+  """Applies an artifact update to a task, honouring `append`."""
+  artifacts = task.artifacts or []
+  for i, artifact in enumerate(artifacts):
+    if artifact.artifactId == event.artifact.artifactId:
+      if event.append:
+        artifacts[i] = artifact.model_copy(update={'parts': artifact.parts + event.artifact.parts})
+      else:
+        artifacts[i] = event.artifact
+      break
+  else:
+    artifacts.append(event.artifact)
+  task.artifacts = artifacts
+
+
 # --- Main Agent Class ---
 class HostAgent:
   """The orchestrate agent with a special diagnostic initializer."""
@@ -79,48 +141,157 @@ class HostAgent:
     self.cards: dict[str, AgentCard] = {}
     self.agents: str = ''
     self.is_initialized = False
+    self.card_cache = AgentCardCache()
+    self.result_cache = ResultCache.from_env()
+    # Maps each address in REMOTE_AGENT_ADDRESSES to the name of its card.
+    self._address_names: dict[str, str] = {}
+    self._refresh_task: asyncio.Task | None = None
+    # time.monotonic() of the last card refresh; 0 until the cards come from the network.
+    self._cards_resolved_at = 0.0
 
   async def _initialize(self):
+    """Loads the remote agents, preferring the on-disk card cache.
+
+    Cached cards are registered immediately so the first request does not wait
+    on the network; that request re-resolves them in the background. Without a
+    cache, all cards are resolved concurrently, each with its own deadline.
+    In local mode the agents are built in this process instead.
     """
-    DIAGNOSTIC VERSION: This method will test each connection one-by-one
-    with aggressive logging to force the hidden error to appear.
-    """
+    if AGENT_MODE == "local":
+      await self._initialize_local()
+      return
+
     if not REMOTE_AGENT_ADDRESSES or not REMOTE_AGENT_ADDRESSES[0]:
       log.error("CRITICAL FAILURE: REMOTE_AGENT_ADDRESSES environment variable is empty. Cannot proceed.")
       self.is_initialized = True
       return
 
-    async with httpx.AsyncClient(timeout=30) as client:
-      for i, address in enumerate(REMOTE_AGENT_ADDRESSES):
-        log.info(f"--- STEP 3.{i}: Attempting connection to: {address} ---")
-        try:
-          card_resolver = A2ACardResolver(client, address)
-          card = await card_resolver.get_agent_card()
+    cached = self.card_cache.load()
+    for address in REMOTE_AGENT_ADDRESSES:
+      if address in cached:
+        self._register_card(address, cached[address])
 
-          remote_connection = RemoteAgentConnections(agent_card=card, agent_url=address)
-          self.remote_agent_connections[card.name] = remote_connection
-          self.cards[card.name] = card
-          log.info(f"--- STEP 5.{i}: Successfully stored connection for {card.name} ---")
+    if self.remote_agent_connections:
+      log.info(f"Loaded {len(self.remote_agent_connections)} agents from the card cache; refreshing in the background.")
+      self._update_agent_list()
+    else:
+      await self._refresh_cards()
+
+    self.is_initialized = True
+    self._refresh_if_stale()
+
+  async def _initialize_local(self):
+    try:
+      from local_agent_connection import build_local_connections
+    except ImportError:
+      from orchestrate.local_agent_connection import build_local_connections
+
+    # Some agent modules call asyncio.run() on import, so build them off this loop.
+    connections = await asyncio.to_thread(build_local_connections)
+    for name, connection in connections.items():
+      self.remote_agent_connections[name] = connection
+      self.cards[name] = connection.card
+    if not connections:
+      log.error("No local agents could be loaded.")
+    else:
+      self._update_agent_list()
+      log.info(f"Running in local mode with {len(connections)} in-process agents.")
+    self.is_initialized = True
 
-        except Exception as e:
-          log.error(f"--- CRITICAL FAILURE at STEP 4.{i} for address: {address} ---")
-          log.error(f"--- The hidden exception type is: {type(e).__name__} ---")
-          log.error(f"--- Full exception details and traceback: ---", exc_info=True)
+  async def _resolve_card(self, client: httpx.AsyncClient, address: str) -> AgentCard:
+    card_resolver = A2ACardResolver(client, address)
+    return await asyncio.wait_for(card_resolver.get_agent_card(), timeout=CARD_RESOLVE_TIMEOUT)
+
+  async def _refresh_cards(self):
+    """Resolves every agent card concurrently and picks up any changes."""
+    async def resolve_all():
+      client = a2a_client_pool.get_client()
+      return await asyncio.gather(
+          *(self._resolve_card(client, address) for address in REMOTE_AGENT_ADDRESSES),
+          return_exceptions=True,
+      )
+
+    # The pooled client lives on the pool's loop, so the cards are resolved there.
+    results = await a2a_client_pool.run(resolve_all())
+
+    changed = False
+    for address, result in zip(REMOTE_AGENT_ADDRESSES, results):
+      if isinstance(result, BaseException):
+        if isinstance(result, asyncio.TimeoutError):
+          log.error(f"Timed out after {CARD_RESOLVE_TIMEOUT}s resolving agent card at {address}.")
+        else:
+          log.error(f"Failed to resolve agent card at {address}: {type(result).__name__}: {result}")
+        continue
+      changed |= self._register_card(address, result)
+
+    if any(not isinstance(result, BaseException) for result in results):
+      self._cards_resolved_at = time.monotonic()
 
-    log.error("STEP 6: Finished attempting all connections.")
     if not self.remote_agent_connections:
-      log.error("FINAL VERDICT: The loop finished, but the remote agent list is still empty.")
-    else:
-      agent_info = [json.dumps({'name': c.name, 'description': c.description}) for c in self.cards.values()]
-      self.agents = '\n'.join(agent_info)
-      log.info(f"--- FINAL SUCCESS: Initialization complete. {len(self.remote_agent_connections)} agents loaded. ---")
+      log.error("No remote agents could be resolved.")
+      return
 
-    self.is_initialized = True
+    if changed:
+      self._update_agent_list()
+      self.card_cache.save({
+          address: self.cards[name]
+          for address, name in self._address_names.items()
+          if name in self.cards
+      })
+      log.info(f"Agent cards updated. {len(self.remote_agent_connections)} agents loaded.")
+
+  def _register_card(self, address: str, card: AgentCard) -> bool:
+    """Stores a connection for the card, returning True if anything changed."""
+    old_name = self._address_names.get(address)
+    if old_name == card.name and self.cards.get(card.name) == card:
+      return False
+
+    if old_name and old_name != card.name:
+      self.remote_agent_connections.pop(old_name, None)
+      self.cards.pop(old_name, None)
+
+    self.remote_agent_connections[card.name] = RemoteAgentConnections(agent_card=card, agent_url=address)
+    self.cards[card.name] = card
+    self._address_names[address] = card.name
+    log.info(f"Stored connection for {card.name} ({address}).")
+    return True
+
+  def _update_agent_list(self):
+    agent_info = [json.dumps({'name': c.name, 'description': c.description}) for c in self.cards.values()]
+    self.agents = '\n'.join(agent_info)
+
+  def _refresh_if_stale(self):
+    """Re-resolves the agent cards in the background once they are older than CARD_REFRESH_INTERVAL.
+
+    Called whenever a request reads the cards. The refresh runs on that
+    request's loop, and normally finishes long before the request does; if it
+    is cut short when the loop closes, the cards stay stale and the next
+    request starts another one.
+    """
+    if AGENT_MODE == "local" or not REMOTE_AGENT_ADDRESSES or CARD_REFRESH_INTERVAL <= 0:
+      return
+    if time.monotonic() - self._cards_resolved_at < CARD_REFRESH_INTERVAL:
+      return
+    loop = asyncio.get_running_loop()
+    task = self._refresh_task
+    if task is not None and not task.done() and task.get_loop() is loop:
+      return
+    self._refresh_task = loop.create_task(self._refresh_in_background())
+
+  async def _refresh_in_background(self):
+    try:
+      await self._refresh_cards()
+    except Exception:
+      log.error("Background agent card refresh failed.", exc_info=True)
+    # Agent Engine has no metrics endpoint, so they go to its logs at the same pace.
+    log.info(f"Orchestrator metrics: {json.dumps(self.metrics())}")
 
   async def before_agent_callback(self, callback_context: CallbackContext):
     log.info("`before_agent_callback` triggered.")
     if not self.is_initialized:
       await self._initialize()
+    else:
+      self._refresh_if_stale()
 
     state = callback_context.state
     if 'session_active' not in state or not state['session_active']:
@@ -153,6 +324,8 @@ class HostAgent:
                         *   **Sequential Task Execution:**
                             *   After a preceding task completes (indicated by the agent's response or a success signal), gather any necessary output from it.
                             *   Then, use `send_message` for the next agent in the sequence, providing it with the user's original relevant intent and any necessary data obtained from the previous agent's task.
+                        *   **Parallel Delegation (using `send_messages`):** When two or more tasks do not depend on each other's output (e.g., finding the photos of several different people or groups), send them together in a single `send_messages` call with a list of `agent_name`/`task` pairs instead of calling `send_message` repeatedly. The tool returns one entry per task, in the same order, each with a `status` of `success` or `error` and the remote agent's Task in `result`. Never use `send_messages` for tasks that need output from another task in the same call.
+                        *   **Result Cache:** Repeated identical requests to some agents may be answered from a short-lived cache. If the user explicitly asks for fresh or updated results, set `bypass_cache` to true on `send_message` (or on each item of `send_messages`).
                         *   **Active Agent Prioritization:** If an active agent is already engaged and the user's request is related to its current task, route subsequent related requests directly to that agent by providing updated context via `send_message`.
                     
                     
@@ -210,21 +383,129 @@ class HostAgent:
                     Current agent: {current_agent['active_agent']}`
                 """
 
-  async def send_message(self, agent_name: str, task: str, tool_context: ToolContext):
+  async def send_message(self, agent_name: str, task: str, tool_context: ToolContext, bypass_cache: bool = False):
     if agent_name not in self.remote_agent_connections:
       log.error(f"LLM tried to call '{agent_name}' but it was not found. Available agents: {list(self.remote_agent_connections.keys())}")
       raise ValueError(f"Agent '{agent_name}' not found.")
 
     state = tool_context.state
     state['active_agent'] = agent_name
-    client = self.remote_agent_connections[agent_name]
+    # A single delegation continues the conversation's task and context, if any.
+    return await self._delegate(
+        agent_name, task, state, bypass_cache, task_id=state.get('task_id'), context_id=state.get('context_id')
+    )
+
+  async def send_messages(self, delegations: list[Delegation], tool_context: ToolContext):
+    """Sends several independent tasks to remote agents concurrently.
+
+    Each delegation is dispatched over its own `RemoteAgentConnections` and all
+    of them run at the same time, each as a new task in its own context, so
+    two delegations to the same agent never share a task, a message id or a
+    session. A failing delegation does not affect the others; its error is
+    reported in its own entry.
 
-    task_id = state.get('task_id', str(uuid.uuid4()))
-    context_id = state.get('context_id', str(uuid.uuid4()))
-    message_id = state.get('input_message_metadata', {}).get('message_id', str(uuid.uuid4()))
+    Args:
+        delegations: The (agent_name, task) pairs to dispatch.
 
-    payload = create_send_message_payload(task, task_id, context_id)
-    payload['message']['messageId'] = message_id
+    Returns:
+        A dict with one result entry per delegation, in input order, and the
+        total elapsed time of the fan-out.
+    """
+    pairs = [
+        d if isinstance(d, Delegation) else Delegation.model_validate(d)
+        for d in delegations
+    ]
+    unknown = [p.agent_name for p in pairs if p.agent_name not in self.remote_agent_connections]
+    if unknown:
+      log.error(f"LLM tried to call {unknown} but they were not found. Available agents: {list(self.remote_agent_connections.keys())}")
+      raise ValueError(f"Agents not found: {', '.join(unknown)}.")
+
+    state = tool_context.state
+    state['active_agent'] = ', '.join(dict.fromkeys(p.agent_name for p in pairs))
+
+    log.info(f"Fanning out {len(pairs)} delegations concurrently.")
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(self._timed_delegate(p.agent_name, p.task, state, p.bypass_cache) for p in pairs)
+    )
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+    log.info(f"Fan-out of {len(pairs)} delegations finished in {total_ms} ms.")
+    return {'results': results, 'total_elapsed_ms': total_ms}
+
+  async def _timed_delegate(self, agent_name: str, task: str, state, bypass_cache: bool = False) -> dict[str, Any]:
+    """Runs a single delegation and records its timing and outcome."""
+    started = time.perf_counter()
+    entry: dict[str, Any] = {'agent_name': agent_name, 'task': task}
+    try:
+      result = await self._delegate(agent_name, task, state, bypass_cache)
+      if result is None:
+        entry['status'] = 'error'
+        entry['error'] = 'Remote agent did not return a task.'
+      else:
+        entry['status'] = 'success'
+        entry['result'] = result.model_dump(mode='json', exclude_none=True)
+    except Exception as e:
+      log.error(f"Delegation to '{agent_name}' failed: {e}", exc_info=True)
+      entry['status'] = 'error'
+      entry['error'] = f"{type(e).__name__}: {e}"
+    entry['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return entry
+
+  async def _delegate(
+      self,
+      agent_name: str,
+      task: str,
+      state,
+      bypass_cache: bool = False,
+      task_id: str | None = None,
+      context_id: str | None = None,
+  ) -> Task | None:
+    """Sends one task to a remote agent, serving repeats from the result cache.
+
+    Without `task_id` and `context_id`, the task and context are new ones.
+    """
+    # When the web app runs the orchestrator in-process, its chat span is
+    # parked under the relay channel; otherwise the current ADK span is used.
+    parent = tracing.parked(state.get('relay_channel')) if tracing is not None else None
+    current = trace.get_current_span().get_span_context()
+    links = [trace.Link(current)] if parent is not None and current.is_valid else None
+    with tracer.start_as_current_span(
+        'HostAgent.send_message', context=parent, links=links, attributes={'a2a.agent_name': agent_name}
+    ) as span:
+      cached = self.result_cache.get(agent_name, task, bypass=bypass_cache)
+      span.set_attribute('result_cache.hit', cached is not None)
+      if cached is not None:
+        log.info(f"Result cache hit for '{agent_name}'.")
+        return cached
+
+      result = await self._dispatch(agent_name, task, state, task_id, context_id)
+      if result is not None:
+        span.set_attribute('a2a.task_state', result.status.state.value)
+      if result is not None and result.status.state == TaskState.completed:
+        self.result_cache.put(agent_name, task, result)
+      return result
+
+  async def _dispatch(
+      self, agent_name: str, task: str, state, task_id: str | None = None, context_id: str | None = None
+  ) -> Task | None:
+    """Sends one task to a remote agent and returns the resulting Task."""
+    client = self.remote_agent_connections[agent_name]
+
+    # Every delegation is its own message, and its own JSON-RPC request.
+    payload = create_send_message_payload(task, task_id or str(uuid.uuid4()), context_id or str(uuid.uuid4()))
+    message_id = payload['message']['messageId']
+    if tracing is not None:
+      # Remote agents continue the delegation's trace from the message metadata.
+      metadata = tracing.inject(payload['message'].get('metadata'))
+      if metadata:
+        payload['message']['metadata'] = metadata
+
+    if STREAMING_DELEGATION and client.card.capabilities.streaming:
+      relay = ProgressRelay(state.get('relay_channel'))
+      try:
+        return await self._delegate_streaming(client, payload, message_id, relay)
+      finally:
+        await relay.flush()
 
     message_request = SendMessageRequest(id=message_id, params=MessageSendParams.model_validate(payload))
 
@@ -234,6 +515,68 @@ class HostAgent:
       return None
     return send_response.root.result
 
+  async def _delegate_streaming(
+      self,
+      client: RemoteAgentConnections,
+      payload: dict[str, Any],
+      message_id: str,
+      relay: ProgressRelay,
+  ) -> Task | None:
+    """Sends a task over message/stream and rebuilds the final Task from its events.
+
+    Every status and artifact update is passed to `task_callback` and relayed
+    to the web app as it arrives, instead of only after the remote agent is done.
+    """
+    message_request = SendStreamingMessageRequest(id=message_id, params=MessageSendParams.model_validate(payload))
+    task: Task | None = None
+
+    async for response in client.send_message_streaming(message_request=message_request):
+      if not isinstance(response.root, SendStreamingMessageSuccessResponse):
+        log.error(f"Streaming delegation to '{client.card.name}' returned an error: {response.root}")
+        return None
+      event = response.root.result
+      if isinstance(event, Message):
+        # The agent answered without creating a task.
+        return None
+      if isinstance(event, Task):
+        task = event
+      else:
+        if task is None:
+          task = Task(
+              id=event.taskId,
+              contextId=event.contextId,
+              status=TaskStatus(state=TaskState.submitted),
+          )
+        if isinstance(event, TaskStatusUpdateEvent):
+          task.status = event.status
+        elif isinstance(event, TaskArtifactUpdateEvent):
+          _merge_artifact(task, event)
+        relay.publish(progress_from_event(event, client.card))
+
+      if self.task_callback:
+        self.task_callback(event, client.card)
+
+    return task
+
+  def result_cache_metrics(self) -> dict:
+    """Returns hit-rate and size metrics of the remote result cache."""
+    return self.result_cache.metrics()
+
+  def http_pool_metrics(self) -> dict:
+    """Returns the metrics of the shared A2A HTTP connection pool."""
+    return a2a_client_pool.metrics()
+
+  def metrics(self) -> dict:
+    """Returns the result cache and HTTP pool metrics together."""
+    return {'result_cache': self.result_cache_metrics(), 'http_pool': self.http_pool_metrics()}
+
+  async def aclose(self):
+    """Stops the background card refresh and closes pooled connections."""
+    if self._refresh_task is not None and not self._refresh_task.done():
+      self._refresh_task.cancel()
+    self._refresh_task = None
+    await a2a_client_pool.aclose()
+
   def check_active_agent(self, context: ReadonlyContext):
     state = context.state
     if 'session_active' in state and state['session_active'] and 'active_agent' in state:
@@ -256,7 +599,7 @@ class HostAgent:
         instruction=self.root_instruction,
         before_agent_callback=self.before_agent_callback,
         description=("Orchestrates tasks for child agents."),
-        tools=[self.send_message],
+        tools=[self.send_message, self.send_messages],
     )
 
 # --- Top-Level Execution ---
@@ -264,4 +607,6 @@ class HostAgent:
 log.info("Module-level code is running. Creating uninitialized agent object...")
 host_agent_singleton = HostAgent()
 root_agent = host_agent_singleton.create_agent()
+if llm_replay is not None:
+  llm_replay.install(root_agent)
 log.info("Module-level setup finished. 'root_agent' is populated.")
\ No newline at end of file
@@ -0,0 +1,50 @@
+import json
+import logging
+import os
+import tempfile
+
+from a2a.types import AgentCard
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "orchestrate_agent_cards.json")
+
+
+class AgentCardCache:
+  """Persists the last good agent card for each remote agent address.
+
+  The file is a JSON object mapping the address from REMOTE_AGENT_ADDRESSES to
+  the card that was resolved from it. Writes go to a temporary file that is
+  then renamed over the cache, so a crash never leaves a half-written file.
+  """
+
+  def __init__(self, path: str | None = None):
+    self.path = path or os.environ.get("AGENT_CARD_CACHE_PATH", DEFAULT_CACHE_PATH)
+
+  def load(self) -> dict[str, AgentCard]:
+    """Returns the cached cards keyed by address, or an empty dict."""
+    if not os.path.exists(self.path):
+      return {}
+    try:
+      with open(self.path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+      return {address: AgentCard.model_validate(card) for address, card in raw.items()}
+    except Exception as e:
+      log.warning(f"Ignoring unreadable agent card cache at {self.path}: {e}")
+      return {}
+
+  def save(self, cards: dict[str, AgentCard]) -> None:
+    """Atomically replaces the cache with the given cards."""
+    directory = os.path.dirname(self.path) or "."
+    try:
+      os.makedirs(directory, exist_ok=True)
+      fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".agent_cards_", suffix=".json")
+      with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(
+            {address: card.model_dump(mode="json", exclude_none=True) for address, card in cards.items()},
+            f,
+            indent=2,
+        )
+      os.replace(tmp_path, self.path)
+    except Exception as e:
+      log.warning(f"Could not write agent card cache to {self.path}: {e}")
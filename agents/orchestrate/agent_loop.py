@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from collections.abc import AsyncIterator
+
+
+class AgentLoop:
+  """A background event loop that outlives the loops of individual requests.
+
+  Agent Engine and the web app may drive the orchestrator from a new
+  `asyncio.run` per query, while ADK runners, MCP sessions and httpx clients
+  stay bound to the loop they were first used on. Work on such objects is
+  handed to this loop instead and awaited from the caller's loop.
+  """
+
+  def __init__(self, name: str = "local-agents-loop"):
+    self.loop = asyncio.new_event_loop()
+    self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+    self._thread.start()
+
+  async def run(self, coro):
+    """Runs a coroutine on the agent loop and awaits it from the caller's loop."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+  async def stream(self, agen) -> AsyncIterator:
+    """Iterates an async generator on the agent loop, yielding on the caller's loop."""
+    caller = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def put(entry):
+      try:
+        caller.call_soon_threadsafe(items.put_nowait, entry)
+      except RuntimeError:
+        pass  # The caller's loop is already closed.
+
+    async def pump():
+      try:
+        async for item in agen:
+          put((item, None))
+      except BaseException as e:
+        put((done, e))
+        raise
+      else:
+        put((done, None))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+    try:
+      while True:
+        item, error = await items.get()
+        if item is done:
+          if error is not None:
+            raise error
+          return
+        yield item
+    finally:
+      future.cancel()
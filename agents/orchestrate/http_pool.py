@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+try:
+  from agent_loop import AgentLoop
+except ImportError:
+  from orchestrate.agent_loop import AgentLoop
+
+log = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+  value = os.environ.get(name)
+  if value is None:
+    return default
+  return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+  """Wraps the real transport to count requests, errors, latency and new connections."""
+
+  def __init__(self, transport: httpx.AsyncHTTPTransport, pool: "A2AClientPool"):
+    self._transport = transport
+    self._pool = pool
+    # The connections seen so far, from the responses' public `network_stream`
+    # extension; a request on a connection not in here opened it.
+    self._streams = weakref.WeakSet()
+
+  async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+    self._pool._count(requests_total=1, in_flight=1)
+    started = time.perf_counter()
+    try:
+      response = await self._transport.handle_async_request(request)
+    except Exception:
+      self._pool._count(errors_total=1, in_flight=-1, latency_seconds_total=time.perf_counter() - started)
+      raise
+    stream = response.extensions.get("network_stream")
+    opened = stream is not None and stream not in self._streams
+    if opened:
+      self._streams.add(stream)
+    self._pool._count(
+        errors_total=int(response.status_code >= 500),
+        in_flight=-1,
+        latency_seconds_total=time.perf_counter() - started,
+        connections_opened=int(opened),
+    )
+    return response
+
+  async def aclose(self) -> None:
+    await self._transport.aclose()
+
+
+class A2AClientPool:
+  """A single, tuned httpx client shared by all A2A traffic of a process.
+
+  httpx clients keep their connections bound to the event loop they were
+  opened on, and Agent Engine runs every query in a new `asyncio.run`. The
+  client therefore lives on the pool's own long-lived loop: requests made
+  with it must be awaited through `run` or `stream`, which keeps one set of
+  pooled connections for the life of the process.
+  """
+
+  def __init__(
+      self,
+      max_connections: int = 100,
+      max_keepalive_connections: int = 20,
+      keepalive_expiry: float = 30.0,
+      http2: bool = True,
+      timeout: float = 30.0,
+  ):
+    if http2:
+      try:
+        import h2  # noqa: F401
+      except ImportError:
+        log.warning("HTTP/2 requested for A2A traffic but the 'h2' package is not installed; using HTTP/1.1.")
+        http2 = False
+    self.limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    self.http2 = http2
+    self.timeout = timeout
+    self.stats = {
+        "requests_total": 0,
+        "errors_total": 0,
+        "in_flight": 0,
+        "latency_seconds_total": 0.0,
+        "connections_opened": 0,
+        "clients_opened": 0,
+    }
+    # The transport updates the stats on the pool's loop; metrics() reads them from any thread.
+    self._stats_lock = threading.Lock()
+    self._client: httpx.AsyncClient | None = None
+    self._transport: _MeteredTransport | None = None
+    self._loop: AgentLoop | None = None
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_env(cls) -> "A2AClientPool":
+    return cls(
+        max_connections=int(os.environ.get("A2A_HTTP_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(os.environ.get("A2A_HTTP_MAX_KEEPALIVE", 20)),
+        keepalive_expiry=float(os.environ.get("A2A_HTTP_KEEPALIVE_EXPIRY", 30)),
+        http2=_env_flag("A2A_HTTP2", True),
+        timeout=float(os.environ.get("A2A_HTTP_TIMEOUT", 30)),
+    )
+
+  def get_client(self) -> httpx.AsyncClient:
+    """Returns the shared client. Await its requests through `run` or `stream`."""
+    with self._lock:
+      if self._loop is None:
+        self._loop = AgentLoop(name="a2a-http-loop")
+      if self._client is None or self._client.is_closed:
+        self._transport = _MeteredTransport(
+            httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2),
+            self,
+        )
+        self._client = httpx.AsyncClient(transport=self._transport, timeout=self.timeout)
+        self._count(clients_opened=1)
+      return self._client
+
+  def _count(self, **deltas) -> None:
+    with self._stats_lock:
+      for name, delta in deltas.items():
+        self.stats[name] += delta
+
+  async def run(self, coro):
+    """Awaits a coroutine that uses the shared client on the pool's loop."""
+    self.get_client()
+    return await self._loop.run(coro)
+
+  async def stream(self, agen):
+    """Iterates an async generator that uses the shared client on the pool's loop."""
+    self.get_client()
+    async for item in self._loop.stream(agen):
+      yield item
+
+  def metrics(self) -> dict:
+    """Returns the request and connection counters and the pool settings."""
+    with self._stats_lock:
+      stats = dict(self.stats)
+    requests = stats["requests_total"]
+    return {
+        **stats,
+        "avg_latency_ms": round(stats["latency_seconds_total"] * 1000 / requests, 1) if requests else 0.0,
+        "http2": self.http2,
+        "max_connections": self.limits.max_connections,
+        "max_keepalive_connections": self.limits.max_keepalive_connections,
+    }
+
+  async def aclose(self) -> None:
+    """Closes the client and all pooled connections."""
+    with self._lock:
+      client, self._client, self._transport = self._client, None, None
+    if client is not None and not client.is_closed:
+      await self._loop.run(client.aclose())
+      log.info("A2A HTTP client pool closed.")
+
+
+a2a_client_pool = A2AClientPool.from_env()
@@ -0,0 +1,128 @@
+"""In-process dispatch to the A2A agents for single-node deployments.
+
+Instead of resolving agent cards over HTTP, the orchestrator builds each
+agent's runner, card and executor in this process and calls its A2A request
+handler directly. The handlers run on one dedicated event loop, because ADK
+runners and MCP sessions are bound to the loop they were first used on while
+the orchestrator itself may be driven from a new loop per request.
+"""
+
+import logging
+import os
+import sys
+from collections.abc import AsyncIterator
+
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import (
+  AgentCard,
+  JSONRPCErrorResponse,
+  SendMessageRequest,
+  SendMessageResponse,
+  SendMessageSuccessResponse,
+  SendStreamingMessageRequest,
+  SendStreamingMessageResponse,
+  SendStreamingMessageSuccessResponse,
+)
+from a2a.utils.errors import ServerError
+try:
+  from agent_loop import AgentLoop
+except ImportError:
+  from orchestrate.agent_loop import AgentLoop
+
+log = logging.getLogger(__name__)
+
+# Comma separated subset of: memory, social, photos
+LOCAL_AGENTS = [
+    name.strip() for name in os.environ.get("LOCAL_AGENTS", "memory,social,photos").split(",") if name.strip()
+]
+
+_AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_REPO_DIR = os.path.dirname(_AGENTS_DIR)
+
+
+class LocalAgentConnection:
+  """Same interface as RemoteAgentConnections, without the HTTP hop."""
+
+  def __init__(self, agent_card: AgentCard, request_handler: DefaultRequestHandler, agent_loop: AgentLoop):
+    self.card = agent_card
+    self._handler = request_handler
+    self._loop = agent_loop
+
+  def get_agent(self) -> AgentCard:
+    return self.card
+
+  async def send_message(self, message_request: SendMessageRequest) -> SendMessageResponse:
+    try:
+      result = await self._loop.run(self._handler.on_message_send(message_request.params))
+    except ServerError as e:
+      return SendMessageResponse(root=JSONRPCErrorResponse(id=message_request.id, error=e.error))
+    return SendMessageResponse(root=SendMessageSuccessResponse(id=message_request.id, result=result))
+
+  async def send_message_streaming(
+      self, message_request: SendStreamingMessageRequest
+  ) -> AsyncIterator[SendStreamingMessageResponse]:
+    try:
+      async for event in self._loop.stream(self._handler.on_message_send_stream(message_request.params)):
+        yield SendStreamingMessageResponse(
+            root=SendStreamingMessageSuccessResponse(id=message_request.id, result=event)
+        )
+    except ServerError as e:
+      yield SendStreamingMessageResponse(root=JSONRPCErrorResponse(id=message_request.id, error=e.error))
+
+
+def _load_memory_agent():
+  from memory_agent.a2a_server import MemoryAgent
+  from memory_agent.agent_executor import MemoryAgentExecutor
+  wrapper = MemoryAgent()
+  return wrapper.agent_card, MemoryAgentExecutor(wrapper.runner, wrapper.agent_card)
+
+
+def _load_social_agent():
+  from agents.social_profiling_agent.a2a_server import SocialAgent
+  from agents.social_profiling_agent.agent_executor import SocialAgentExecutor
+  wrapper = SocialAgent()
+  return wrapper.agent_card, SocialAgentExecutor(wrapper.runner, wrapper.agent_card)
+
+
+def _load_photos_agent():
+  from photos_mcp_client.a2a_server import PhotosAgent
+  from photos_mcp_client.agent_executor import PhotosAgentExecutor
+  wrapper = PhotosAgent()
+  return wrapper.agent_card, PhotosAgentExecutor(wrapper.runner, wrapper.agent_card)
+
+
+_LOADERS = {
+    "memory": _load_memory_agent,
+    "social": _load_social_agent,
+    "photos": _load_photos_agent,
+}
+
+
+def build_local_connections() -> dict[str, LocalAgentConnection]:
+  """Builds the agents listed in LOCAL_AGENTS and returns them keyed by card name.
+
+  Must be called from a thread without a running event loop: some agent
+  modules run `asyncio.run` while they are imported.
+  """
+  for path in (_AGENTS_DIR, _REPO_DIR):
+    if path not in sys.path:
+      sys.path.append(path)
+
+  agent_loop = AgentLoop()
+  connections: dict[str, LocalAgentConnection] = {}
+  for name in LOCAL_AGENTS:
+    loader = _LOADERS.get(name)
+    if loader is None:
+      log.error(f"Unknown local agent '{name}'. Expected one of: {', '.join(_LOADERS)}")
+      continue
+    try:
+      card, executor = loader()
+    except (Exception, SystemExit) as e:
+      # The social profiling agent exits if its toolbox server is unreachable.
+      log.error(f"Could not load local agent '{name}': {type(e).__name__}: {e}", exc_info=True)
+      continue
+    handler = DefaultRequestHandler(agent_executor=executor, task_store=InMemoryTaskStore())
+    connections[card.name] = LocalAgentConnection(card, handler, agent_loop)
+    log.info(f"Loaded local agent '{card.name}'.")
+  return connections
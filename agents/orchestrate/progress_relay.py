@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+
+from a2a.types import (
+  AgentCard,
+  TaskArtifactUpdateEvent,
+  TaskStatusUpdateEvent,
+  TextPart,
+)
+try:
+  from http_pool import a2a_client_pool
+except ImportError:
+  from orchestrate.http_pool import a2a_client_pool
+
+log = logging.getLogger(__name__)
+
+# Base URL of the web app endpoint that accepts progress events, e.g.
+# https://<google-photos-app>/api/chatbot/progress
+PROGRESS_RELAY_URL = os.environ.get("PROGRESS_RELAY_URL", "").rstrip("/")
+# Shared with the web app, which rejects progress events without it.
+PROGRESS_RELAY_SECRET = os.environ.get("PROGRESS_RELAY_SECRET", "")
+SECRET_HEADER = "X-Progress-Relay-Secret"
+
+
+def progress_from_event(event: TaskStatusUpdateEvent | TaskArtifactUpdateEvent, card: AgentCard) -> dict | None:
+  """Summarises a remote task event as a small JSON-friendly progress dict."""
+  if isinstance(event, TaskStatusUpdateEvent):
+    message = event.status.message
+    texts = [p.root.text for p in (message.parts if message else []) if isinstance(p.root, TextPart)]
+    return {
+        "agent": card.name,
+        "kind": event.kind,
+        "state": event.status.state.value,
+        "text": "".join(texts),
+        "final": event.final,
+    }
+  if isinstance(event, TaskArtifactUpdateEvent):
+    texts = [p.root.text for p in event.artifact.parts if isinstance(p.root, TextPart)]
+    return {
+        "agent": card.name,
+        "kind": event.kind,
+        "text": "".join(texts),
+        "final": bool(event.lastChunk),
+    }
+  return None
+
+
+class ProgressRelay:
+  """Forwards remote agent progress to the web app for one chat session.
+
+  The web app creates the orchestrator session with a `relay_channel` in its
+  state and listens on that channel; every progress event is POSTed to
+  `<PROGRESS_RELAY_URL>/<channel>`, with PROGRESS_RELAY_SECRET in a header,
+  without blocking the delegation. One sender task posts the events in the
+  order they were published, so the browser sees them in that order.
+  """
+
+  def __init__(self, channel: str | None):
+    self.channel = channel
+    self._queue: asyncio.Queue | None = None
+    self._sender: asyncio.Task | None = None
+
+  @property
+  def enabled(self) -> bool:
+    return bool(PROGRESS_RELAY_URL and PROGRESS_RELAY_SECRET and self.channel)
+
+  def publish(self, progress: dict | None) -> None:
+    if not self.enabled or progress is None:
+      return
+    if self._sender is None:
+      self._queue = asyncio.Queue()
+      self._sender = asyncio.get_running_loop().create_task(self._send_all())
+    self._queue.put_nowait(progress)
+
+  async def _send_all(self) -> None:
+    while True:
+      progress = await self._queue.get()
+      try:
+        await self._post(progress)
+      finally:
+        self._queue.task_done()
+
+  async def _post(self, progress: dict) -> None:
+    try:
+      client = a2a_client_pool.get_client()
+      await a2a_client_pool.run(client.post(
+          f"{PROGRESS_RELAY_URL}/{self.channel}",
+          json=progress,
+          headers={SECRET_HEADER: PROGRESS_RELAY_SECRET},
+          timeout=5,
+      ))
+    except Exception as e:
+      log.warning(f"Could not relay progress to channel {self.channel}: {e}")
+
+  async def flush(self) -> None:
+    """Waits for the progress events that are still being sent, then stops the sender."""
+    if self._sender is None:
+      return
+    await self._queue.join()
+    self._sender.cancel()
+    self._sender = None
@@ -14,24 +14,32 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from collections.abc import Callable
-
-import httpx
+import logging
+from collections.abc import AsyncIterator, Callable
 
 from a2a.client import A2AClient
 from a2a.types import (
   AgentCard,
   SendMessageRequest,
   SendMessageResponse,
+  SendStreamingMessageRequest,
+  SendStreamingMessageResponse,
   Task,
   TaskArtifactUpdateEvent,
   TaskStatusUpdateEvent,
 )
 from dotenv import load_dotenv
 
+try:
+  from http_pool import A2AClientPool, a2a_client_pool
+except ImportError:
+  from orchestrate.http_pool import A2AClientPool, a2a_client_pool
+
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 TaskCallbackArg = Task | TaskStatusUpdateEvent | TaskArtifactUpdateEvent
 TaskUpdateCallback = Callable[[TaskCallbackArg, AgentCard], Task]
 
@@ -39,19 +47,38 @@ TaskUpdateCallback = Callable[[TaskCallbackArg, AgentCard], Task]
 class RemoteAgentConnections:
   """A class to hold the connections to the remote agents."""
 
-  def __init__(self, agent_card: AgentCard, agent_url: str):
-    print(f'agent_card: {agent_card}')
-    print(f'agent_url: {agent_url}')
-    self._httpx_client = httpx.AsyncClient(timeout=30)
-    self.agent_client = A2AClient(
-        self._httpx_client, agent_card, url=agent_url
-    )
+  def __init__(
+      self,
+      agent_card: AgentCard,
+      agent_url: str,
+      client_pool: A2AClientPool = a2a_client_pool,
+  ):
+    log.info(f"Connecting to {agent_card.name} at {agent_url}")
+    log.debug(f"Agent card: {agent_card}")
+    self._client_pool = client_pool
+    self.agent_url = agent_url
     self.card = agent_card
 
+  @property
+  def agent_client(self) -> A2AClient:
+    # The client is cheap to build; the pooled connections live in httpx,
+    # on the pool's loop, so its calls are awaited through the pool.
+    return A2AClient(
+        self._client_pool.get_client(), self.card, url=self.agent_url
+    )
+
   def get_agent(self) -> AgentCard:
     return self.card
 
   async def send_message(
       self, message_request: SendMessageRequest
   ) -> SendMessageResponse:
-    return await self.agent_client.send_message(message_request)
\ No newline at end of file
+    return await self._client_pool.run(self.agent_client.send_message(message_request))
+
+  async def send_message_streaming(
+      self, message_request: SendStreamingMessageRequest
+  ) -> AsyncIterator[SendStreamingMessageResponse]:
+    async for response in self._client_pool.stream(
+        self.agent_client.send_message_streaming(message_request)
+    ):
+      yield response
@@ -0,0 +1,109 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from a2a.types import Task
+
+log = logging.getLogger(__name__)
+
+
+def parse_ttls(value: str) -> dict[str, float]:
+  """Parses "Agent Name=seconds,Other Agent=seconds" into a dict."""
+  ttls = {}
+  for item in value.split(','):
+    if not item.strip():
+      continue
+    name, sep, seconds = item.rpartition('=')
+    if not sep or not name.strip():
+      log.warning(f"Ignoring malformed RESULT_CACHE_TTLS entry: {item!r}")
+      continue
+    try:
+      ttls[name.strip()] = float(seconds)
+    except ValueError:
+      log.warning(f"Ignoring RESULT_CACHE_TTLS entry with a non-numeric TTL: {item!r}")
+  return ttls
+
+
+def normalize_task(task: str) -> str:
+  """Collapses whitespace and case so trivially different phrasings share a key."""
+  return re.sub(r'\s+', ' ', task).strip().casefold()
+
+
+class ResultCache:
+  """An opt-in, bounded TTL cache of completed remote agent Tasks.
+
+  Only agents with a positive TTL are cached, so agents with side effects
+  (creating collages, posting memories) are never memoized unless configured.
+  Entries are evicted least-recently-used once `max_entries` is reached.
+  """
+
+  def __init__(self, ttls: dict[str, float] | None = None, max_entries: int = 256):
+    self.ttls = {name: ttl for name, ttl in (ttls or {}).items() if ttl > 0}
+    self.max_entries = max_entries
+    self._entries: OrderedDict[tuple[str, str], tuple[float, Task]] = OrderedDict()
+    self._lock = threading.Lock()
+    self._stats: dict[str, dict[str, int]] = defaultdict(
+        lambda: {'hits': 0, 'misses': 0, 'bypasses': 0, 'expirations': 0, 'evictions': 0}
+    )
+
+  @classmethod
+  def from_env(cls) -> 'ResultCache':
+    return cls(
+        ttls=parse_ttls(os.environ.get('RESULT_CACHE_TTLS', '')),
+        max_entries=int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 256)),
+    )
+
+  def enabled_for(self, agent_name: str) -> bool:
+    return agent_name in self.ttls and self.max_entries > 0
+
+  def get(self, agent_name: str, task: str, bypass: bool = False) -> Task | None:
+    """Returns a copy of the cached Task, or None on a miss or bypass."""
+    if not self.enabled_for(agent_name):
+      return None
+    key = (agent_name, normalize_task(task))
+    with self._lock:
+      stats = self._stats[agent_name]
+      if bypass:
+        stats['bypasses'] += 1
+        return None
+      entry = self._entries.get(key)
+      if entry is not None and entry[0] <= time.monotonic():
+        del self._entries[key]
+        stats['expirations'] += 1
+        entry = None
+      if entry is None:
+        stats['misses'] += 1
+        return None
+      self._entries.move_to_end(key)
+      stats['hits'] += 1
+      return entry[1].model_copy(deep=True)
+
+  def put(self, agent_name: str, task: str, result: Task) -> None:
+    if not self.enabled_for(agent_name):
+      return
+    key = (agent_name, normalize_task(task))
+    expires_at = time.monotonic() + self.ttls[agent_name]
+    with self._lock:
+      self._entries[key] = (expires_at, result.model_copy(deep=True))
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        (evicted_agent, _), _ = self._entries.popitem(last=False)
+        self._stats[evicted_agent]['evictions'] += 1
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def metrics(self) -> dict:
+    """Returns per-agent counters and hit rates, plus the current size."""
+    with self._lock:
+      all_stats = {name: dict(stats) for name, stats in self._stats.items()}
+      size = len(self._entries)
+    agents = {}
+    for name, stats in all_stats.items():
+      lookups = stats['hits'] + stats['misses']
+      agents[name] = {**stats, 'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0.0}
+    return {'size': size, 'max_entries': self.max_entries, 'ttls': dict(self.ttls), 'agents': agents}
@@ -1,17 +1,15 @@
 from a2a.server.apps import A2AStarletteApplication
 from a2a.types import AgentCard, AgentCapabilities, AgentSkill
-from a2a.server.tasks import InMemoryTaskStore
 from a2a.server.request_handlers import DefaultRequestHandler
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.artifacts import InMemoryArtifactService
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 import os
 import logging
 from dotenv import load_dotenv
 from photos_mcp_client.agent_executor import PhotosAgentExecutor
-import uvicorn
+from agent_common import llm_replay, serving
 from photos_mcp_client import agent
 
 load_dotenv()
@@ -34,7 +32,7 @@ class PhotosAgent:
         app_name=self._agent.name,
         agent=self._agent,
         artifact_service=InMemoryArtifactService(),
-        session_service=InMemorySessionService(),
+        session_service=serving.build_session_service("photos_mcp_client"),
         memory_service=InMemoryMemoryService(),
     )
     capabilities = AgentCapabilities(streaming=True)
@@ -68,24 +66,39 @@ class PhotosAgent:
 
   def _build_agent(self) -> LlmAgent:
     """Builds the LLM agent for the Processing the social post and event request."""
+    llm_replay.install(agent.root_agent)
     return agent.root_agent
 
 
-if __name__ == '__main__':
-    try:
-        photosAgent = PhotosAgent()
+def create_app(public_url: str | None = None):
+    """Builds the A2A app. With several workers, uvicorn calls this in each of them.
 
-        request_handler = DefaultRequestHandler(
-            agent_executor=PhotosAgentExecutor(photosAgent.runner,photosAgent.agent_card),
-            task_store=InMemoryTaskStore(),
-        )
+    `public_url` overrides the card URL, e.g. when the app is mounted under a
+    path prefix of the combined agent host.
+    """
+    photosAgent = PhotosAgent()
+    if public_url:
+        photosAgent.agent_card.url = public_url
 
-        server = A2AStarletteApplication(
-            agent_card=photosAgent.agent_card,
-            http_handler=request_handler,
-        )
+    executor = PhotosAgentExecutor(photosAgent.runner, photosAgent.agent_card)
+    request_handler = DefaultRequestHandler(
+        agent_executor=executor,
+        task_store=serving.build_task_store("photos_mcp_client"),
+    )
 
-        uvicorn.run(server.build(), host='0.0.0.0', port=port)
+    server = A2AStarletteApplication(
+        agent_card=photosAgent.agent_card,
+        http_handler=request_handler,
+    )
+
+    app = server.build()
+    serving.add_metrics_route(app, photosAgent.runner, executor)
+    return app
+
+
+if __name__ == '__main__':
+    try:
+        serving.run("photos_mcp_client.a2a_server:create_app", port)
     except Exception as e:
         logger.error(f"An error occurred during server startup: {e}")
-        exit(1)
\ No newline at end of file
+        exit(1)
@@ -2,8 +2,8 @@ import asyncio
 from contextlib import AsyncExitStack
 from dotenv import load_dotenv
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
 from google.adk.tools.mcp_tool.mcp_session_manager import SseServerParams
+from photos_mcp_client.traced_mcp import TracedMCPToolset
 import logging 
 import os
 import nest_asyncio 
@@ -26,7 +26,7 @@ exit_stack: AsyncExitStack | None = None
 async def get_tools_async():
   print("Attempting to connect to MCP Filesystem server...")
   """Gets tools from the File System MCP Server."""
-  tools =  MCPToolset(
+  tools =  TracedMCPToolset(
       connection_params=SseServerParams(url=MCP_SERVER_URL, headers={})
   )
   log.info("MCP Toolset created successfully.")
@@ -0,0 +1,50 @@
+"""MCP tools that carry the caller's trace context to the MCP server.
+
+ADK 1.4 has no public hook for per-call request metadata: `SseServerParams`
+headers are fixed when the toolset is built, and the session manager pools
+sessions by header, so changing headers per call would open a new session
+every time. These classes therefore override `MCPTool._run_async_impl` and
+copy private attributes of the toolset and its tools. tests/test_traced_mcp.py
+pins that behaviour, so an ADK upgrade that changes those internals fails
+there instead of silently dropping the trace context.
+"""
+
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
+from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+from mcp import types as mcp_types
+from opentelemetry import propagate
+
+
+class TracedMCPTool(MCPTool):
+  """An MCP tool that sends the current trace context in the request's `_meta`.
+
+  The MCP server reads the W3C `traceparent`/`tracestate` entries from there,
+  so its spans join the trace of the A2A task that called the tool.
+  """
+
+  async def _run_async_impl(self, *, args, tool_context, credential):
+    headers = await self._get_headers(tool_context, credential)
+    session = await self._mcp_session_manager.create_session(headers=headers)
+    carrier: dict[str, str] = {}
+    propagate.inject(carrier)
+    request = mcp_types.CallToolRequest(
+        method="tools/call",
+        params=mcp_types.CallToolRequestParams(name=self.name, arguments=args, _meta=carrier or None),
+    )
+    return await session.send_request(mcp_types.ClientRequest(request), mcp_types.CallToolResult)
+
+
+class TracedMCPToolset(MCPToolset):
+  """An MCPToolset whose tools are `TracedMCPTool`s."""
+
+  async def get_tools(self, readonly_context=None):
+    tools = await super().get_tools(readonly_context)
+    return [
+        TracedMCPTool(
+            mcp_tool=tool._mcp_tool,
+            mcp_session_manager=self._mcp_session_manager,
+            auth_scheme=self._auth_scheme,
+            auth_credential=self._auth_credential,
+        )
+        for tool in tools
+    ]
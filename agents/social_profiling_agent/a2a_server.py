@@ -2,20 +2,18 @@ import os
 import logging
 from dotenv import load_dotenv
 
-import uvicorn
 from a2a.server.apps import A2AStarletteApplication
 from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
 from a2a.types import AgentCard, AgentCapabilities, AgentSkill
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.adk.artifacts import InMemoryArtifactService
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 
 # Import the local agent and executor definitions
 from agents.social_profiling_agent import agent
 from agents.social_profiling_agent.agent_executor import SocialAgentExecutor
+from agents.agent_common import llm_replay, serving
 
 load_dotenv()
 
@@ -33,12 +31,12 @@ class SocialAgent:
     SUPPORTED_CONTENT_TYPES = ["text", "text/plain"]
 
     def __init__(self):
-        self._agent = agent.root_agent
+        self._agent = self._build_agent()
         self.runner = Runner(
             app_name=self._agent.name,
             agent=self._agent,
             artifact_service=InMemoryArtifactService(),
-            session_service=InMemorySessionService(),
+            session_service=serving.build_session_service("social_profiling_agent"),
             memory_service=InMemoryMemoryService(),
         )
         capabilities = AgentCapabilities(streaming=True)
@@ -72,26 +70,40 @@ class SocialAgent:
 
     def _build_agent(self) -> LlmAgent:
         """Builds the LLM agent for the social profile analysis agent."""
+        llm_replay.install(agent.root_agent)
         return agent.root_agent
 
 
-if __name__ == '__main__':
-    try:
-        social_agent = SocialAgent()
+def create_app(public_url: str | None = None):
+    """Builds the A2A app. With several workers, uvicorn calls this in each of them.
 
-        request_handler = DefaultRequestHandler(
-            agent_executor=SocialAgentExecutor(social_agent.runner, social_agent.agent_card),
-            task_store=InMemoryTaskStore(),
-        )
+    `public_url` overrides the card URL, e.g. when the app is mounted under a
+    path prefix of the combined agent host.
+    """
+    social_agent = SocialAgent()
+    if public_url:
+        social_agent.agent_card.url = public_url
 
-        server = A2AStarletteApplication(
-            agent_card=social_agent.agent_card,
-            http_handler=request_handler,
-        )
-        logger.info(f"Starting server for Agent: {social_agent.agent_card.name}")
-        uvicorn.run(server.build(), host='0.0.0.0', port=port)
+    executor = SocialAgentExecutor(social_agent.runner, social_agent.agent_card)
+    request_handler = DefaultRequestHandler(
+        agent_executor=executor,
+        task_store=serving.build_task_store("social_profiling_agent"),
+    )
+
+    server = A2AStarletteApplication(
+        agent_card=social_agent.agent_card,
+        http_handler=request_handler,
+    )
+    logger.info(f"Starting server for Agent: {social_agent.agent_card.name}")
 
+    app = server.build()
+    serving.add_metrics_route(app, social_agent.runner, executor)
+    return app
+
+
+if __name__ == '__main__':
+    try:
+        serving.run("agents.social_profiling_agent.a2a_server:create_app", port)
     except Exception as e:
         logger.error(f"FATAL: An error occurred during server startup: {e}", exc_info=True)
         exit(1)
-
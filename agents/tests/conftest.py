@@ -0,0 +1,12 @@
+import pytest
+
+from agent_common import storage
+
+
+@pytest.fixture
+def memory_storage():
+    """Keeps `gs://` objects in a fresh in-memory backend for the duration of a test."""
+    backend = storage.MemoryBackend()
+    previous = storage.use_backend(backend)
+    yield backend
+    storage.use_backend(previous)
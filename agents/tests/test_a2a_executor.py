@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from a2a.server.agent_execution.context import RequestContext
+from a2a.server.events.event_queue import EventQueue
+from a2a.types import (
+    MessageSendParams,
+    Task,
+    TaskNotCancelableError,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+)
+from a2a.utils.errors import ServerError
+
+from agent_common.a2a_executor import AdkAgentExecutor
+from orchestrate.agent import create_send_message_payload
+
+
+class FakeRunner:
+    """Runs an agent that waits until `release` is set, then answers."""
+
+    app_name = "test"
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+        async def get_session(app_name, user_id, session_id):
+            return SimpleNamespace(id=session_id)
+
+        self.session_service = SimpleNamespace(get_session=get_session)
+
+    async def run_async(self, session_id, user_id, new_message):
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        yield SimpleNamespace(is_final_response=lambda: True, content=new_message)
+
+
+def make_context(text: str = "hello", task: Task | None = None) -> RequestContext:
+    params = MessageSendParams.model_validate(create_send_message_payload(text))
+    return RequestContext(request=params, task_id="task", context_id="context", task=task)
+
+
+def drain(queue: EventQueue) -> list[TaskState]:
+    states = []
+    while not queue.queue.empty():
+        event = queue.queue.get_nowait()
+        if isinstance(event, TaskStatusUpdateEvent):
+            states.append(event.status.state)
+    return states
+
+
+def test_cancel_stops_the_run_and_marks_the_task_canceled():
+    async def scenario():
+        runner = FakeRunner()
+        executor = AdkAgentExecutor(runner, card=None)
+        queue = EventQueue()
+        execution = asyncio.create_task(executor.execute(make_context(), queue))
+        await runner.started.wait()
+        await executor.cancel(make_context(), queue)
+        # execute() returns normally: the cancellation came through cancel().
+        await execution
+        return runner, executor, drain(queue)
+
+    runner, executor, states = asyncio.run(scenario())
+    assert runner.cancelled
+    assert states == [TaskState.submitted, TaskState.working, TaskState.canceled]
+    assert executor._running == {}
+    assert executor._cancelled == set()
+
+
+def test_tasks_not_running_here_are_not_cancelable():
+    async def scenario():
+        executor = AdkAgentExecutor(FakeRunner(), card=None)
+        queue = EventQueue()
+        with pytest.raises(ServerError) as error:
+            await executor.cancel(make_context(), queue)
+        return error.value, drain(queue)
+
+    error, states = asyncio.run(scenario())
+    assert isinstance(error.error, TaskNotCancelableError)
+    assert states == []
+
+
+def test_finished_tasks_are_not_cancelable():
+    async def scenario():
+        runner = FakeRunner()
+        executor = AdkAgentExecutor(runner, card=None)
+        queue = EventQueue()
+        execution = asyncio.create_task(executor.execute(make_context(), queue))
+        await runner.started.wait()
+        # The task store already records the task as completed.
+        done = Task(id="task", contextId="context", status=TaskStatus(state=TaskState.completed))
+        with pytest.raises(ServerError) as error:
+            await executor.cancel(make_context(task=done), queue)
+        runner.release.set()
+        await execution
+        return runner, error.value, drain(queue)
+
+    runner, error, states = asyncio.run(scenario())
+    assert isinstance(error.error, TaskNotCancelableError)
+    assert not runner.cancelled
+    assert states[-1] == TaskState.completed
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from agent_common.admission import AdmissionController, Overloaded
+
+
+async def hold(controller: AdmissionController, release: asyncio.Event) -> None:
+    async with controller.slot():
+        await release.wait()
+
+
+def test_runs_beyond_the_limit_wait_for_a_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=2, max_queued=1, queue_timeout=5)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(controller, release)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert (controller.metrics()["running"], controller.metrics()["queue_depth"]) == (2, 1)
+        release.set()
+        await asyncio.gather(*holders)
+        return controller.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert (metrics["running"], metrics["queue_depth"], metrics["admitted"]) == (0, 0, 3)
+    assert metrics["wait_ms_max"] > 0
+
+
+def test_requests_beyond_the_queue_are_rejected():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queued=1, queue_timeout=5, retry_after=7)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(controller, release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as rejected:
+            async with controller.slot():
+                pass
+        release.set()
+        await asyncio.gather(*holders)
+        return controller, rejected.value
+
+    controller, error = asyncio.run(scenario())
+    assert error.retry_after == 7
+    assert controller.metrics()["rejected"] == 1
+    assert controller.metrics()["admitted"] == 2
+
+
+def test_queued_requests_time_out():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queued=4, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded, match="within 0.05s"):
+            async with controller.slot():
+                pass
+        assert controller.metrics()["queue_depth"] == 0
+        release.set()
+        await holder
+        return controller.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert (metrics["timed_out"], metrics["admitted"]) == (1, 1)
+
+
+def test_retry_after_grows_with_the_backlog():
+    controller = AdmissionController(max_concurrent=1, retry_after=1)
+    controller._durations.extend([10.0, 10.0])
+    controller._waiting = 2
+    assert controller._suggest_retry_after() == 30
+
+
+def test_slot_is_released_when_the_run_fails():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queued=0)
+        with pytest.raises(RuntimeError):
+            async with controller.slot():
+                raise RuntimeError("run failed")
+        async with controller.slot():
+            pass
+        return controller.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert (metrics["running"], metrics["admitted"], metrics["rejected"]) == (0, 2, 0)
+
+
+def test_from_env_prefers_the_agent_prefix(monkeypatch):
+    monkeypatch.setenv("A2A_MAX_CONCURRENT", "3")
+    monkeypatch.setenv("A2A_MAX_QUEUED", "6")
+    monkeypatch.setenv("MEMORY_AGENT_MAX_CONCURRENT", "2")
+    controller = AdmissionController.from_env("MEMORY_AGENT")
+    assert (controller.max_concurrent, controller.max_queued) == (2, 6)
+    assert AdmissionController.from_env().max_concurrent == 3
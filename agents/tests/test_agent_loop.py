@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from orchestrate.agent_loop import AgentLoop
+
+
+def test_work_from_every_request_loop_runs_on_the_agent_loop():
+    agent_loop = AgentLoop(name="test-agent-loop")
+    seen = []
+
+    async def where():
+        seen.append(asyncio.get_running_loop())
+        return len(seen)
+
+    # Each call comes from a new event loop, as with Agent Engine queries.
+    assert [asyncio.run(agent_loop.run(where())) for _ in range(3)] == [1, 2, 3]
+    assert seen == [agent_loop.loop] * 3
+
+
+def test_stream_yields_on_the_caller_loop():
+    agent_loop = AgentLoop(name="test-agent-loop")
+
+    async def numbers():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i, asyncio.get_running_loop()
+
+    async def collect():
+        return asyncio.get_running_loop(), [item async for item in agent_loop.stream(numbers())]
+
+    for _ in range(2):
+        caller, items = asyncio.run(collect())
+        assert [i for i, _ in items] == [0, 1, 2]
+        assert {loop for _, loop in items} == {agent_loop.loop}
+        assert caller is not agent_loop.loop
+
+
+def test_errors_reach_the_caller():
+    agent_loop = AgentLoop(name="test-agent-loop")
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def fail_midway():
+        yield 1
+        raise ValueError("boom midway")
+
+    async def collect():
+        items = []
+        async for item in agent_loop.stream(fail_midway()):
+            items.append(item)
+        return items
+
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(agent_loop.run(fail()))
+    with pytest.raises(ValueError, match="boom midway"):
+        asyncio.run(collect())
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+import callagent
+
+
+class FakeEngine:
+    def __init__(self, name: str = "engine"):
+        self.name = name
+        self.sessions = 0
+
+    def create_session(self, user_id, state):
+        self.sessions += 1
+        return {"id": f"{self.name}-session-{self.sessions}"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(callagent, "_metrics", dict.fromkeys(callagent._metrics, 0))
+    monkeypatch.setattr(callagent, "_engine", None)
+    monkeypatch.setattr(callagent, "_engine_fetched_at", 0.0)
+    monkeypatch.setattr(callagent, "_sessions", {})
+    monkeypatch.setattr(callagent, "ORCHESTRATOR_MODE", "agent_engine")
+    monkeypatch.setattr(callagent, "ORCHESTRATE_AGENT_ID", "projects/p/locations/l/reasoningEngines/1")
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    engines = []
+
+    def get(agent_id):
+        engines.append(FakeEngine(f"engine{len(engines)}"))
+        return engines[-1]
+
+    monkeypatch.setattr(callagent.agent_engines, "get", get)
+    return engines
+
+
+def test_the_engine_handle_is_fetched_once(fetches):
+    first = callagent.get_agent_engine()
+    assert callagent.get_agent_engine() is first
+    assert len(fetches) == 1
+    m = callagent.metrics()
+    assert (m["engine_fetches"], m["engine_cache_hits"]) == (1, 1)
+
+
+def test_a_stale_handle_is_served_while_it_refreshes(fetches, monkeypatch):
+    first = callagent.get_agent_engine()
+    monkeypatch.setattr(callagent, "_engine_fetched_at", time.monotonic() - callagent.ENGINE_REFRESH_INTERVAL - 1)
+    assert callagent.get_agent_engine() is first
+    deadline = time.monotonic() + 5
+    while callagent._engine is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert callagent.get_agent_engine() is fetches[1]
+    assert len(fetches) == 2
+
+
+def test_sessions_are_reused_between_runs():
+    engine = FakeEngine()
+    session = callagent._checkout_session(engine, "alice")
+    callagent._release_session("alice", session, failed=False)
+    again = callagent._checkout_session(engine, "alice")
+    assert again is session
+    assert (again["runs"], engine.sessions) == (2, 1)
+    m = callagent.metrics()
+    assert (m["session_creates"], m["session_reuses"]) == (1, 1)
+
+
+def test_a_busy_session_is_not_shared():
+    engine = FakeEngine()
+    session = callagent._checkout_session(engine, "alice")
+    concurrent = callagent._checkout_session(engine, "alice")
+    assert concurrent["id"] != session["id"]
+    assert concurrent["channel"] != session["channel"]
+    callagent._release_session("alice", concurrent, failed=False)
+    # The one-off session is not kept, so the next run waits for nobody and reuses the first.
+    callagent._release_session("alice", session, failed=False)
+    assert callagent._checkout_session(engine, "alice") is session
+
+
+def test_sessions_are_replaced_after_max_runs_idle_ttl_or_failure(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(callagent, "CHAT_SESSION_MAX_RUNS", 2)
+    session = callagent._checkout_session(engine, "alice")
+    callagent._release_session("alice", session, failed=False)
+    session = callagent._checkout_session(engine, "alice")
+    callagent._release_session("alice", session, failed=False)
+    replaced = callagent._checkout_session(engine, "alice")
+    assert replaced is not session
+
+    callagent._release_session("alice", replaced, failed=False)
+    replaced["last_used"] -= callagent.CHAT_SESSION_IDLE_TTL + 1
+    idle_replacement = callagent._checkout_session(engine, "alice")
+    assert idle_replacement is not replaced
+
+    callagent._release_session("alice", idle_replacement, failed=True)
+    assert "alice" not in callagent._sessions
+
+
+def test_counters_from_many_threads_add_up():
+    def count():
+        for _ in range(1000):
+            callagent._count("runs")
+            callagent._count("engine_fetch_ms_total", 0.5)
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    m = callagent.metrics()
+    assert (m["runs"], m["engine_fetch_ms_total"]) == (8000, 4000.0)
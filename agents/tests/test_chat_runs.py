@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import chat_runs
+
+
+@pytest.fixture(autouse=True)
+def fresh_runs(monkeypatch):
+    monkeypatch.setattr(chat_runs, "_runs", {})
+    monkeypatch.setattr(chat_runs, "_in_flight", {})
+    monkeypatch.setattr(chat_runs, "_stats", dict.fromkeys(chat_runs._stats, 0))
+
+
+def test_a_run_goes_from_queued_to_running_to_completed():
+    release = threading.Event()
+    statuses = []
+
+    def produce():
+        # Runs on the worker, possibly before start_run has returned the run.
+        (current,) = chat_runs._runs.values()
+        statuses.append(current.status)
+        yield {"type": "progress"}
+        release.wait(5)
+        yield {"type": "final_response", "data": {}}
+
+    run, deduplicated = chat_runs.start_run(produce, chat_runs.dedupe_key("alice", "Hi  there"))
+    assert not deduplicated
+    events, done = run.events_after(0, timeout=5)
+    assert (statuses, run.status, done) == (["running"], "running", False)
+
+    same, deduplicated = chat_runs.start_run(produce, chat_runs.dedupe_key("alice", "hi there"))
+    assert same is run and deduplicated
+
+    release.set()
+    while not done:
+        events, done = run.events_after(len(events), timeout=5)
+    assert run.status == "completed"
+    assert run.result()["type"] == "final_response"
+    assert chat_runs.stats()["runs"] == {"completed": 1}
+
+
+def test_a_failing_run_ends_with_an_error_event():
+    def produce():
+        raise RuntimeError("boom")
+        yield
+
+    run, _ = chat_runs.start_run(produce)
+    events, done = run.events_after(0, timeout=5)
+    while not done:
+        events, done = run.events_after(len(events), timeout=5)
+    assert run.status == "failed"
+    assert run.result() == {"type": "error", "data": {"message": "Chat run failed: boom"}}
+
+
+def test_event_ids_round_trip():
+    assert chat_runs.parse_event_id(chat_runs.format_event_id("run", 3)) == ("run", 3)
+    assert chat_runs.parse_event_id("garbage") == (None, 0)
+    assert chat_runs.parse_event_id(None) == (None, 0)
@@ -0,0 +1,77 @@
+import json
+import sys
+
+import pytest
+
+from benchmarks import collage
+
+RESULT = {
+    "load_ms": 1.0, "tiles_ms": 30.0, "wall_ms": 100.0, "decode_ms": 30.0, "resize_ms": 60.0, "compose_ms": 1.0,
+    "encode_ms": 10.0, "save_ms": 1.0, "peak_rss_mb": 60.0, "idle_rss_mb": 40.0, "canvas": "850x650",
+    "bytes": 1000, "repeats": 1,
+}
+
+
+@pytest.fixture
+def benchmark(monkeypatch, tmp_path):
+    """Runs main() on one scenario whose render is faked, returning its exit code."""
+    runs = []
+    wall_ms = {"next": 100.0}
+
+    def run_in_subprocess(name, paths, output_path, repeats, storage_backend):
+        runs.append(name)
+        return dict(RESULT, wall_ms=wall_ms["next"])
+
+    monkeypatch.setattr(collage, "make_photos", lambda workdir, *scenario: [])
+    monkeypatch.setattr(collage, "_run_in_subprocess", run_in_subprocess)
+    baseline_path = tmp_path / "baseline.json"
+
+    def main(*args, wall_ms_next=100.0):
+        wall_ms["next"] = wall_ms_next
+        argv = ["collage", "--scenario", "2mp-4-landscape", "--workdir", str(tmp_path), "--baseline", str(baseline_path), *args]
+        monkeypatch.setattr(sys, "argv", argv)
+        return collage.main()
+
+    return main, baseline_path, runs
+
+
+def test_a_saved_baseline_is_compared_against(benchmark):
+    main, baseline_path, runs = benchmark
+    assert main("--save-baseline") == 0
+    saved = json.loads(baseline_path.read_text())
+    assert saved["machine"] == collage._machine()
+    assert saved["settings"] == {**collage._settings(), "storage": "local"}
+
+    assert main(wall_ms_next=120.0) == 0
+    assert main(wall_ms_next=500.0) == 1
+    assert runs == ["2mp-4-landscape"] * 3
+
+
+@pytest.mark.parametrize("key", ["machine", "settings"])
+def test_another_machines_baseline_is_refused(benchmark, key, capsys):
+    main, baseline_path, runs = benchmark
+    assert main("--save-baseline") == 0
+    saved = json.loads(baseline_path.read_text())
+    saved[key]["cpu_count" if key == "machine" else "COLLAGE_FORMAT"] = "elsewhere"
+    baseline_path.write_text(json.dumps(saved))
+
+    assert main() == 2
+    assert "--save-baseline" in capsys.readouterr().err
+    # Nothing is rendered against a baseline that cannot be compared.
+    assert runs == ["2mp-4-landscape"]
+
+
+def test_other_storage_backends_need_their_own_baseline(benchmark):
+    main, _, runs = benchmark
+    assert main("--save-baseline") == 0
+    assert main("--storage", "memory") == 2
+    assert runs == ["2mp-4-landscape"]
+
+
+def test_small_slowdowns_within_the_slack_are_not_regressions():
+    baseline = {"scenarios": {"a": RESULT}}
+    assert collage.compare({"a": dict(RESULT, wall_ms=140.0)}, baseline, 0.3, 50, 0.15) == []
+    (regression,) = collage.compare({"a": dict(RESULT, wall_ms=160.0)}, baseline, 0.3, 50, 0.15)
+    assert regression.startswith("a: wall time 160 ms")
+    (regression,) = collage.compare({"a": dict(RESULT, peak_rss_mb=70.0)}, baseline, 0.3, 50, 0.15)
+    assert "peak RSS" in regression
@@ -0,0 +1,60 @@
+import os
+
+from agent_common import storage
+from memory_agent import collage_index
+
+PARAMS = {"layout": "justified", "width": 800}
+
+
+def test_keys_depend_on_image_order_and_params():
+    key = collage_index.make_key(["a#1", "b#1"], PARAMS)
+    assert key == collage_index.make_key(["a#1", "b#1"], dict(reversed(PARAMS.items())))
+    assert key != collage_index.make_key(["b#1", "a#1"], PARAMS)
+    assert key != collage_index.make_key(["a#1", "b#2"], PARAMS)
+    assert key != collage_index.make_key(["a#1", "b#1"], {**PARAMS, "width": 900})
+
+
+def test_recorded_collages_are_found(memory_storage):
+    key = collage_index.make_key(["a#1"], PARAMS)
+    output = "gs://bucket/collages/first.jpg"
+    assert collage_index.lookup(output, key) is None
+
+    storage.write_bytes(output, b"collage")
+    assert collage_index.record(output, key) == output
+    assert storage.read_text(f"gs://bucket/collages/{collage_index.MARKER_FOLDER}/{key}") == output
+    assert collage_index.lookup("gs://bucket/collages/second.jpg", key) == output
+    # Markers are only looked up next to the output.
+    assert collage_index.lookup("gs://bucket/elsewhere/second.jpg", key) is None
+
+
+def test_losing_a_race_returns_the_winner_and_deletes_the_duplicate(memory_storage):
+    key = collage_index.make_key(["a#1"], PARAMS)
+    winner, loser = "gs://bucket/collages/winner.jpg", "gs://bucket/collages/loser.jpg"
+    storage.write_bytes(winner, b"collage")
+    storage.write_bytes(loser, b"collage")
+    assert collage_index.record(winner, key) == winner
+    assert collage_index.record(loser, key) == winner
+    assert not storage.exists(loser)
+    assert storage.exists(winner)
+
+
+def test_markers_of_deleted_collages_are_replaced(memory_storage):
+    key = collage_index.make_key(["a#1"], PARAMS)
+    old, new = "gs://bucket/collages/old.jpg", "gs://bucket/collages/new.jpg"
+    storage.write_bytes(old, b"collage")
+    collage_index.record(old, key)
+    storage.delete(old)
+    assert collage_index.lookup(new, key) is None
+
+    storage.write_bytes(new, b"collage")
+    assert collage_index.record(new, key) == new
+    assert collage_index.lookup(old, key) == new
+
+
+def test_local_outputs(tmp_path):
+    key = collage_index.make_key(["a#1"], PARAMS)
+    output = tmp_path / "collage.jpg"
+    output.write_bytes(b"collage")
+    assert collage_index.record(str(output), key) == str(output)
+    assert os.path.exists(tmp_path / collage_index.MARKER_FOLDER / key)
+    assert collage_index.lookup(str(tmp_path / "other.jpg"), key) == str(output)
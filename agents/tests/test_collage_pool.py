@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from agent_common import storage
+from memory_agent import collage_index, collage_pool, render
+
+
+@pytest.fixture
+def photos(memory_storage, monkeypatch):
+    monkeypatch.setattr(collage_index, "COLLAGE_DEDUPE", False)
+    uris = []
+    for i in range(4):
+        buffer = BytesIO()
+        Image.new("RGB", (64, 48), (60 * i, 100, 200)).save(buffer, format="JPEG")
+        uri = f"gs://photos/{i}.jpg"
+        storage.write_bytes(uri, buffer.getvalue())
+        uris.append(uri)
+    return uris
+
+
+def test_a_cancelled_render_is_not_uploaded(photos):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(render.RenderCancelled):
+        render.render_collage(photos, "gs://photos/collage.jpg", cancel=cancel)
+    assert not storage.exists("gs://photos/collage.jpg")
+
+    assert render.render_collage(photos, "gs://photos/collage.jpg", cancel=threading.Event()).startswith("Collage successfully")
+    assert storage.exists("gs://photos/collage.jpg")
+
+
+def test_a_timed_out_thread_render_does_not_upload(photos, monkeypatch):
+    monkeypatch.setattr(collage_pool, "COLLAGE_PROCESSES", 0)
+    monkeypatch.setattr(collage_pool, "COLLAGE_TIMEOUT", 0.05)
+    finished = threading.Event()
+    real_render = render.render_collage
+
+    def slow_render(image_paths, output_path, stats, cancel):
+        time.sleep(0.2)
+        try:
+            return real_render(image_paths, output_path, stats, cancel)
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(render, "render_collage", slow_render)
+    with pytest.raises(collage_pool.CollageTimeout):
+        asyncio.run(collage_pool.run(photos, "gs://photos/collage.jpg"))
+    assert finished.wait(5)
+    assert not storage.exists("gs://photos/collage.jpg")
+
+
+def test_hiding_the_main_module_is_serialized():
+    main = sys.modules["__main__"]
+    spec = main.__spec__
+    inside = []
+    overlaps = []
+
+    def hide():
+        with collage_pool._hide_main_module():
+            inside.append(threading.current_thread())
+            overlaps.append(len(inside))
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=hide) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1] * 4
+    # Overlapping swaps would restore the hidden values instead of the saved ones.
+    assert main.__spec__ is spec
@@ -0,0 +1,120 @@
+import random
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from agent_common import storage
+from memory_agent import encoding
+
+
+@pytest.fixture(autouse=True)
+def default_settings(monkeypatch):
+    """The defaults, whatever COLLAGE_* variables are set where the tests run."""
+    for name, value in (("FORMAT", "jpeg"), ("QUALITY", 90), ("PROGRESSIVE", True), ("TARGET_BYTES", 0), ("MIN_QUALITY", 40)):
+        monkeypatch.setattr(encoding, f"COLLAGE_{name}", value)
+
+
+@pytest.fixture
+def noisy_image() -> Image.Image:
+    rng = random.Random(3)
+    return Image.frombytes("RGB", (160, 120), bytes(rng.randrange(256) for _ in range(160 * 120 * 3)))
+
+
+def test_output_path_takes_the_format_extension(monkeypatch):
+    assert encoding.output_path_for("out/collage.png") == "out/collage.jpg"
+    assert encoding.output_path_for("out/collage.jpeg") == "out/collage.jpeg"
+    assert encoding.output_path_for("out/collage") == "out/collage.jpg"
+    assert encoding.output_path_for("out/collage.v2") == "out/collage.v2.jpg"
+    monkeypatch.setattr(encoding, "COLLAGE_FORMAT", "webp")
+    assert encoding.output_path_for("gs://bucket/collage.jpg") == "gs://bucket/collage.webp"
+    assert encoding.content_type() == "image/webp"
+
+
+def test_replacing_a_requested_extension_is_logged(caplog):
+    with caplog.at_level("WARNING", logger=encoding.__name__):
+        assert encoding.output_path_for("out/collage") == "out/collage.jpg"
+        assert not caplog.records
+        assert encoding.output_path_for("out/collage.png") == "out/collage.jpg"
+    assert "out/collage.png is saved as out/collage.jpg" in caplog.text
+
+
+def test_encodes_progressive_jpeg_by_default(noisy_image):
+    data, info = encoding.encode(noisy_image)
+    decoded = Image.open(BytesIO(data))
+    assert decoded.format == "JPEG"
+    assert decoded.info.get("progressive") == 1
+    assert info == {"format": "jpeg", "quality": 90, "bytes": len(data), "attempts": 1}
+
+
+def test_encode_to_streams_the_same_bytes(noisy_image, memory_storage):
+    data, info = encoding.encode(noisy_image)
+    with storage.open_write("gs://bucket/collage.jpg") as f:
+        assert encoding.encode_to(noisy_image, f) == info
+    assert storage.read_bytes("gs://bucket/collage.jpg") == data
+
+
+def test_encode_to_refuses_a_target_size(monkeypatch, noisy_image):
+    monkeypatch.setattr(encoding, "COLLAGE_TARGET_BYTES", 1000)
+    with pytest.raises(ValueError):
+        encoding.encode_to(noisy_image, BytesIO())
+
+
+def test_encodes_webp(monkeypatch, noisy_image):
+    monkeypatch.setattr(encoding, "COLLAGE_FORMAT", "webp")
+    data, info = encoding.encode(noisy_image)
+    assert Image.open(BytesIO(data)).format == "WEBP"
+    assert info["format"] == "webp"
+
+
+def test_target_bytes_picks_the_highest_quality_that_fits(monkeypatch, noisy_image):
+    monkeypatch.setattr(encoding, "COLLAGE_MIN_QUALITY", 10)
+    full_size = len(encoding._save(noisy_image, 90))
+    target = len(encoding._save(noisy_image, 50))
+    monkeypatch.setattr(encoding, "COLLAGE_TARGET_BYTES", target)
+
+    data, info = encoding.encode(noisy_image)
+    assert len(data) <= target < full_size
+    assert 50 <= info["quality"] < 90
+    assert len(encoding._save(noisy_image, info["quality"] + 1)) > target
+    # A binary search over 10..89 takes at most 7 more encodes.
+    assert 2 <= info["attempts"] <= 8
+
+
+def test_the_search_keeps_at_most_two_candidates(monkeypatch, noisy_image):
+    alive = []
+    peak = []
+
+    class Candidate(bytes):
+        def __del__(self):
+            alive.pop()
+
+    real_save = encoding._save
+
+    def save(img, quality):
+        alive.append(quality)
+        peak.append(len(alive))
+        return Candidate(real_save(img, quality))
+
+    monkeypatch.setattr(encoding, "_save", save)
+    monkeypatch.setattr(encoding, "COLLAGE_MIN_QUALITY", 1)
+    monkeypatch.setattr(encoding, "COLLAGE_TARGET_BYTES", len(real_save(noisy_image, 45)))
+    data, info = encoding.encode(noisy_image)
+    assert info["attempts"] >= 5
+    # The candidate being encoded, the latest one and the best one that fits.
+    assert max(peak) <= 3
+    del data
+    assert alive == []
+
+
+def test_unreachable_target_falls_back_to_the_minimum_quality(monkeypatch, noisy_image):
+    monkeypatch.setattr(encoding, "COLLAGE_TARGET_BYTES", 100)
+    data, info = encoding.encode(noisy_image)
+    assert info["quality"] == 40
+    assert data == encoding._save(noisy_image, 40)
+
+
+def test_params_change_with_the_settings(monkeypatch):
+    before = encoding.params()
+    monkeypatch.setattr(encoding, "COLLAGE_QUALITY", 70)
+    assert encoding.params() == {**before, "quality": 70}
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from orchestrate.http_pool import A2AClientPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status = 503 if self.path == "/down" else 200
+        body = b"ok"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def pool():
+    pool = A2AClientPool(http2=False)
+    yield pool
+    asyncio.run(pool.aclose())
+
+
+def test_one_client_and_connection_serve_every_request_loop(server, pool):
+    async def get(path):
+        return await pool.run(pool.get_client().get(server + path))
+
+    # Every call comes from a new event loop, as with Agent Engine queries.
+    for _ in range(3):
+        assert asyncio.run(get("/")).status_code == 200
+    assert asyncio.run(get("/down")).status_code == 503
+
+    metrics = pool.metrics()
+    assert metrics["clients_opened"] == 1
+    assert metrics["connections_opened"] == 1
+    assert metrics["requests_total"] == 4
+    assert metrics["errors_total"] == 1
+    assert metrics["in_flight"] == 0
+
+
+def test_transport_errors_are_counted(pool):
+    async def get():
+        return await pool.run(pool.get_client().get("http://127.0.0.1:1/"))
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(get())
+    metrics = pool.metrics()
+    assert (metrics["requests_total"], metrics["errors_total"], metrics["in_flight"]) == (1, 1, 0)
+    assert metrics["connections_opened"] == 0
+
+
+def test_counters_are_consistent_across_threads(pool):
+    def count():
+        for _ in range(10000):
+            pool._count(requests_total=1, in_flight=1)
+            pool._count(in_flight=-1)
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics = pool.metrics()
+    assert (metrics["requests_total"], metrics["in_flight"]) == (40000, 0)
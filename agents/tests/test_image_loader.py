@@ -0,0 +1,79 @@
+import random
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from agent_common import storage
+from memory_agent import image_loader
+
+WORKERS = 2
+
+
+@pytest.fixture
+def photos(tmp_path):
+    """Twelve noisy JPEGs, which barely compress, as gs:// objects in a local folder."""
+    previous = storage.use_backend(storage.LocalDirBackend(str(tmp_path)))
+    uris, sizes = [], []
+    for i in range(12):
+        width, height = (640, 480) if i % 2 else (480, 640)
+        img = Image.frombytes("RGB", (width, height), random.Random(i).randbytes(width * height * 3))
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=95)
+        uri = f"gs://photos/{i}.jpg"
+        storage.write_bytes(uri, buffer.getvalue())
+        uris.append(uri)
+        sizes.append(len(buffer.getvalue()))
+    yield uris, sizes
+    storage.use_backend(previous)
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    monkeypatch.setattr(image_loader, "IMAGE_LOAD_WORKERS", WORKERS)
+    monkeypatch.setattr(image_loader, "_pool", None)
+    yield
+    image_loader._get_pool().shutdown()
+
+
+def test_tiles_follow_the_input_order(photos, small_pool):
+    uris, _ = photos
+    sources, stats = image_loader.load_sources(uris)
+    assert [source.size for source in sources] == [(480, 640), (640, 480)] * 6
+    assert stats["loaded"] == 12
+
+    tile_sizes = [(size[0] // 4, size[1] // 4) for size in (source.size for source in sources)]
+    tiles = dict(image_loader.iter_tiles(sources, tile_sizes, 2, stats))
+    assert sorted(tiles) == list(range(12))
+    assert tiles[0].size == (120 + 4, 160 + 4)
+    assert sources == [None] * 12
+    assert stats["download_ms"] > 0
+
+
+def test_missing_images_are_skipped(photos, small_pool):
+    uris, _ = photos
+    sources, stats = image_loader.load_sources([uris[0], "gs://photos/missing.jpg", uris[1]])
+    assert [source.path for source in sources] == [uris[0], uris[1]]
+    assert stats["failed"] == 1
+
+
+def test_only_the_images_being_decoded_are_held_in_memory(photos, small_pool):
+    uris, sizes = photos
+    largest = max(sizes)
+    assert sum(sizes) > 3 * (WORKERS + 1) * largest
+
+    tracemalloc.start()
+    try:
+        sources, stats = image_loader.load_sources(uris)
+        # Reading the headers does not download the images.
+        assert tracemalloc.get_traced_memory()[1] < largest
+        tracemalloc.reset_peak()
+
+        tile_sizes = [(size[0] // 4, size[1] // 4) for size in (source.size for source in sources)]
+        for _ in image_loader.iter_tiles(sources, tile_sizes, 2, stats):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < (WORKERS + 1) * largest
@@ -0,0 +1,90 @@
+import random
+from itertools import groupby
+
+from memory_agent.layout import Cell, grid, justified
+
+BORDER = 5
+SPACING = 10
+
+
+def rows_of(cells: list[Cell]) -> list[list[Cell]]:
+    return [list(row) for _, row in groupby(cells, key=lambda cell: cell.y)]
+
+
+def assert_no_overlap(cells: list[Cell], width: int, height: int) -> None:
+    boxes = [(c.x, c.y, c.x + c.width + 2 * BORDER, c.y + c.height + 2 * BORDER) for c in cells]
+    for left, top, right, bottom in boxes:
+        assert left >= SPACING and top >= SPACING
+        assert right <= width - SPACING and bottom <= height - SPACING
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1:]:
+            assert a[2] + SPACING <= b[0] or b[2] + SPACING <= a[0] or a[3] + SPACING <= b[1] or b[3] + SPACING <= a[1]
+
+
+def test_grid_places_tiles_in_a_near_square_grid():
+    layout = grid([(400, 300)] * 4, tile_width=200, border=BORDER, spacing=SPACING)
+    assert (layout.width, layout.height) == (2 * 210 + 3 * SPACING, 2 * 160 + 3 * SPACING)
+    assert layout.cells == [Cell(10, 10, 200, 150), Cell(230, 10, 200, 150), Cell(10, 180, 200, 150), Cell(230, 180, 200, 150)]
+    assert_no_overlap(layout.cells, layout.width, layout.height)
+
+
+def test_grid_centers_shorter_tiles_in_their_cell():
+    layout = grid([(400, 300), (300, 400)], tile_width=300, border=BORDER, spacing=SPACING)
+    landscape, portrait = layout.cells
+    assert (landscape.height, portrait.height) == (225, 400)
+    assert portrait.y == SPACING
+    assert landscape.y == SPACING + (410 - 235) // 2
+
+
+def test_justified_rows_fill_the_canvas_in_order():
+    sizes = [(4000, 3000), (3000, 4000), (4000, 3000), (6000, 2000), (3000, 3000), (3000, 4000), (4000, 3000)]
+    layout = justified(sizes, canvas_width=1200, row_height=240, border=BORDER, spacing=SPACING)
+    assert layout.width == 1200
+    assert len(layout.cells) == len(sizes)
+    rows = rows_of(layout.cells)
+    assert len(rows) > 1
+    # Row by row, left to right, the images keep their order.
+    assert [cell for row in rows for cell in row] == layout.cells
+    for row in rows[:-1]:
+        last = row[-1]
+        assert last.x + last.width + 2 * BORDER == 1200 - SPACING
+    assert_no_overlap(layout.cells, layout.width, layout.height)
+
+
+def test_justified_tiles_keep_their_aspect_ratio():
+    sizes = [(4000, 3000), (3000, 4000), (6000, 2000), (3000, 3000), (2000, 3000)]
+    layout = justified(sizes, canvas_width=1000, row_height=200, border=BORDER, spacing=SPACING)
+    for (w, h), cell in zip(sizes, layout.cells):
+        # The last tile of a row absorbs the rounding of the others.
+        assert abs(cell.width - cell.height * w / h) <= len(sizes)
+
+
+def test_justified_last_row_is_not_stretched():
+    layout = justified([(3000, 4000)], canvas_width=1200, row_height=240, border=BORDER, spacing=SPACING)
+    (cell,) = layout.cells
+    assert (cell.x, cell.y, cell.height) == (SPACING, SPACING, 240)
+    assert cell.width == 180
+    assert layout.height == SPACING + 240 + 2 * BORDER + SPACING
+
+
+def test_justified_rows_stay_near_the_target_height():
+    rng = random.Random(7)
+    sizes = [rng.choice([(4000, 3000), (3000, 4000), (3000, 3000), (6000, 2000)]) for _ in range(40)]
+    layout = justified(sizes, canvas_width=1600, row_height=200, border=BORDER, spacing=SPACING, max_row_scale=1.5)
+    rows = rows_of(layout.cells)
+    for row in rows:
+        assert row[0].height <= 300
+    assert rows[-1][0].height <= 200
+    assert_no_overlap(layout.cells, layout.width, layout.height)
+
+
+def test_justified_centers_rows_that_cannot_fill_the_width():
+    # The canvas is too narrow for two tiles in a row, and the portrait would have
+    # to be taller than max_row_scale allows to fill it alone.
+    sizes = [(1000, 4000), (1000, 1000)]
+    layout = justified(sizes, canvas_width=50, row_height=20, border=BORDER, spacing=SPACING, max_row_scale=1.2)
+    portrait, square = layout.cells
+    assert (portrait.width, portrait.height) == (6, 24)
+    assert portrait.x == (50 - (6 + 2 * BORDER)) // 2
+    assert (square.x, square.width, square.height) == (SPACING, 20, 20)
+    assert_no_overlap(layout.cells, layout.width, layout.height)
@@ -0,0 +1,69 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from agent_common.llm_replay import LlmRecorder, ReplayMissError
+
+
+def request(text: str) -> LlmRequest:
+    return LlmRequest(model="gemini", contents=[types.Content(role="user", parts=[types.Part(text=text)])])
+
+
+def response(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def context(invocation_id: str) -> SimpleNamespace:
+    return SimpleNamespace(agent_name="memory_agent", invocation_id=invocation_id)
+
+
+def record(directory: str) -> None:
+    recorder = LlmRecorder("record", directory)
+
+    async def invocation():
+        ctx = context("recorded")
+        for prompt, answer in ((f"collage {uuid.uuid4()}", "calling a tool"), ("tool result", "here it is")):
+            assert await recorder.before_model_callback(ctx, request(prompt)) is None
+            await recorder.after_model_callback(ctx, response(answer))
+
+    asyncio.run(invocation())
+    assert recorder.stats["recorded"] == 2
+
+
+def replay_texts(recorder: LlmRecorder, invocation_id: str, prompts: list[str]) -> list[str]:
+    async def invocation():
+        ctx = context(invocation_id)
+        return [(await recorder.before_model_callback(ctx, request(p))).content.parts[0].text for p in prompts]
+
+    return asyncio.run(invocation())
+
+
+def test_a_recording_replays_in_every_invocation(tmp_path):
+    record(str(tmp_path))
+    recorder = LlmRecorder("replay", str(tmp_path))
+    for i in range(3):
+        # The ids in the prompt differ between runs and are masked out.
+        prompts = [f"collage {uuid.uuid4()}", "tool result"]
+        assert replay_texts(recorder, f"replay-{i}", prompts) == ["calling a tool", "here it is"]
+    assert recorder.stats["digest_hits"] == 6
+    assert recorder.stats["sequence_fallbacks"] == 0
+
+    # A second process replays the same recording.
+    assert replay_texts(LlmRecorder("replay", str(tmp_path)), "other", ["tool result"]) == ["here it is"]
+
+
+def test_changed_prompts_fall_back_to_the_turn_position(tmp_path):
+    record(str(tmp_path))
+    recorder = LlmRecorder("replay", str(tmp_path))
+    for i in range(2):
+        assert replay_texts(recorder, f"changed-{i}", ["a reworded prompt", "another"]) == ["calling a tool", "here it is"]
+    assert recorder.stats["sequence_fallbacks"] == 4
+
+    with pytest.raises(ReplayMissError):
+        replay_texts(recorder, "too-long", ["one", "two", "three"])
+    assert recorder.stats["misses"] == 1
@@ -0,0 +1,108 @@
+import asyncio
+
+from a2a.server.agent_execution import AgentExecutor
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore, TaskUpdater
+from a2a.types import (
+    AgentCapabilities,
+    AgentCard,
+    InvalidParamsError,
+    JSONRPCErrorResponse,
+    MessageSendParams,
+    Part,
+    SendMessageRequest,
+    SendStreamingMessageRequest,
+    Task,
+    TaskState,
+    TextPart,
+)
+from a2a.utils import new_task
+from a2a.utils.errors import ServerError
+
+from orchestrate.agent import create_send_message_payload
+from orchestrate.agent_loop import AgentLoop
+from orchestrate.local_agent_connection import LocalAgentConnection
+
+
+class EchoExecutor(AgentExecutor):
+    """Completes every task with the user's text as its artifact."""
+
+    def __init__(self):
+        self.loops = set()
+
+    async def execute(self, context, event_queue):
+        self.loops.add(asyncio.get_running_loop())
+        if context.message.parts[0].root.text == "fail":
+            raise ServerError(error=InvalidParamsError(message="cannot do that"))
+        task = context.current_task or new_task(context.message)
+        await event_queue.enqueue_event(task)
+        updater = TaskUpdater(event_queue, task.id, task.contextId)
+        await updater.start_work()
+        await updater.add_artifact([Part(root=TextPart(text=context.get_user_input()))])
+        await updater.complete()
+
+    async def cancel(self, context, event_queue):
+        raise NotImplementedError
+
+
+def make_connection() -> tuple[LocalAgentConnection, EchoExecutor]:
+    card = AgentCard(
+        name="Echo Agent",
+        description="Echoes",
+        url="http://local",
+        version="1",
+        capabilities=AgentCapabilities(streaming=True),
+        defaultInputModes=["text"],
+        defaultOutputModes=["text"],
+        skills=[],
+    )
+    executor = EchoExecutor()
+    handler = DefaultRequestHandler(agent_executor=executor, task_store=InMemoryTaskStore())
+    return LocalAgentConnection(card, handler, AgentLoop(name="test-agents-loop")), executor
+
+
+def params(text: str) -> MessageSendParams:
+    return MessageSendParams.model_validate(create_send_message_payload(text))
+
+
+def test_send_message_runs_on_the_agent_loop_across_request_loops():
+    connection, executor = make_connection()
+    for text in ("first", "second"):
+        # Every call comes from a new event loop, as with Agent Engine queries.
+        response = asyncio.run(connection.send_message(SendMessageRequest(id=text, params=params(text))))
+        task = response.root.result
+        assert isinstance(task, Task)
+        assert task.status.state == TaskState.completed
+        assert task.artifacts[0].parts[0].root.text == text
+    assert executor.loops == {connection._loop.loop}
+
+
+def test_send_message_streaming_yields_every_event():
+    connection, _ = make_connection()
+
+    async def collect():
+        request = SendStreamingMessageRequest(id="stream", params=params("streamed"))
+        return [response.root async for response in connection.send_message_streaming(request)]
+
+    responses = asyncio.run(collect())
+    assert all(response.id == "stream" for response in responses)
+    events = [response.result for response in responses]
+    assert isinstance(events[0], Task)
+    assert events[-1].status.state == TaskState.completed
+    assert any(getattr(event, "artifact", None) is not None for event in events)
+
+
+def test_server_errors_become_json_rpc_errors():
+    connection, _ = make_connection()
+    response = asyncio.run(connection.send_message(SendMessageRequest(id="bad", params=params("fail"))))
+    assert isinstance(response.root, JSONRPCErrorResponse)
+    assert response.root.id == "bad"
+    assert response.root.error.message == "cannot do that"
+
+    async def collect():
+        request = SendStreamingMessageRequest(id="bad-stream", params=params("fail"))
+        return [response.root async for response in connection.send_message_streaming(request)]
+
+    (error,) = asyncio.run(collect())
+    assert isinstance(error, JSONRPCErrorResponse)
+    assert error.id == "bad-stream"
@@ -0,0 +1,164 @@
+import asyncio
+from types import SimpleNamespace
+
+from a2a.types import (
+    AgentCapabilities,
+    AgentCard,
+    SendMessageResponse,
+    SendMessageSuccessResponse,
+    Task,
+    TaskState,
+    TaskStatus,
+)
+from opentelemetry import trace
+from opentelemetry.trace import NonRecordingSpan, SpanContext, TraceFlags
+
+from agent_common import tracing
+from orchestrate import agent
+from orchestrate.agent import HostAgent
+from orchestrate.agent_card_cache import AgentCardCache
+from orchestrate.result_cache import ResultCache
+
+
+class FakeConnection:
+    """Answers every message with a completed task and keeps the requests."""
+
+    def __init__(self, name: str):
+        self.card = SimpleNamespace(name=name, capabilities=SimpleNamespace(streaming=False))
+        self.requests = []
+
+    async def send_message(self, message_request):
+        self.requests.append(message_request)
+        message = message_request.params.message
+        await asyncio.sleep(0.01)
+        task = Task(id=message.taskId, contextId=message.contextId, status=TaskStatus(state=TaskState.completed))
+        return SendMessageResponse(root=SendMessageSuccessResponse(id=message_request.id, result=task))
+
+
+def make_host(*names: str) -> HostAgent:
+    host = HostAgent()
+    host.result_cache = ResultCache()
+    host.remote_agent_connections = {name: FakeConnection(name) for name in names}
+    return host
+
+
+def test_fan_out_to_one_agent_uses_distinct_ids():
+    host = make_host("Memory Agent", "Social Agent")
+    state = {"task_id": "conversation-task", "context_id": "conversation", "input_message_metadata": {"message_id": "m1"}}
+    delegations = [
+        {"agent_name": "Memory Agent", "task": "collage of the beach"},
+        {"agent_name": "Memory Agent", "task": "collage of the mountains"},
+        {"agent_name": "Social Agent", "task": "who was there"},
+    ]
+    result = asyncio.run(host.send_messages(delegations, SimpleNamespace(state=state)))
+    assert [entry["status"] for entry in result["results"]] == ["success"] * 3
+
+    requests = [r for name in ("Memory Agent", "Social Agent") for r in host.remote_agent_connections[name].requests]
+    messages = [r.params.message for r in requests]
+    assert len({r.id for r in requests}) == 3
+    assert len({m.messageId for m in messages}) == 3
+    assert len({m.taskId for m in messages}) == 3
+    assert len({m.contextId for m in messages}) == 3
+    assert "conversation-task" not in {m.taskId for m in messages}
+    assert "m1" not in {m.messageId for m in messages}
+    # Each request's JSON-RPC id is its message id.
+    assert all(r.id == r.params.message.messageId for r in requests)
+
+
+def test_single_delegation_continues_the_conversation():
+    host = make_host("Memory Agent")
+    state = {"task_id": "conversation-task", "context_id": "conversation"}
+    context = SimpleNamespace(state=state)
+    asyncio.run(host.send_message("Memory Agent", "collage", context))
+    asyncio.run(host.send_message("Memory Agent", "another collage", context))
+    first, second = (r.params.message for r in host.remote_agent_connections["Memory Agent"].requests)
+    assert (first.taskId, first.contextId) == ("conversation-task", "conversation")
+    assert first.messageId != second.messageId
+    assert state["active_agent"] == "Memory Agent"
+
+
+def test_fan_out_reports_failures_per_delegation():
+    host = make_host("Memory Agent")
+
+    async def fail(message_request):
+        raise RuntimeError("agent is down")
+
+    host.remote_agent_connections["Memory Agent"].send_message = fail
+    result = asyncio.run(host.send_messages(
+        [{"agent_name": "Memory Agent", "task": "a"}, {"agent_name": "Memory Agent", "task": "b"}],
+        SimpleNamespace(state={}),
+    ))
+    assert [entry["status"] for entry in result["results"]] == ["error", "error"]
+    assert result["results"][0]["error"] == "RuntimeError: agent is down"
+
+
+def test_delegations_carry_the_trace_context():
+    host = make_host("Memory Agent")
+    span = NonRecordingSpan(SpanContext(trace_id=0xABC, span_id=0xDEF, is_remote=False, trace_flags=TraceFlags(1)))
+    with trace.use_span(span):
+        asyncio.run(host.send_message("Memory Agent", "collage", SimpleNamespace(state={})))
+    (request,) = host.remote_agent_connections["Memory Agent"].requests
+    carrier = request.params.message.metadata[tracing.TRACE_METADATA_KEY]
+    assert carrier["traceparent"].split("-")[1] == f"{0xABC:032x}"
+
+
+def make_card(description: str) -> AgentCard:
+    return AgentCard(
+        name="Memory Agent",
+        description=description,
+        url="http://memory",
+        version="1",
+        capabilities=AgentCapabilities(),
+        defaultInputModes=["text"],
+        defaultOutputModes=["text"],
+        skills=[],
+    )
+
+
+def test_stale_cards_are_refreshed_in_the_background(monkeypatch, tmp_path):
+    monkeypatch.setattr(agent, "AGENT_MODE", "remote")
+    monkeypatch.setattr(agent, "REMOTE_AGENT_ADDRESSES", ["http://memory"])
+    monkeypatch.setattr(agent, "CARD_REFRESH_INTERVAL", 60)
+
+    class FakePool:
+        def get_client(self):
+            return None
+
+        async def run(self, coro):
+            return await coro
+
+        def metrics(self):
+            return {}
+
+    monkeypatch.setattr(agent, "a2a_client_pool", FakePool())
+    cache = AgentCardCache(str(tmp_path / "cards.json"))
+    cache.save({"http://memory": make_card("cached")})
+    resolved = []
+
+    async def resolve_card(client, address):
+        resolved.append(address)
+        return make_card(f"resolved {len(resolved)}")
+
+    host = HostAgent()
+    host.card_cache = cache
+    monkeypatch.setattr(host, "_resolve_card", resolve_card)
+
+    async def scenario():
+        # The cached card serves the first request while a refresh starts.
+        await host._initialize()
+        assert host.cards["Memory Agent"].description == "cached"
+        await host._refresh_task
+        assert host.cards["Memory Agent"].description == "resolved 1"
+
+        # Fresh cards are left alone until CARD_REFRESH_INTERVAL has passed.
+        host._refresh_if_stale()
+        assert host._refresh_task.done()
+        host._cards_resolved_at -= 61
+        host._refresh_if_stale()
+        await host._refresh_task
+
+    asyncio.run(scenario())
+    assert resolved == ["http://memory", "http://memory"]
+    assert host.cards["Memory Agent"].description == "resolved 2"
+    assert host.remote_agent_connections["Memory Agent"].card.description == "resolved 2"
+    assert cache.load()["http://memory"].description == "resolved 2"
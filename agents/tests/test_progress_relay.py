@@ -0,0 +1,71 @@
+import asyncio
+import random
+
+from orchestrate import progress_relay
+from orchestrate.progress_relay import ProgressRelay
+
+
+def enable(monkeypatch):
+    monkeypatch.setattr(progress_relay, "PROGRESS_RELAY_URL", "http://app/api/chatbot/progress")
+    monkeypatch.setattr(progress_relay, "PROGRESS_RELAY_SECRET", "secret")
+
+
+def test_events_are_posted_in_order(monkeypatch):
+    enable(monkeypatch)
+    posted = []
+    rng = random.Random(5)
+
+    async def post(self, progress):
+        # Later events would overtake earlier ones if they were sent concurrently.
+        await asyncio.sleep(rng.uniform(0, 0.01))
+        posted.append(progress["text"])
+
+    monkeypatch.setattr(ProgressRelay, "_post", post)
+
+    async def scenario():
+        relay = ProgressRelay("channel")
+        for i in range(20):
+            relay.publish({"text": str(i)})
+            if i % 5 == 0:
+                await asyncio.sleep(0)
+        relay.publish(None)
+        await relay.flush()
+        return relay
+
+    relay = asyncio.run(scenario())
+    assert posted == [str(i) for i in range(20)]
+    assert relay._sender is None
+
+
+def test_relay_needs_a_url_a_secret_and_a_channel(monkeypatch):
+    enable(monkeypatch)
+    assert ProgressRelay("channel").enabled
+    assert not ProgressRelay(None).enabled
+    monkeypatch.setattr(progress_relay, "PROGRESS_RELAY_SECRET", "")
+    assert not ProgressRelay("channel").enabled
+
+
+def test_posts_carry_the_secret(monkeypatch):
+    enable(monkeypatch)
+    sent = []
+
+    class FakeClient:
+        async def post(self, url, json, headers, timeout):
+            sent.append((url, json, headers))
+
+    class FakePool:
+        def get_client(self):
+            return FakeClient()
+
+        async def run(self, coro):
+            return await coro
+
+    monkeypatch.setattr(progress_relay, "a2a_client_pool", FakePool())
+
+    async def scenario():
+        relay = ProgressRelay("channel")
+        relay.publish({"text": "working"})
+        await relay.flush()
+
+    asyncio.run(scenario())
+    assert sent == [("http://app/api/chatbot/progress/channel", {"text": "working"}, {progress_relay.SECRET_HEADER: "secret"})]
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.adk.events import Event
+from google.adk.sessions.database_session_service import StorageEvent, StorageSession
+from google.genai import types
+from sqlalchemy import func, select, update
+
+from agent_common.session_store import PrunedDatabaseSessionService
+
+APP = "app"
+USER = "user"
+
+
+def make_service(tmp_path, **kwargs) -> PrunedDatabaseSessionService:
+    kwargs.setdefault("prune_interval", 3600)
+    return PrunedDatabaseSessionService(f"sqlite:///{tmp_path / 'sessions.db'}", **kwargs)
+
+
+def create(service, session_id: str):
+    return asyncio.run(service.create_session(app_name=APP, user_id=USER, session_id=session_id))
+
+
+def get(service, session_id: str):
+    return asyncio.run(service.get_session(app_name=APP, user_id=USER, session_id=session_id))
+
+
+def age(service, session_id: str, seconds: float) -> None:
+    """Makes a session look last updated `seconds` ago (SQLite stores update times in UTC)."""
+    updated = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=seconds)
+    with service.database_session_factory() as db:
+        db.execute(update(StorageSession).where(StorageSession.id == session_id).values(update_time=updated))
+        db.commit()
+
+
+def event_count(service) -> int:
+    with service.database_session_factory() as db:
+        return db.scalar(select(func.count()).select_from(StorageEvent))
+
+
+def test_prune_keeps_the_most_recently_updated_sessions(tmp_path):
+    service = make_service(tmp_path, max_sessions=2)
+    for session_id, seconds in (("a", 30), ("b", 20), ("c", 10)):
+        create(service, session_id)
+        age(service, session_id, seconds)
+    service.prune()
+    assert get(service, "a") is None
+    assert get(service, "b") is not None
+    assert get(service, "c") is not None
+    metrics = service.metrics()
+    assert (metrics["sessions"], metrics["evicted"], metrics["expired"]) == (2, 1, 0)
+
+
+def test_prune_deletes_idle_sessions_and_their_events(tmp_path):
+    service = make_service(tmp_path, idle_ttl=60)
+    session = create(service, "idle")
+    event = Event(author="user", invocation_id="inv", content=types.Content(role="user", parts=[types.Part(text="hi")]))
+    asyncio.run(service.append_event(session, event))
+    create(service, "fresh")
+    assert event_count(service) == 1
+    age(service, "idle", 120)
+    service.prune()
+    assert get(service, "idle") is None
+    assert get(service, "fresh") is not None
+    assert event_count(service) == 0
+    assert service.metrics()["expired"] == 1
+
+
+def test_sessions_in_use_are_not_pruned(tmp_path):
+    service = make_service(tmp_path, idle_ttl=60)
+    create(service, "running")
+    age(service, "running", 120)
+    with service.in_use(app_name=APP, user_id=USER, session_id="running"):
+        service.prune()
+        assert get(service, "running") is not None
+        assert service.metrics()["active_sessions"] == 1
+    service.prune()
+    assert get(service, "running") is None
+
+
+def test_create_session_prunes_but_keeps_the_new_session(tmp_path):
+    service = make_service(tmp_path, max_sessions=1, prune_interval=0)
+    create(service, "old")
+    age(service, "old", 10)
+    create(service, "new")
+    assert get(service, "old") is None
+    assert get(service, "new") is not None
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("SESSION_MAX_COUNT", "5")
+    monkeypatch.setenv("SESSION_IDLE_TTL", "7")
+    monkeypatch.setenv("SESSION_PRUNE_INTERVAL", "9")
+    service = PrunedDatabaseSessionService.from_env(f"sqlite:///{tmp_path / 'sessions.db'}")
+    assert (service.max_sessions, service.idle_ttl, service.prune_interval) == (5, 7.0, 9.0)
+
+
+def test_create_session_prunes_off_the_event_loop(tmp_path):
+    service = make_service(tmp_path, prune_interval=0)
+    threads = []
+    prune = service._prune
+
+    def record(protected):
+        threads.append(threading.current_thread())
+        prune(protected)
+
+    service._prune = record
+    create(service, "a")
+    assert threads and threads[0] is not threading.main_thread()
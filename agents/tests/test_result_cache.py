@@ -0,0 +1,114 @@
+import threading
+
+from a2a.types import Task, TaskState, TaskStatus
+
+from orchestrate import result_cache
+from orchestrate.result_cache import ResultCache, normalize_task, parse_ttls
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def make_task(task_id: str = "t1") -> Task:
+    return Task(id=task_id, contextId="c1", status=TaskStatus(state=TaskState.completed))
+
+
+def test_parse_ttls_skips_malformed_entries():
+    assert parse_ttls("Social Profile Agent=300, Memory Agent = 60,,broken,Other=abc,=5") == {
+        "Social Profile Agent": 300.0,
+        "Memory Agent": 60.0,
+    }
+
+
+def test_normalize_task_collapses_whitespace_and_case():
+    assert normalize_task("  Find  PHOTOS\nof Alice ") == "find photos of alice"
+
+
+def test_agents_without_a_ttl_are_not_cached():
+    cache = ResultCache({"Cached": 60, "Zero": 0})
+    cache.put("Uncached", "task", make_task())
+    cache.put("Zero", "task", make_task())
+    assert cache.get("Uncached", "task") is None
+    assert cache.get("Zero", "task") is None
+    assert cache.metrics()["size"] == 0
+    assert cache.metrics()["agents"] == {}
+
+
+def test_hit_returns_a_copy_for_equivalent_tasks():
+    cache = ResultCache({"Agent": 60})
+    cache.put("Agent", "Find photos", make_task())
+    hit = cache.get("Agent", "find   photos")
+    assert hit == make_task()
+    hit.id = "changed"
+    assert cache.get("Agent", "Find photos").id == "t1"
+    assert cache.metrics()["agents"]["Agent"]["hits"] == 2
+
+
+def test_bypass_skips_the_cache():
+    cache = ResultCache({"Agent": 60})
+    cache.put("Agent", "task", make_task())
+    assert cache.get("Agent", "task", bypass=True) is None
+    stats = cache.metrics()["agents"]["Agent"]
+    assert stats["bypasses"] == 1
+    assert stats["hits"] == 0
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache, "time", clock)
+    cache = ResultCache({"Agent": 60})
+    cache.put("Agent", "task", make_task())
+    clock.now += 59
+    assert cache.get("Agent", "task") is not None
+    clock.now += 2
+    assert cache.get("Agent", "task") is None
+    stats = cache.metrics()["agents"]["Agent"]
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+    assert cache.metrics()["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache({"A": 60, "B": 60}, max_entries=2)
+    cache.put("A", "one", make_task("1"))
+    cache.put("B", "two", make_task("2"))
+    cache.get("A", "one")
+    cache.put("B", "three", make_task("3"))
+    assert cache.get("A", "one") is not None
+    assert cache.get("B", "two") is None
+    assert cache.get("B", "three") is not None
+    metrics = cache.metrics()
+    assert metrics["size"] == 2
+    assert metrics["agents"]["B"]["evictions"] == 1
+    assert metrics["agents"]["A"]["evictions"] == 0
+
+
+def test_metrics_report_hit_rates():
+    cache = ResultCache({"Agent": 60})
+    cache.get("Agent", "task")
+    cache.put("Agent", "task", make_task())
+    cache.get("Agent", "task")
+    cache.get("Agent", "task")
+    cache.get("Agent", "other")
+    assert cache.metrics()["agents"]["Agent"]["hit_rate"] == 0.5
+
+
+def test_counters_from_many_threads_add_up():
+    cache = ResultCache({"Agent": 60})
+    cache.put("Agent", "task", make_task())
+
+    def lookups():
+        for i in range(500):
+            cache.get("Agent", "task", bypass=i % 2 == 0)
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.metrics()["agents"]["Agent"]
+    assert (stats["bypasses"], stats["hits"]) == (2000, 2000)
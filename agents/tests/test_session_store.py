@@ -0,0 +1,126 @@
+import asyncio
+
+from google.adk.events import Event
+from google.genai import types
+
+from agent_common import session_store
+from agent_common.session_store import BoundedSessionService
+
+APP = "app"
+USER = "user"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+def create(service, session_id: str):
+    return asyncio.run(service.create_session(app_name=APP, user_id=USER, session_id=session_id))
+
+
+def get(service, session_id: str):
+    return asyncio.run(service.get_session(app_name=APP, user_id=USER, session_id=session_id))
+
+
+def append(service, session, text: str):
+    event = Event(author="user", invocation_id="inv", content=types.Content(role="user", parts=[types.Part(text=text)]))
+    return asyncio.run(service.append_event(session, event))
+
+
+def test_least_recently_used_sessions_are_evicted():
+    service = BoundedSessionService(max_sessions=2)
+    create(service, "a")
+    create(service, "b")
+    get(service, "a")
+    create(service, "c")
+    assert get(service, "b") is None
+    assert get(service, "a") is not None
+    assert get(service, "c") is not None
+    assert service.metrics()["evicted"] == 1
+
+
+def test_idle_sessions_expire(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store, "time", clock)
+    service = BoundedSessionService(idle_ttl=60)
+    create(service, "old")
+    clock.now += 30
+    create(service, "new")
+    clock.now += 45
+    assert get(service, "old") is None
+    assert get(service, "new") is not None
+    assert service.metrics()["expired"] == 1
+
+
+def test_sessions_in_use_are_never_evicted(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store, "time", clock)
+    service = BoundedSessionService(max_sessions=1, idle_ttl=60)
+    session = create(service, "running")
+    with service.in_use(app_name=APP, user_id=USER, session_id="running"):
+        clock.now += 120
+        create(service, "other")
+        create(service, "third")
+        append(service, session, "still here")
+        assert service.metrics()["active_sessions"] == 1
+        assert len(get(service, "running").events) == 1
+    # Once the run ends the limit applies again.
+    metrics = service.metrics()
+    assert metrics["active_sessions"] == 0
+    assert metrics["sessions"] == 1
+
+
+def test_nested_in_use_keeps_the_session_until_the_last_run_ends():
+    service = BoundedSessionService(max_sessions=1)
+    create(service, "running")
+    with service.in_use(app_name=APP, user_id=USER, session_id="running"):
+        with service.in_use(app_name=APP, user_id=USER, session_id="running"):
+            pass
+        create(service, "other")
+        assert service.metrics()["sessions"] == 2
+    assert service.metrics()["sessions"] == 1
+    assert get(service, "running") is None
+    assert get(service, "other") is not None
+
+
+def test_byte_limit_evicts_large_sessions():
+    service = BoundedSessionService(max_sessions=100, max_bytes=2000)
+    first = create(service, "a")
+    append(service, first, "x" * 1500)
+    second = create(service, "b")
+    append(service, second, "y" * 500)
+    assert service.metrics()["approx_bytes"] <= 2000
+    assert get(service, "a") is None
+    assert get(service, "b") is not None
+
+
+def test_evicted_sessions_are_spilled_and_restored(tmp_path):
+    service = BoundedSessionService(max_sessions=1, spill_path=str(tmp_path / "sessions.db"))
+    first = create(service, "a")
+    append(service, first, "remember me")
+    create(service, "b")
+    assert service.metrics()["spilled_sessions"] == 1
+    listed = asyncio.run(service.list_sessions(app_name=APP, user_id=USER))
+    assert sorted(session.id for session in listed.sessions) == ["a", "b"]
+
+    restored = get(service, "a")
+    assert restored.events[0].content.parts[0].text == "remember me"
+    metrics = service.metrics()
+    assert (metrics["restored"], metrics["spilled"]) == (1, 2)
+    assert get(service, "b") is not None
+
+
+def test_deleted_sessions_are_removed_from_the_spill_file(tmp_path):
+    service = BoundedSessionService(max_sessions=1, spill_path=str(tmp_path / "sessions.db"))
+    create(service, "a")
+    create(service, "b")
+    asyncio.run(service.delete_session(app_name=APP, user_id=USER, session_id="a"))
+    assert get(service, "a") is None
+    assert service.metrics()["spilled_sessions"] == 0
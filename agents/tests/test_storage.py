@@ -0,0 +1,117 @@
+import pytest
+from google.api_core import exceptions
+
+from agent_common import storage
+
+
+@pytest.fixture(params=["memory", "local"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        new_backend = storage.MemoryBackend()
+    else:
+        new_backend = storage.LocalDirBackend(str(tmp_path / "storage"))
+    previous = storage.use_backend(new_backend)
+    yield new_backend
+    storage.use_backend(previous)
+
+
+def test_split_uri():
+    assert storage.split_uri("gs://bucket/a/b.jpg") == ("bucket", "a/b.jpg")
+    for uri in ("gs://bucket", "/tmp/a.jpg"):
+        with pytest.raises(ValueError):
+            storage.split_uri(uri)
+
+
+def test_write_read_stat_and_delete(backend):
+    uri = "gs://bucket/photos/a.jpg"
+    assert not storage.exists(uri)
+    storage.write_bytes(uri, b"photo", content_type="image/jpeg")
+    assert storage.exists(uri)
+    assert storage.read_bytes(uri) == b"photo"
+    info = storage.stat(uri)
+    assert (info.size, info.content_type) == (5, "image/jpeg")
+    assert storage.read_bytes(uri, generation=info.generation) == b"photo"
+
+    storage.delete(uri)
+    assert not storage.exists(uri)
+    with pytest.raises(exceptions.NotFound):
+        storage.read_bytes(uri)
+    with pytest.raises(exceptions.NotFound):
+        storage.stat(uri)
+    storage.delete(uri)
+    with pytest.raises(exceptions.NotFound):
+        storage.delete(uri, missing_ok=False)
+
+
+def test_create_only_if_missing(backend):
+    uri = "gs://bucket/index/key"
+    storage.write_bytes(uri, b"first", if_generation_match=0)
+    with pytest.raises(exceptions.PreconditionFailed):
+        storage.write_bytes(uri, b"second", if_generation_match=0)
+    assert storage.read_text(uri) == "first"
+
+
+def test_streaming_and_upload(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_CHUNK_SIZE", 4)
+    with storage.open_write("gs://bucket/streamed.bin") as f:
+        f.write(b"0123")
+        f.write(b"4567")
+    with storage.open_read("gs://bucket/streamed.bin") as f:
+        assert f.read(4) == b"0123"
+        assert f.read() == b"4567"
+
+    source = tmp_path / "source.txt"
+    source.write_bytes(b"uploaded in chunks")
+    storage.upload_file("gs://bucket/uploaded.txt", str(source))
+    assert storage.read_bytes("gs://bucket/uploaded.txt") == b"uploaded in chunks"
+
+
+def test_signed_url(backend):
+    storage.write_bytes("gs://bucket/a.jpg", b"photo")
+    assert storage.signed_url("gs://bucket/a.jpg").startswith(("memory://", "file://"))
+
+
+def test_reads_of_a_replaced_generation_fail(memory_storage):
+    # Local generations are mtimes, which two quick writes may share, so this uses the memory backend.
+    uri = "gs://bucket/a.jpg"
+    storage.write_bytes(uri, b"old")
+    generation = storage.stat(uri).generation
+    storage.write_bytes(uri, b"new")
+    with pytest.raises(exceptions.NotFound):
+        storage.read_bytes(uri, generation=generation)
+    with pytest.raises(exceptions.PreconditionFailed):
+        storage.write_bytes(uri, b"newer", if_generation_match=generation)
+
+
+def test_local_backend_keeps_objects_under_their_bucket(tmp_path):
+    backend = storage.LocalDirBackend(str(tmp_path))
+    backend.write("bucket", "a/b.txt", b"data", None, None, None)
+    assert (tmp_path / "bucket" / "a" / "b.txt").read_bytes() == b"data"
+    with pytest.raises(ValueError):
+        backend.write("bucket", "../other/c.txt", b"data", None, None, None)
+
+
+def test_local_paths_are_plain_files(tmp_path):
+    path = str(tmp_path / "out" / "collage.jpg")
+    storage.write_bytes(path, b"collage")
+    assert storage.read_bytes(path) == b"collage"
+    assert storage.stat(path).content_type == "image/jpeg"
+    storage.delete(path)
+    assert not storage.exists(path)
+
+
+def test_metrics_count_operations(backend):
+    before = storage.metrics()["operations"].get("write", {"count": 0, "bytes": 0})
+    storage.write_bytes("gs://bucket/a.jpg", b"12345")
+    after = storage.metrics()
+    assert after["backend"] == backend.name
+    assert after["operations"]["write"]["count"] == before["count"] + 1
+    assert after["operations"]["write"]["bytes"] == before["bytes"] + 5
+
+
+def test_retries_are_logged_and_counted(memory_storage, caplog):
+    before = storage.metrics()["retries"]
+    with caplog.at_level("WARNING", logger=storage.__name__):
+        storage._count_retry(ConnectionError("reset"))
+    assert storage.metrics()["retries"] == before + 1
+    assert "Retrying storage request after: reset" in caplog.text
@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+import time
+
+from a2a.types import Task, TaskState, TaskStatus
+
+from agent_common import task_store
+from agent_common.task_store import SqliteTaskStore
+
+
+def make_task(state: TaskState = TaskState.working) -> Task:
+    return Task(id="t1", contextId="c1", status=TaskStatus(state=state))
+
+
+def test_tasks_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    writer, reader = SqliteTaskStore(path), SqliteTaskStore(path)
+    asyncio.run(writer.save(make_task()))
+    assert asyncio.run(reader.get("t1")) == make_task()
+
+    asyncio.run(writer.save(make_task(TaskState.completed)))
+    assert asyncio.run(reader.get("t1")).status.state == TaskState.completed
+
+    asyncio.run(reader.delete("t1"))
+    assert asyncio.run(writer.get("t1")) is None
+
+
+def test_missing_tasks(tmp_path):
+    store = SqliteTaskStore(str(tmp_path / "tasks.db"))
+    assert asyncio.run(store.get("missing")) is None
+    asyncio.run(store.delete("missing"))
+
+
+def test_finished_tasks_expire(tmp_path, monkeypatch):
+    store = SqliteTaskStore(str(tmp_path / "tasks.db"), ttl=60, prune_interval=3600)
+    asyncio.run(store.save(make_task(TaskState.completed)))
+    asyncio.run(store.save(Task(id="t2", contextId="c1", status=TaskStatus(state=TaskState.working))))
+    assert store.prune() == 0
+
+    now = time.time()
+    monkeypatch.setattr(task_store.time, "time", lambda: now + 120)
+    assert store.prune() == 1
+    assert asyncio.run(store.get("t1")) is None
+    # Running tasks are kept however old they are.
+    assert asyncio.run(store.get("t2")) is not None
+
+
+def test_save_prunes_at_most_once_per_interval(tmp_path, monkeypatch):
+    store = SqliteTaskStore(str(tmp_path / "tasks.db"), ttl=60, prune_interval=3600)
+    now = time.time()
+    asyncio.run(store.save(make_task(TaskState.completed)))
+    monkeypatch.setattr(task_store.time, "time", lambda: now + 120)
+    # The first save pruned already, so this one does not.
+    asyncio.run(store.save(Task(id="t2", contextId="c1", status=TaskStatus(state=TaskState.working))))
+    assert asyncio.run(store.get("t1")) is not None
+    store.prune_interval = 0
+    asyncio.run(store.save(Task(id="t3", contextId="c1", status=TaskStatus(state=TaskState.working))))
+    assert asyncio.run(store.get("t1")) is None
+    assert asyncio.run(store.get("t2")) is not None
+
+
+def test_files_without_update_times_are_migrated(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE tasks (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    db.execute("INSERT INTO tasks VALUES (?, ?)", ("t1", make_task(TaskState.completed).model_dump_json(exclude_none=True)))
+    db.commit()
+    db.close()
+    store = SqliteTaskStore(path, ttl=60)
+    assert asyncio.run(store.get("t1")) is not None
+    assert store.prune() == 1
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("TASK_TTL", "7")
+    monkeypatch.setenv("TASK_PRUNE_INTERVAL", "9")
+    store = SqliteTaskStore.from_env(str(tmp_path / "tasks.db"))
+    assert (store.ttl, store.prune_interval) == (7.0, 9.0)
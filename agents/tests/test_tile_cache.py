@@ -0,0 +1,50 @@
+import os
+import time
+
+from PIL import Image
+
+from memory_agent import tile_cache
+from memory_agent.tile_cache import TileCache
+
+
+def tile(shade: int) -> Image.Image:
+    return Image.new("RGB", (10, 10), (shade, shade, shade))
+
+
+TILE_BYTES = tile_cache._HEADER.size + 10 * 10 * 3
+
+
+def test_tiles_round_trip(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=10 * TILE_BYTES)
+    key = tile_cache.make_key("gs://photos/a.jpg#1", (400, 450))
+    assert cache.get(key) is None
+    cache.put(key, tile(7), (4000, 3000))
+    image, original_size = cache.get(key)
+    assert (image.size, image.getpixel((0, 0)), original_size) == ((10, 10), (7, 7, 7), (4000, 3000))
+    assert cache.counters() == {"hits": 1, "misses": 1, "writes": 1, "evictions": 0}
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=2 * TILE_BYTES)
+    for i, key in enumerate(("a", "b")):
+        cache.put(key, tile(i), (10, 10))
+        os.utime(cache._path(key), (i, i))
+    cache.put("c", tile(2), (10, 10))
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+    assert cache.counters()["evictions"] == 1
+
+
+def test_stale_temporary_files_are_removed(tmp_path):
+    stale = tmp_path / "crashed.tmp"
+    fresh = tmp_path / "writing.tmp"
+    stale.write_bytes(b"partial tile")
+    fresh.write_bytes(b"partial tile")
+    old = time.time() - tile_cache._STALE_TMP_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    TileCache(str(tmp_path), max_bytes=TILE_BYTES)
+    assert not stale.exists()
+    # Another process may still be writing this one.
+    assert fresh.exists()
@@ -0,0 +1,76 @@
+import asyncio
+
+from google.adk.tools.mcp_tool.mcp_session_manager import SseServerParams
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
+from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+from mcp import types as mcp_types
+from opentelemetry import trace
+from opentelemetry.trace import NonRecordingSpan, SpanContext, TraceFlags
+
+from photos_mcp_client.traced_mcp import TracedMCPTool, TracedMCPToolset
+
+SPAN = NonRecordingSpan(SpanContext(trace_id=0xABC, span_id=0xDEF, is_remote=False, trace_flags=TraceFlags(1)))
+
+
+class FakeSession:
+    def __init__(self):
+        self.requests = []
+
+    async def send_request(self, request, result_type):
+        self.requests.append(request)
+        return result_type(content=[mcp_types.TextContent(type="text", text="posted")])
+
+
+class FakeSessionManager:
+    def __init__(self):
+        self.session = FakeSession()
+        self.headers = []
+
+    async def create_session(self, headers=None):
+        self.headers.append(headers)
+        return self.session
+
+
+def make_tool(manager) -> TracedMCPTool:
+    mcp_tool = mcp_types.Tool(name="create_post", description="Creates a post", inputSchema={"type": "object", "properties": {}})
+    return TracedMCPTool(mcp_tool=mcp_tool, mcp_session_manager=manager)
+
+
+def test_tool_calls_carry_the_trace_context():
+    manager = FakeSessionManager()
+    tool = make_tool(manager)
+
+    async def call():
+        with trace.use_span(SPAN):
+            return await tool._run_async_impl(args={"user_id": "p01"}, tool_context=None, credential=None)
+
+    result = asyncio.run(call())
+    assert result.content[0].text == "posted"
+    assert manager.headers == [None]
+    (request,) = manager.session.requests
+    assert request.root.method == "tools/call"
+    assert request.root.params.name == "create_post"
+    assert request.root.params.arguments == {"user_id": "p01"}
+    meta = request.root.params.meta.model_dump()
+    assert meta["traceparent"] == f"00-{0xABC:032x}-{0xDEF:016x}-01"
+
+
+def test_tool_calls_without_a_span_send_no_meta():
+    manager = FakeSessionManager()
+    asyncio.run(make_tool(manager)._run_async_impl(args={}, tool_context=None, credential=None))
+    assert manager.session.requests[0].root.params.meta is None
+
+
+def test_toolset_wraps_the_tools_it_lists(monkeypatch):
+    manager = FakeSessionManager()
+    toolset = TracedMCPToolset(connection_params=SseServerParams(url="http://mcp/sse", headers={}))
+    plain = MCPTool(mcp_tool=make_tool(manager)._mcp_tool, mcp_session_manager=toolset._mcp_session_manager)
+
+    async def get_tools(self, readonly_context=None):
+        return [plain]
+
+    monkeypatch.setattr(MCPToolset, "get_tools", get_tools)
+    (tool,) = asyncio.run(toolset.get_tools())
+    assert isinstance(tool, TracedMCPTool)
+    assert tool.name == "create_post"
+    assert tool._mcp_session_manager is toolset._mcp_session_manager
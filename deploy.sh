@@ -12,12 +12,14 @@ export IMAGE_TAG="latest"
 export IMAGE_PATH="${REGION}-docker.pkg.dev/${PROJECT_ID}/${REPO_NAME}/${IMAGE_NAME}:${IMAGE_TAG}"
 export SERVICE_NAME="google-photos-agent"
 export ORCHESTRATE_AGENT_ID=projects/383364302094/locations/us-central1/reasoningEngines/1669643591149944832
+# "local" builds the agents into the web app image (see README, Single-Node Mode)
+export ORCHESTRATOR_MODE="${ORCHESTRATOR_MODE:-agent_engine}"
 
 
 # Submit the build to Cloud Build
 echo "Submitting build..."
 gcloud builds submit . --config cloudbuild.yaml \
-  --substitutions=_REGION=${REGION},_REPO_NAME=${REPO_NAME},_IMAGE_NAME=${IMAGE_NAME},_TAG_NAME=${IMAGE_TAG} \
+  --substitutions=_REGION=${REGION},_REPO_NAME=${REPO_NAME},_IMAGE_NAME=${IMAGE_NAME},_TAG_NAME=${IMAGE_TAG},_ORCHESTRATOR_MODE=${ORCHESTRATOR_MODE} \
   --project=${PROJECT_ID}
 
 # Deploy to Cloud Run
@@ -35,6 +37,8 @@ gcloud run deploy ${SERVICE_NAME} \
   --set-env-vars="GOOGLE_CLOUD_PROJECT=${PROJECT_ID}" \
   --set-env-vars="GOOGLE_APPLICATION_CREDENTIALS=/app/key.json" \
   --set-env-vars="ORCHESTRATE_AGENT_ID=${ORCHESTRATE_AGENT_ID}" \
+  --set-env-vars="ORCHESTRATOR_MODE=${ORCHESTRATOR_MODE}" \
+  --set-env-vars="PROGRESS_RELAY_SECRET=${PROGRESS_RELAY_SECRET}" \
   --project=${PROJECT_ID} \
   --min-instances=1 \
   --cpu=2 \
@@ -1,3 +1,4 @@
+import hmac
 import os
 import sys
 import uuid
@@ -6,35 +7,18 @@ from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from flask import Flask, render_template, flash, request, jsonify, redirect, url_for, Response, stream_with_context
+from flask import Flask, render_template, flash, request, jsonify, redirect, url_for, Response, stream_with_context, g, abort
+from google.api_core import exceptions
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 import humanize
 from dateutil import parser
-from google.cloud import storage
 import json
 import callagent
-
-# --- Agent Integration (Corrected based on user-provided example) ---
-try:
-    from agents.social_profiling_agent import root_agent
-    from google.adk.runners import Runner
-    from google.adk.sessions import InMemorySessionService
-    # FIX: Use the correct import path from the 'google-genai' library,
-    # as shown in the user's working example.
-    from google.genai import types as genai_types
-
-    # Set up the required Runner and Session Service
-    session_service = InMemorySessionService()
-    agent_runner = Runner(
-        agent=root_agent,
-        app_name="google-photos-agent",
-        session_service=session_service
-    )
-    print("Successfully imported and configured ADK agent with Runner.")
-
-except ImportError as e:
-    print(f"CRITICAL ERROR: Could not import the ADK agent/runner. The agent will be disabled. Details: {e}")
-    root_agent = None
-    agent_runner = None
+import chat_runs
+import progress
+from agent_common import storage, tracing
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
 
 # Import database functions from db.py
 import db
@@ -46,25 +30,66 @@ DUMMY_PERSON_ID = "p01"
 load_dotenv()
 APP_HOST = os.environ.get("APP_HOST", "0.0.0.0")
 APP_PORT = os.environ.get("APP_PORT", "8080")
+# The orchestrator sends this in the X-Progress-Relay-Secret header of every
+# progress event; without it set, relayed progress is rejected.
+PROGRESS_RELAY_SECRET = os.environ.get("PROGRESS_RELAY_SECRET", "")
+SIGNED_URL_EXPIRATION = timedelta(minutes=60)
+# With the memory and local storage backends, the app serves objects itself
+# under /storage/<token>, where the token is the gs:// URI signed with the secret key.
+STORAGE_CHUNK_SIZE = 256 * 1024
+_storage_urls = URLSafeTimedSerializer(app.secret_key, salt="storage-object")
+
+# --- Tracing ---
+# Every request gets a server span; the chatbot's orchestrator run, the A2A
+# delegations and the agents' tool calls are nested under it.
+tracing.configure("google-photos-app")
+tracer = tracing.get_tracer(__name__)
+
+
+@app.before_request
+def _start_request_span():
+    span = tracer.start_span(
+        f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+        context=propagate.extract(request.headers),
+        kind=trace.SpanKind.SERVER,
+        attributes={"http.method": request.method, "http.target": request.path},
+    )
+    g.trace_span = span
+    g.trace_token = otel_context.attach(trace.set_span_in_context(span))
+
+
+@app.after_request
+def _record_response_status(response):
+    span = g.get("trace_span")
+    if span is not None:
+        span.set_attribute("http.status_code", response.status_code)
+    return response
+
+
+@app.teardown_request
+def _end_request_span(exc):
+    span = g.pop("trace_span", None)
+    if span is None:
+        return
+    if exc is not None:
+        span.record_exception(exc)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(exc)))
+    span.end()
+    otel_context.detach(g.pop("trace_token"))
 
-# --- Initialize Google Cloud Storage Client ---
-storage_client = storage.Client()
+
+# --- Fetch the orchestrator agent engine handle ahead of the first chat ---
+callagent.warm_up()
 
 def generate_signed_url(gcs_uri):
-    """Generates a signed URL for a GCS object."""
-    if not gcs_uri or not gcs_uri.startswith("gs://"):
+    """Generates a signed URL for a GCS object, or a /storage URL with the memory and local storage backends."""
+    if not gcs_uri or not storage.is_gcs_uri(gcs_uri):
         return None
     try:
-        bucket_name, blob_name = gcs_uri.replace("gs://", "").split("/", 1)
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
+        if storage.backend().name != "gcs":
+            return url_for('storage_object', token=_storage_urls.dumps(gcs_uri))
         # Generate a URL that is valid for 1 hour
-        signed_url = blob.generate_signed_url(
-            version="v4",
-            expiration=timedelta(minutes=60),
-            method="GET",
-        )
-        return signed_url
+        return storage.signed_url(gcs_uri, expiration=SIGNED_URL_EXPIRATION)
     except Exception as e:
         app.logger.error(f"Failed to generate signed URL for {gcs_uri}: {e}")
         return None
@@ -247,20 +272,161 @@ def add_memory_api():
         traceback.print_exc()
         return jsonify({"error": "An internal server error occurred"}), 500
 
+def _start_chat_run(user_message):
+    """Queues a chat run for the current user, sharing an identical run that is still in flight."""
+    user_data = db.get_person_by_id_db(DUMMY_PERSON_ID)
+    user_name = user_data[0]['name'] if user_data else 'Rohan'
+    return chat_runs.start_run(
+        lambda: callagent.call_orchestrator_agent(user_name, user_message),
+        key=chat_runs.dedupe_key(user_name, user_message),
+    )
+
+
+def _queue_full_response(e):
+    return jsonify({"error": f"The chatbot is busy, please retry shortly ({e})."}), 503, {"Retry-After": "5"}
+
+
+def _stream_chat_run(run, last_seen=0):
+    """Streams a chat run's events from after `last_seen` as server-sent events."""
+    def generate():
+        last_id = last_seen
+        if not last_id:
+            yield f"retry: 2000\ndata: {json.dumps({'type': 'run', 'data': {'run_id': run.id}})}\n\n"
+        while True:
+            events, done = run.events_after(last_id, timeout=15)
+            for event_id, event in events:
+                last_id = event_id
+                yield f"id: {chat_runs.format_event_id(run.id, event_id)}\ndata: {json.dumps(event)}\n\n"
+            if done and not events:
+                yield f"data: {json.dumps({'type': 'end', 'data': {'run_id': run.id}})}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/chatbot', methods=['GET'])
 def api_chatbot():
-    """API endpoint for the chatbot."""
-    user_message = request.args.get('message')
-    if not user_message:
-        return jsonify({"error": "Invalid request"}), 400
+    """API endpoint for the chatbot.
 
-    def generate():
-        user_data = db.get_person_by_id_db(DUMMY_PERSON_ID)
-        user_name = user_data[0]['name'] if user_data else 'Rohan'
-        for event in callagent.call_orchestrator_agent(user_name, user_message):
-            yield f"data: {json.dumps(event)}\n\n"
+    Starts a chat run and streams its events. A client that lost the stream
+    reconnects with the `Last-Event-ID` header (or `last_event_id` parameter)
+    and gets the rest of the same run instead of starting a new one.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    run_id, last_seen = chat_runs.parse_event_id(last_event_id)
+    if run_id:
+        run = chat_runs.get_run(run_id)
+        if run is None:
+            return jsonify({"error": "Chat run not found or expired"}), 404
+    else:
+        user_message = request.args.get('message')
+        if not user_message:
+            return jsonify({"error": "Invalid request"}), 400
+        try:
+            run, _ = _start_chat_run(user_message)
+        except chat_runs.QueueFull as e:
+            return _queue_full_response(e)
+    return _stream_chat_run(run, last_seen)
+
+
+@app.route('/api/chatbot/jobs', methods=['POST'])
+def api_chatbot_submit_job():
+    """Submits a chat request as a background job and returns its id right away."""
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message')
+    if not isinstance(user_message, str) or not user_message.strip():
+        return jsonify({"error": "Missing message"}), 400
+    try:
+        run, deduplicated = _start_chat_run(user_message)
+    except chat_runs.QueueFull as e:
+        return _queue_full_response(e)
+    status_url = url_for('api_chatbot_job', job_id=run.id)
+    return jsonify({
+        "job_id": run.id,
+        "status": run.status,
+        "deduplicated": deduplicated,
+        "status_url": status_url,
+        "events_url": url_for('api_chatbot_job_events', job_id=run.id),
+    }), 202, {"Location": status_url}
+
+
+@app.route('/api/chatbot/jobs/<job_id>', methods=['GET'])
+def api_chatbot_job(job_id):
+    """Polls a chat job. `after` returns only the events after that event number."""
+    run = chat_runs.get_run(job_id)
+    if run is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    after = request.args.get('after', default=0, type=int)
+    events, _ = run.events_after(after, timeout=0)
+    return jsonify({
+        "job_id": run.id,
+        "status": run.status,
+        "result": run.result() if run.done else None,
+        "events": [{"id": event_id, **event} for event_id, event in events],
+        "last_event_id": events[-1][0] if events else after,
+    })
+
+
+@app.route('/api/chatbot/jobs/<job_id>/events', methods=['GET'])
+def api_chatbot_job_events(job_id):
+    """Streams a chat job's events; resumes after `Last-Event-ID` when given."""
+    run = chat_runs.get_run(job_id)
+    if run is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    last_run_id, last_seen = chat_runs.parse_event_id(request.headers.get('Last-Event-ID'))
+    return _stream_chat_run(run, last_seen if last_run_id == run.id else 0)
+
+
+@app.route('/api/chatbot/metrics', methods=['GET'])
+def api_chatbot_metrics():
+    """Agent engine handle, session reuse and chat run metrics for the chatbot.
+
+    In local orchestrator mode, also the orchestrator's result cache and A2A HTTP pool metrics.
+    """
+    return jsonify({**callagent.metrics(), "chat_runs": chat_runs.stats(), "storage": storage.metrics()})
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/api/chatbot/progress/<channel_id>', methods=['POST'])
+def api_chatbot_progress(channel_id):
+    """Receives remote agent progress relayed by the orchestrator for a running chat."""
+    secret = request.headers.get("X-Progress-Relay-Secret", "")
+    if not PROGRESS_RELAY_SECRET or not hmac.compare_digest(secret.encode(), PROGRESS_RELAY_SECRET.encode()):
+        return jsonify({"error": "Missing or wrong progress relay secret"}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    if not progress.publish(channel_id, ("progress", data)):
+        return jsonify({"error": "Unknown or finished chat run"}), 404
+    return '', 204
+
+
+@app.route('/storage/<token>', methods=['GET'])
+def storage_object(token):
+    """Serves an object of the memory or local storage backend, in place of a signed GCS URL."""
+    if storage.backend().name == "gcs":
+        abort(404)
+    try:
+        gcs_uri = _storage_urls.loads(token, max_age=SIGNED_URL_EXPIRATION.total_seconds())
+    except BadSignature:
+        abort(403)
+    try:
+        info = storage.stat(gcs_uri)
+    except exceptions.NotFound:
+        abort(404)
+
+    def chunks():
+        with storage.open_read(gcs_uri, info.generation, STORAGE_CHUNK_SIZE) as f:
+            while chunk := f.read(STORAGE_CHUNK_SIZE):
+                yield chunk
+
+    return Response(
+        stream_with_context(chunks()),
+        mimetype=info.content_type or "application/octet-stream",
+        headers={"Content-Length": str(info.size)},
+    )
 
 
 @app.route('/api/generate-signed-url', methods=['POST'])
@@ -3,16 +3,268 @@ from dotenv import load_dotenv
 import pprint
 import json 
 import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+
+import progress
 
 load_dotenv()
 
+# Shared agent modules (agent_common, and the orchestrator in local mode) live
+# next to this app in the repo; the container image copies agent_common to /app.
+AGENTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents'))
+if os.path.isdir(AGENTS_DIR) and AGENTS_DIR not in sys.path:
+    sys.path.insert(0, AGENTS_DIR)
+
+from agent_common import tracing
+
+tracer = tracing.get_tracer(__name__)
+
 ORCHESTRATE_AGENT_ID = os.environ.get('ORCHESTRATE_AGENT_ID')
+# "agent_engine" calls the deployed orchestrator; "local" runs the orchestrator
+# and all its agents inside this process, without Agent Engine or A2A HTTP hops.
+ORCHESTRATOR_MODE = os.environ.get('ORCHESTRATOR_MODE', 'agent_engine').strip().lower()
+# How old the cached agent engine handle may get before it is refreshed in the background, in seconds.
+# Only remote handles are refreshed; the local engine holds the sessions in memory.
+ENGINE_REFRESH_INTERVAL = float(os.environ.get('ENGINE_REFRESH_INTERVAL', 600))
+# A user's orchestrator session is reused for this many chat runs, then replaced.
+CHAT_SESSION_MAX_RUNS = int(os.environ.get('CHAT_SESSION_MAX_RUNS', 10))
+# A user's orchestrator session is replaced after this many idle seconds.
+CHAT_SESSION_IDLE_TTL = float(os.environ.get('CHAT_SESSION_IDLE_TTL', 1800))
+
+_metrics = {
+    "runs": 0,
+    "engine_fetches": 0,
+    "engine_fetch_ms_total": 0.0,
+    "engine_cache_hits": 0,
+    "session_creates": 0,
+    "session_create_ms_total": 0.0,
+    "session_reuses": 0,
+    "first_event_ms_total": 0.0,
+    "first_event_runs": 0,
+    "dropped_log_events": 0,
+}
+# Chat runs, engine refreshes and the event log update the counters from different threads.
+_metrics_lock = threading.Lock()
+
+
+def _count(name, value=1):
+    with _metrics_lock:
+        _metrics[name] += value
+
+
+def metrics():
+    """Returns handle/session cache counters and the time they saved before the first event."""
+    with _metrics_lock:
+        m = dict(_metrics)
+    avg_fetch = m["engine_fetch_ms_total"] / m["engine_fetches"] if m["engine_fetches"] else 0.0
+    avg_create = m["session_create_ms_total"] / m["session_creates"] if m["session_creates"] else 0.0
+    m["avg_engine_fetch_ms"] = round(avg_fetch, 1)
+    m["avg_session_create_ms"] = round(avg_create, 1)
+    m["avg_first_event_ms"] = round(m["first_event_ms_total"] / m["first_event_runs"], 1) if m["first_event_runs"] else 0.0
+    m["estimated_ms_saved"] = round(m["engine_cache_hits"] * avg_fetch + m["session_reuses"] * avg_create, 1)
+    if ORCHESTRATOR_MODE == 'local' and _engine is not None:
+        # The orchestrator runs in this process; a deployed one logs these instead.
+        from orchestrate.agent import host_agent_singleton
+        m["orchestrator"] = host_agent_singleton.metrics()
+    return m
+
+
+# --- Agent engine handle cache ---
+_engine = None
+_engine_fetched_at = 0.0
+_engine_lock = threading.Lock()
+_engine_refreshing = threading.Event()
+
+
+def _orchestrator_configured():
+    return ORCHESTRATOR_MODE == 'local' or bool(ORCHESTRATE_AGENT_ID)
+
+
+def _local_engine():
+    """Wraps the orchestrator in an in-process AdkApp, with its agents dispatched locally."""
+    # Read by the orchestrator module when it is imported.
+    os.environ.setdefault('AGENT_MODE', 'local')
+    from orchestrate.agent import root_agent
+    return agent_engines.AdkApp(agent=root_agent)
+
+
+def _fetch_engine():
+    started = time.perf_counter()
+    with tracer.start_as_current_span("callagent.fetch_engine", attributes={"orchestrator.mode": ORCHESTRATOR_MODE}):
+        engine = _local_engine() if ORCHESTRATOR_MODE == 'local' else agent_engines.get(ORCHESTRATE_AGENT_ID)
+    _count("engine_fetches")
+    _count("engine_fetch_ms_total", (time.perf_counter() - started) * 1000)
+    return engine
+
+
+def _refresh_engine():
+    global _engine, _engine_fetched_at
+    try:
+        engine = _fetch_engine()
+        with _engine_lock:
+            _engine, _engine_fetched_at = engine, time.monotonic()
+    except Exception as e:
+        _log(f"Background refresh of the agent engine handle failed: {e}")
+    finally:
+        _engine_refreshing.clear()
+
+
+def get_agent_engine():
+    """Returns the per-process agent engine handle, fetching it only once.
+
+    A remote handle older than ENGINE_REFRESH_INTERVAL is still returned,
+    while a fresh one is fetched in the background for the next call. The
+    local engine is built once: its sessions live in its in-memory session
+    service, so replacing it would orphan every session in `_sessions`.
+    """
+    global _engine, _engine_fetched_at
+    with _engine_lock:
+        if _engine is None:
+            _engine, _engine_fetched_at = _fetch_engine(), time.monotonic()
+            return _engine
+        engine, fetched_at = _engine, _engine_fetched_at
+    _count("engine_cache_hits")
+    if ORCHESTRATOR_MODE == 'local':
+        return engine
+    if time.monotonic() - fetched_at > ENGINE_REFRESH_INTERVAL and not _engine_refreshing.is_set():
+        _engine_refreshing.set()
+        threading.Thread(target=_refresh_engine, daemon=True).start()
+    return engine
+
+
+def warm_up():
+    """Fetches the agent engine handle in the background so the first chat does not wait on it."""
+    if not _orchestrator_configured():
+        return
+
+    def _warm():
+        try:
+            get_agent_engine()
+        except Exception as e:
+            _log(f"Could not warm up the agent engine handle: {e}")
+
+    threading.Thread(target=_warm, daemon=True).start()
+
+
+# --- Orchestrator session reuse ---
+# Each user keeps one orchestrator session (with a stable progress relay
+# channel) across chat runs. A concurrent run for the same user gets a
+# one-off session instead of sharing the busy one.
+_sessions: dict[str, dict] = {}
+_sessions_lock = threading.Lock()
+
+
+def _checkout_session(agent_engine, user_id):
+    now = time.monotonic()
+    with _sessions_lock:
+        session = _sessions.get(user_id)
+        if session and not session["in_use"]:
+            if session["runs"] < CHAT_SESSION_MAX_RUNS and now - session["last_used"] < CHAT_SESSION_IDLE_TTL:
+                session["in_use"] = True
+                session["runs"] += 1
+                _count("session_reuses")
+                return session
+            del _sessions[user_id]
+
+    channel_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    with tracer.start_as_current_span("callagent.create_session"):
+        created = agent_engine.create_session(user_id=user_id, state={"relay_channel": channel_id})
+    _count("session_creates")
+    _count("session_create_ms_total", (time.perf_counter() - started) * 1000)
+    session = {
+        "id": created.get("id") if isinstance(created, dict) else getattr(created, "id", None),
+        "channel": channel_id,
+        "runs": 1,
+        "last_used": now,
+        "in_use": True,
+    }
+    with _sessions_lock:
+        if user_id not in _sessions:
+            _sessions[user_id] = session
+    return session
+
+
+def _release_session(user_id, session, failed):
+    with _sessions_lock:
+        session["in_use"] = False
+        session["last_used"] = time.monotonic()
+        if failed and _sessions.get(user_id) is session:
+            del _sessions[user_id]
+
+
+# --- Console event log ---
+# Printing every streamed event is slow; it is handed to a background thread
+# so the SSE stream never waits on the console.
+_event_log = queue.Queue(maxsize=1000)
+
+
+def _event_log_worker():
+    while True:
+        item = _event_log.get()
+        if isinstance(item, tuple):
+            event_idx, event = item
+            print(f"\n--- Event {event_idx} Received ---")
+            pprint.pprint(event)
+        else:
+            print(item)
+
+
+threading.Thread(target=_event_log_worker, daemon=True, name="callagent-event-log").start()
+
+
+def _log(item):
+    try:
+        _event_log.put_nowait(item)
+    except queue.Full:
+        _count("dropped_log_events")
+
+
+def _stream_to_channel(agent_engine, user_id, session_id, message, channel, parent_ctx=None):
+    """Runs the orchestrator stream in a background thread, feeding the run's channel."""
+    span = tracer.start_span("callagent.stream_query", context=parent_ctx)
+    try:
+        kwargs = {"user_id": user_id, "message": message}
+        if session_id:
+            kwargs["session_id"] = session_id
+        for event in agent_engine.stream_query(**kwargs):
+            channel.put(("event", event))
+    except Exception as e:
+        span.record_exception(e)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+        channel.put(("error", e))
+    finally:
+        span.end()
+        channel.put(("done", None))
 
 def call_orchestrator_agent(user_name: str, user_prompt: str):
     """
     Calls the orchestrator agent with a user's request and yields the agent's thought process.
     """
-    agent_engine = agent_engines.get(ORCHESTRATE_AGENT_ID)
+    started = time.perf_counter()
+    _count("runs")
+    # The span is not made current: this generator is suspended between SSE events.
+    run_span = tracer.start_span("callagent.call_orchestrator_agent", attributes={"chat.user": user_name})
+    run_ctx = trace.set_span_in_context(run_span)
+    try:
+        yield from _call_orchestrator_agent(user_name, user_prompt, started, run_span, run_ctx)
+    finally:
+        run_span.end()
+
+
+def _call_orchestrator_agent(user_name, user_prompt, started, run_span, run_ctx):
+    token = otel_context.attach(run_ctx)
+    try:
+        agent_engine = get_agent_engine() if _orchestrator_configured() else None
+    finally:
+        otel_context.detach(token)
     if not agent_engine:
         yield {"type": "error", "data": {"message": "ORCHESTRATE_AGENT_ID not set or agent engine failed to initialize."}}
         return
@@ -42,22 +294,60 @@ def call_orchestrator_agent(user_name: str, user_prompt: str):
     5. If you don't find any photos, inform that you will be not able to create a collage.
     """
 
-    print(f"--- Sending Prompt to Orchestrator Agent ---")
-    print(prompt_message)
+    _log(f"--- Sending Prompt to Orchestrator Agent ---\n{prompt_message}")
     yield {"type": "thought", "data": f"Sending high-level task to orchestrator agent."}
 
     accumulated_response = ""
     yield {"type": "thought", "data": f"--- Agent Response Stream Starting ---"}
 
+    # Remote agent progress is relayed back on the session's channel while
+    # the orchestrator is still waiting on the delegation.
+    session = None
+    session_id = None
+    token = otel_context.attach(run_ctx)
     try:
-        for event_idx, event in enumerate(
-           agent_engine.stream_query(
-                user_id=user_id,
-                message=prompt_message,
-            )
-        ):
-            print(f"\n--- Event {event_idx} Received ---") # Console
-            pprint.pprint(event) # Console
+        session = _checkout_session(agent_engine, user_id)
+        session_id = session["id"]
+        channel_id, channel = progress.open_channel(session["channel"])
+    except Exception as e:
+        yield {"type": "thought", "data": f"Could not create a session with progress relay, continuing without it: {str(e)}"}
+        if session:
+            _release_session(user_id, session, failed=True)
+            session = None
+        channel_id, channel = progress.open_channel()
+    finally:
+        otel_context.detach(token)
+    run_span.set_attribute("chat.session_reused", bool(session and session["runs"] > 1))
+
+    # An in-process orchestrator picks the run's span up by relay channel.
+    tracing.park(channel_id, run_ctx)
+    threading.Thread(
+        target=_stream_to_channel,
+        args=(agent_engine, user_id, session_id, prompt_message, channel, run_ctx),
+        daemon=True,
+    ).start()
+
+    failed = False
+    try:
+        event_idx = -1
+        while True:
+            kind, event = channel.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise event
+            if kind == "progress":
+                yield {"type": "progress", "data": event}
+                continue
+
+            event_idx += 1
+            if event_idx == 0:
+                first_event_ms = (time.perf_counter() - started) * 1000
+                _count("first_event_ms_total", first_event_ms)
+                _count("first_event_runs")
+                run_span.add_event("first_event", {"elapsed_ms": first_event_ms})
+                _log(f"--- First event after {first_event_ms:.0f} ms ---")
+            _log((event_idx, event)) # Console
             try:
                 content = event.get('content', {})
                 parts = content.get('parts', [])
@@ -72,16 +362,20 @@ def call_orchestrator_agent(user_name: str, user_prompt: str):
                             yield {"type": "thought", "data": f"Agent: \"{text}\""}
                             accumulated_response += text
                         else:
-                            tool_code = part.get('tool_code')
-                            tool_code_output = part.get('tool_code_output')
+                            # Agent Engine and the in-process AdkApp report tool use as function calls.
+                            tool_code = part.get('tool_code') or part.get('function_call')
+                            tool_code_output = part.get('tool_code_output') or part.get('function_response')
                             if tool_code:
                                 tool_name = tool_code.get('name', 'Unnamed tool')
-                                # The orchestrator's only tool is 'send_message'
+                                # The orchestrator delegates with 'send_message' or 'send_messages'
                                 if tool_name == 'send_message':
                                     args = tool_code.get('args', {})
                                     remote_agent = args.get('agent_name')
                                     task = args.get('task')
                                     yield {"type": "thought", "data": f"Orchestrator is delegating a task to the '{remote_agent}' agent: '{task}'"}
+                                elif tool_name == 'send_messages':
+                                    delegations = tool_code.get('args', {}).get('delegations', [])
+                                    yield {"type": "thought", "data": f"Orchestrator is delegating {len(delegations)} tasks in parallel."}
                                 else:
                                     yield {"type": "thought", "data": f"Agent is considering tool: {tool_name}."}
                             if tool_code_output:
@@ -90,9 +384,17 @@ def call_orchestrator_agent(user_name: str, user_prompt: str):
                 yield {"type": "thought", "data": f"Error processing agent event part {event_idx}: {str(e_inner)}"}
 
     except Exception as e_outer:
+        failed = True
+        run_span.record_exception(e_outer)
+        run_span.set_status(trace.Status(trace.StatusCode.ERROR, str(e_outer)))
         yield {"type": "thought", "data": f"Critical error during agent stream query: {str(e_outer)}"}
         yield {"type": "error", "data": {"message": f"Error during agent interaction: {str(e_outer)}", "raw_output": accumulated_response}}
         return # Stop generation
+    finally:
+        tracing.unpark(channel_id)
+        progress.close_channel(channel_id)
+        if session:
+            _release_session(user_id, session, failed)
 
     yield {"type": "thought", "data": f"--- End of Agent Response Stream ---"}
 
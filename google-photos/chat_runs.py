@@ -0,0 +1,182 @@
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from opentelemetry import context as otel_context
+
+# --- Chat run buffer ---
+# A chat run executes on a bounded worker pool, independent of the HTTP
+# connection that started it. Its events are numbered and buffered here so a
+# client whose connection drops can reconnect with `Last-Event-ID` and
+# resume, instead of re-running the whole agent pipeline. Identical requests
+# from the same user that arrive while a run is queued or running share it.
+#
+# Runs, their events and the dedupe table live in this process's memory. The
+# app must therefore serve chats from a single process (threads are fine, as
+# with `python app.py`): a reconnect or a duplicate request that reaches
+# another process or instance does not find the run and starts a new one.
+
+# How long a finished run's events stay available for resuming, in seconds.
+CHAT_RUN_TTL = float(os.environ.get('CHAT_RUN_TTL', 600))
+# Runs that are still going are dropped after this many seconds.
+CHAT_RUN_MAX_AGE = float(os.environ.get('CHAT_RUN_MAX_AGE', 3600))
+# Number of chat runs that execute at the same time.
+CHAT_WORKERS = int(os.environ.get('CHAT_WORKERS', 4))
+# Runs waiting for a worker beyond this are rejected.
+CHAT_MAX_QUEUED = int(os.environ.get('CHAT_MAX_QUEUED', 32))
+
+
+class QueueFull(Exception):
+    """Raised when no more chat runs can be queued."""
+
+
+class ChatRun:
+    """The numbered events of one chat run. Event ids start at 1."""
+
+    def __init__(self, run_id: str, key: tuple | None = None):
+        self.id = run_id
+        self.key = key
+        self.status = 'queued'
+        self.events: list[dict] = []
+        self.done = False
+        self.created_at = time.monotonic()
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    def append(self, event: dict) -> None:
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def start(self) -> None:
+        with self._cond:
+            self.status = 'running'
+
+    def finish(self, status: str) -> None:
+        with self._cond:
+            self.status = status
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def events_after(self, last_id: int, timeout: float) -> tuple[list[tuple[int, dict]], bool]:
+        """Waits up to `timeout` for events after `last_id`.
+
+        Returns the new (id, event) pairs and whether the run has finished.
+        """
+        with self._cond:
+            if len(self.events) <= last_id and not self.done:
+                self._cond.wait(timeout)
+            new = [(i + 1, e) for i, e in enumerate(self.events[last_id:], start=last_id)]
+            return new, self.done
+
+    def expired(self, now: float) -> bool:
+        if self.finished_at is not None:
+            return now - self.finished_at > CHAT_RUN_TTL
+        return now - self.created_at > CHAT_RUN_MAX_AGE
+
+    def result(self) -> dict | None:
+        """Returns the run's final response or error event, if it has one."""
+        with self._cond:
+            for event in reversed(self.events):
+                if event.get("type") in ("final_response", "error"):
+                    return event
+        return None
+
+
+_runs: dict[str, ChatRun] = {}
+_in_flight: dict[tuple, ChatRun] = {}
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat-run")
+_stats = {"started": 0, "deduplicated": 0, "rejected": 0}
+
+
+def _sweep() -> None:
+    now = time.monotonic()
+    with _lock:
+        for run in [r for r in _runs.values() if r.expired(now)]:
+            del _runs[run.id]
+            if _in_flight.get(run.key) is run:
+                del _in_flight[run.key]
+
+
+def dedupe_key(user_name: str, message: str) -> tuple:
+    """Requests with the same user and (whitespace and case insensitive) message share a run."""
+    return user_name, re.sub(r'\s+', ' ', message).strip().casefold()
+
+
+def start_run(produce, key: tuple | None = None) -> tuple[ChatRun, bool]:
+    """Queues a run whose events come from the generator function `produce`.
+
+    If a run with the same `key` is still queued or running, that run is
+    returned instead. Returns the run and whether it was deduplicated.
+    Raises QueueFull when CHAT_MAX_QUEUED runs are already waiting.
+    """
+    _sweep()
+    with _lock:
+        existing = _in_flight.get(key) if key is not None else None
+        if existing is not None:
+            _stats["deduplicated"] += 1
+            return existing, True
+        queued = sum(1 for r in _runs.values() if r.status == 'queued')
+        if queued >= CHAT_MAX_QUEUED:
+            _stats["rejected"] += 1
+            raise QueueFull(f"{queued} chat runs are already waiting")
+        run = ChatRun(uuid.uuid4().hex, key)
+        _runs[run.id] = run
+        if key is not None:
+            _in_flight[key] = run
+        _stats["started"] += 1
+    ctx = otel_context.get_current()
+
+    def _worker():
+        token = otel_context.attach(ctx)
+        run.start()
+        status = 'failed'
+        try:
+            for event in produce():
+                run.append(event)
+            status = 'failed' if (run.result() or {}).get("type") == "error" else 'completed'
+        except Exception as e:
+            run.append({"type": "error", "data": {"message": f"Chat run failed: {e}"}})
+        finally:
+            with _lock:
+                if _in_flight.get(run.key) is run:
+                    del _in_flight[run.key]
+            run.finish(status)
+            otel_context.detach(token)
+
+    _pool.submit(_worker)
+    return run, False
+
+
+def get_run(run_id: str) -> ChatRun | None:
+    _sweep()
+    with _lock:
+        return _runs.get(run_id)
+
+
+def stats() -> dict:
+    with _lock:
+        by_status: dict[str, int] = {}
+        for run in _runs.values():
+            by_status[run.status] = by_status.get(run.status, 0) + 1
+        return {**_stats, "workers": CHAT_WORKERS, "max_queued": CHAT_MAX_QUEUED, "runs": by_status}
+
+
+def format_event_id(run_id: str, event_id: int) -> str:
+    return f"{run_id}:{event_id}"
+
+
+def parse_event_id(value: str | None) -> tuple[str | None, int]:
+    """Splits a `Last-Event-ID` of the form "<run id>:<event number>"."""
+    if not value:
+        return None, 0
+    run_id, _, number = value.rpartition(':')
+    try:
+        return (run_id or None), int(number)
+    except ValueError:
+        return None, 0
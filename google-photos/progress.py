@@ -0,0 +1,40 @@
+import queue
+import threading
+import uuid
+
+# --- Progress channels ---
+# Each chat run opens a channel and passes its id to the orchestrator through
+# the session state. The orchestrator POSTs remote agent progress to
+# /api/chatbot/progress/<channel>, which lands on the run's queue and is
+# streamed to the browser alongside the orchestrator's own events.
+
+_channels: dict[str, queue.Queue] = {}
+_lock = threading.Lock()
+
+
+def open_channel(channel_id: str | None = None) -> tuple[str, queue.Queue]:
+    """Opens a progress channel and returns its id and queue.
+
+    A reused orchestrator session keeps its channel id across chat runs; each
+    run opens a fresh queue under that id.
+    """
+    channel_id = channel_id or uuid.uuid4().hex
+    channel = queue.Queue()
+    with _lock:
+        _channels[channel_id] = channel
+    return channel_id, channel
+
+
+def close_channel(channel_id: str) -> None:
+    with _lock:
+        _channels.pop(channel_id, None)
+
+
+def publish(channel_id: str, item) -> bool:
+    """Puts an item on a channel. Returns False if the channel is not open."""
+    with _lock:
+        channel = _channels.get(channel_id)
+    if channel is None:
+        return False
+    channel.put(item)
+    return True
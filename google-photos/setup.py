@@ -1,14 +1,21 @@
 
 import os
+import sys
 import uuid
 import time
 
 from google.cloud import spanner
-from google.cloud import storage
 from google.api_core import exceptions
 from google.auth import default as google_auth_default
 from google.cloud.exceptions import Conflict
 
+# Cloud Storage access is shared with the app and the agents (agent_common).
+AGENTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents'))
+if os.path.isdir(AGENTS_DIR) and AGENTS_DIR not in sys.path:
+    sys.path.insert(0, AGENTS_DIR)
+
+from agent_common import storage
+
 # --- Configuration ---
 INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID","google-photos-instance")
 DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID","google-photos")
@@ -48,20 +55,15 @@ except Exception as e:
 
 def upload_blob(bucket_name, source_file_name, destination_blob_name):
     """Uploads a file to the bucket."""
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-
-    blob.upload_from_filename(source_file_name)
+    storage.upload_file(f"gs://{bucket_name}/{destination_blob_name}", source_file_name)
 
     print(f"File {source_file_name} uploaded to {destination_blob_name}.")
 
 def create_bucket(bucket_name):
     """Creates a new bucket. Handles cases where the bucket already exists."""
-    storage_client = storage.Client()
     try:
-        bucket = storage_client.create_bucket(bucket_name)
-        print(f"Bucket {bucket.name} created.")
+        storage.create_bucket(bucket_name)
+        print(f"Bucket {bucket_name} created.")
     except Conflict:
         print(f"Bucket {bucket_name} already exists.")
 
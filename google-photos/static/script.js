@@ -128,47 +128,100 @@ document.addEventListener("DOMContentLoaded", function() {
 
         const thinkingIndicator = appendMessage('<i class="fas fa-spinner fa-spin"></i>', 'bot-message thinking');
 
-        try {
-            const response = await fetch('/api/chatbot?message=' + encodeURIComponent(message), {
-                method: 'GET',
-            });
-
-            
-
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-
-            while (true) {
-                const { value, done } = await reader.read();
-                if (done) break;
-
-                const chunk = decoder.decode(value);
-                const lines = chunk.split('\n');
-
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        const eventData = JSON.parse(line.substring(6));
-                        if (eventData.type === 'collage_generated') {
-                            thinkingIndicator.remove();
-                            const gcsUri = eventData.data.url;
-                            appendMessage("I've created a collage for you! You can find it at: " + gcsUri + "<br><a href='/memories'>View Memories</a>", 'bot-message');
-                        } else if (eventData.type === 'final_response') {
-                            thinkingIndicator.remove();
-                            handleFinalResponse(eventData.data);
-                        } else if (eventData.type === 'error') {
-                            thinkingIndicator.remove();
-                            appendMessage(`Sorry, I encountered an error: ${eventData.data.message}`, 'bot-message error-message');
-                        }
+        // The server keeps running the chat while we are disconnected, so a
+        // dropped stream is resumed from the last event we saw.
+        let lastEventId = null;
+        let finished = false;
+        let retries = 0;
+
+        function handleEvent(eventData) {
+            if (eventData.type === 'collage_generated') {
+                thinkingIndicator.remove();
+                const gcsUri = eventData.data.url;
+                appendMessage("I've created a collage for you! You can find it at: " + gcsUri + "<br><a href='/memories'>View Memories</a>", 'bot-message');
+            } else if (eventData.type === 'progress') {
+                showProgress(thinkingIndicator, eventData.data);
+            } else if (eventData.type === 'final_response') {
+                thinkingIndicator.remove();
+                handleFinalResponse(eventData.data);
+            } else if (eventData.type === 'error') {
+                thinkingIndicator.remove();
+                appendMessage(`Sorry, I encountered an error: ${eventData.data.message}`, 'bot-message error-message');
+            } else if (eventData.type === 'end') {
+                finished = true;
+            }
+        }
+
+        while (!finished) {
+            try {
+                const url = lastEventId
+                    ? '/api/chatbot?last_event_id=' + encodeURIComponent(lastEventId)
+                    : '/api/chatbot?message=' + encodeURIComponent(message);
+                const response = await fetch(url, { method: 'GET' });
+                if (!response.ok) {
+                    // The run is unknown (e.g. it expired); retrying will not help.
+                    throw Object.assign(new Error(`HTTP ${response.status}`), { fatal: true });
+                }
+
+                await readEventStream(response, (id, data) => {
+                    if (id) lastEventId = id;
+                    retries = 0;
+                    handleEvent(JSON.parse(data));
+                });
+                if (!finished) throw new Error('Stream closed before the chat finished');
+            } catch (err) {
+                console.error("Fetch stream failed:", err);
+                if (err.fatal || !lastEventId || ++retries > 5) {
+                    thinkingIndicator.remove();
+                    appendMessage("Sorry, I lost connection with the server.", 'bot-message error-message');
+                    return;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            }
+        }
+    }
+
+    async function readEventStream(response, onEvent) {
+        // Server-sent events can be split across chunks, so complete events
+        // (terminated by a blank line) are cut from a running buffer.
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let id = null;
+                const data = [];
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('id:')) {
+                        id = line.slice(3).trim();
+                    } else if (line.startsWith('data:')) {
+                        data.push(line.slice(5).replace(/^ /, ''));
                     }
                 }
+                if (data.length) onEvent(id, data.join('\n'));
             }
-        } catch (err) {
-            console.error("Fetch stream failed:", err);
-            thinkingIndicator.remove();
-            appendMessage("Sorry, I lost connection with the server.", 'bot-message error-message');
         }
     }
 
+    function showProgress(indicator, data) {
+        // Remote agents report progress while the orchestrator waits on them.
+        if (!indicator || !data || !data.agent) return;
+        const p = indicator.querySelector('p');
+        const detail = data.text ? `: ${data.text}` : (data.state ? ` (${data.state})` : '');
+        p.innerHTML = '<i class="fas fa-spinner fa-spin"></i> ';
+        p.appendChild(document.createTextNode(`${data.agent}${detail}`));
+        chatWindow.scrollTop = chatWindow.scrollHeight;
+    }
+
     function handleFinalResponse(data) {
         const gcsUriRegex = /(gs:\/\/[^\s,]+)/;
         const match = data.match(gcsUriRegex);
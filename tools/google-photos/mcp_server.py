@@ -4,6 +4,7 @@ import json
 import uvicorn
 import os
 from dotenv import load_dotenv
+from opentelemetry import propagate, trace
 
 from mcp import types as mcp_types 
 from mcp.server.lowlevel import Server
@@ -23,6 +24,15 @@ load_dotenv()
 APP_HOST = os.environ.get("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.environ.get("APP_PORT", 8080))
 
+# Spans are exported with the shared agent tracing setup when the repo root is
+# on PYTHONPATH (see the README's tracing section); otherwise they are no-ops.
+try:
+  from agents.agent_common import tracing
+  tracing.configure("google-photos-mcp-server")
+except ImportError:
+  pass
+tracer = trace.get_tracer(__name__)
+
 
 post_tool = FunctionTool(create_post)
 
@@ -47,31 +57,37 @@ async def call_tool(
     name: str, arguments: dict
 ) -> list[mcp_types.TextContent | mcp_types.ImageContent | mcp_types.EmbeddedResource]:
   """MCP handler to execute a tool call."""
-  print(f"MCP Server: Received call_tool request for '{name}' with args: {arguments}")
-
-  # Look up the tool by name in our dictionary
-  tool_to_call = available_tools.get(name)
-  if tool_to_call:
-    try:
-      adk_response = await tool_to_call.run_async(
-          args=arguments,
-          tool_context=None, # No ADK context available here
-      )
-      print(f"MCP Server: ADK tool '{name}' executed successfully.")
+  # The photos agent sends its trace context as W3C headers in the request's `_meta`.
+  meta = app.request_context.meta
+  parent = propagate.extract(meta.model_dump(exclude_none=True)) if meta else None
+  with tracer.start_as_current_span("call_tool", context=parent, attributes={"mcp.tool_name": name}) as span:
+    print(f"MCP Server: Received call_tool request for '{name}' with args: {arguments}")
+
+    # Look up the tool by name in our dictionary
+    tool_to_call = available_tools.get(name)
+    if tool_to_call:
+      try:
+        adk_response = await tool_to_call.run_async(
+            args=arguments,
+            tool_context=None, # No ADK context available here
+        )
+        print(f"MCP Server: ADK tool '{name}' executed successfully.")
       
-      response_text = json.dumps(adk_response)
-      return [mcp_types.TextContent(type="text", text=response_text)]
-
-    except Exception as e:
-      print(f"MCP Server: Error executing ADK tool '{name}': {e}")
-      # Creating a proper MCP error response might be more robust
-      error_text = json.dumps({"error": f"Failed to execute tool '{name}': {str(e)}"})
-      return [mcp_types.TextContent(type="text", text=error_text)]
-  else:
-      # Handle calls to unknown tools
-      print(f"MCP Server: Tool '{name}' not found.")
-      error_text = json.dumps({"error": f"Tool '{name}' not implemented."})
-      return [mcp_types.TextContent(type="text", text=error_text)]
+        response_text = json.dumps(adk_response)
+        return [mcp_types.TextContent(type="text", text=response_text)]
+
+      except Exception as e:
+        print(f"MCP Server: Error executing ADK tool '{name}': {e}")
+        span.record_exception(e)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+        # Creating a proper MCP error response might be more robust
+        error_text = json.dumps({"error": f"Failed to execute tool '{name}': {str(e)}"})
+        return [mcp_types.TextContent(type="text", text=error_text)]
+    else:
+        # Handle calls to unknown tools
+        print(f"MCP Server: Tool '{name}' not found.")
+        error_text = json.dumps({"error": f"Tool '{name}' not implemented."})
+        return [mcp_types.TextContent(type="text", text=error_text)]
 
 # --- MCP Remote Server ---
 async def handle_sse(request):